@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Literal
 import os
 
 class BaseConfig(BaseSettings):
@@ -12,6 +13,56 @@ class BaseConfig(BaseSettings):
   ENVIRONMENT: str = "development"  # or "production"
   ADMIN_EMAIL: str = "admin@example.com"
   ADMIN_PASSWORD: str = "admin_password"
+  # Width of the capacity ledger buckets, rebuild the ledger after changing it
+  CAPACITY_BUCKET_MINUTES: int = 15
+  # Fail requests issuing more SQL statements than this, 0 disables the check (used by test runs)
+  SQL_STATEMENT_BUDGET: int = 0
+  # Rows validated and copied per transaction by the bulk import, and errors reported per import
+  BULK_IMPORT_CHUNK_SIZE: int = 5000
+  BULK_IMPORT_MAX_ERRORS: int = 1000
+  # Longest reservation accepted, in hours. Availability queries only scan reservations starting this long
+  # before their window, so raise it before importing or booking anything longer. Lowering it requires that
+  # no live reservation is longer, the 3b9e6f2d8a45 migration checks this when it is applied
+  RESERVATION_MAX_HOURS: int = 168
+  # Most occurrences a single batch or recurring reservation request may create
+  RESERVATION_BATCH_MAX_OCCURRENCES: int = 366
+  # Group commit of single bookings: queue them per lot and book up to MAX_BATCH of them per transaction,
+  # waiting at most MAX_WAIT_MS for a batch to fill up
+  BOOKING_PIPELINE_ENABLED: bool = False
+  BOOKING_PIPELINE_MAX_BATCH: int = 64
+  BOOKING_PIPELINE_MAX_WAIT_MS: int = 5
+  # Seconds the parking summary aggregates are cached between writes
+  SUMMARY_CACHE_TTL_SECONDS: int = 10
+  # Cell size of the nearest lot grid index in degrees (0.05 is about 5.5 km) and its reload period
+  GEO_INDEX_CELL_DEGREES: float = 0.05
+  GEO_INDEX_MAX_AGE_SECONDS: int = 300
+  # Monthly partitions of reservations and notifications created ahead of time, and retention in months (0 keeps everything)
+  PARTITION_MONTHS_AHEAD: int = 3
+  RESERVATION_RETENTION_MONTHS: int = 0
+  NOTIFICATION_RETENTION_MONTHS: int = 0
+  # What happens to expired partitions: "detach" keeps them as plain tables, "drop" deletes them
+  PARTITION_RETENTION_ACTION: Literal["detach", "drop"] = "detach"
+  # Estimated list totals below this many rows are replaced by an exact count
+  ESTIMATED_COUNT_THRESHOLD: int = 10000
+  # Reservation reminders: how often the outbox sweeper runs (the timing wheel fires them on time, the
+  # sweep only catches the ones it missed), reminders delivered per statement, and how long delivered
+  # reminders are kept in the outbox
+  NOTIFICATION_SWEEP_INTERVAL_SECONDS: int = 60
+  NOTIFICATION_SWEEP_BATCH_SIZE: int = 1000
+  SCHEDULED_NOTIFICATION_RETENTION_HOURS: int = 24
+  # Seconds an Idempotency-Key and its stored response are kept for replay
+  IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+  # Notification stream: events buffered per connection before it falls back to replaying from the database,
+  # and notifications read per replay query
+  NOTIFICATION_STREAM_QUEUE_SIZE: int = 100
+  NOTIFICATION_STREAM_REPLAY_BATCH: int = 200
+  # Notification retention: notifications older than this many days (0 keeps everything) are deleted, or moved to
+  # notifications_archive, by a background job running every NOTIFICATION_PURGE_INTERVAL_MINUTES in batches of
+  # NOTIFICATION_PURGE_BATCH_SIZE rows, one short transaction each
+  NOTIFICATION_PURGE_AFTER_DAYS: int = 90
+  NOTIFICATION_PURGE_ACTION: Literal["delete", "archive"] = "delete"
+  NOTIFICATION_PURGE_BATCH_SIZE: int = 5000
+  NOTIFICATION_PURGE_INTERVAL_MINUTES: int = 60
 
   model_config = SettingsConfigDict(
     env_file=".env",
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from app.core.config import get_config
-from app.utils import run_migrations, init_admin, scheduler
+from app.core.database import engine
+from app.utils import run_migrations, init_admin, scheduler, install_statement_budget, maintain_partitions, purge_idempotency_keys, purge_capacity_ledger, dispatch_due_notifications, reminder_wheel, load_pending_reminders, notification_retention
 from app.routes import register_routes
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,11 +14,38 @@ async def lifespan(app: FastAPI):
     run_migrations()
     init_admin()
 
+    # Prepare the upcoming monthly partitions now and every night
+    maintain_partitions()
+    scheduler.add_job(maintain_partitions, 'cron', hour=3, id="maintain_partitions", replace_existing=True)
+
+    # Deliver the due reservation reminders of the outbox
+    scheduler.add_job(
+      dispatch_due_notifications, 'interval', seconds=config.NOTIFICATION_SWEEP_INTERVAL_SECONDS,
+      id="dispatch_due_notifications", replace_existing=True, coalesce=True, max_instances=1
+    )
+
+    # Delete, or archive, the notifications past their retention
+    scheduler.add_job(
+      notification_retention.run, 'interval', minutes=config.NOTIFICATION_PURGE_INTERVAL_MINUTES,
+      id="purge_notifications", replace_existing=True, coalesce=True, max_instances=1
+    )
+
+    # Evict the expired idempotency keys
+    scheduler.add_job(purge_idempotency_keys, 'interval', hours=1, id="purge_idempotency_keys", replace_existing=True)
+
+    # Drop the capacity ledger buckets that ended
+    scheduler.add_job(purge_capacity_ledger, 'interval', hours=1, id="purge_capacity_ledger", replace_existing=True)
+
     # Start background job
     scheduler.start()
+
+    # Fire the pending reservation reminders on time
+    reminder_wheel.start()
+    load_pending_reminders()
     yield
 
     # Shutdown background job
+    reminder_wheel.stop()
     scheduler.shutdown(wait=False)
 
 config = get_config()
@@ -36,6 +64,10 @@ def create_app() -> FastAPI:
     allow_headers=["*"],
   )
 
+  # Fail requests over the SQL statement budget when enabled
+  if config.SQL_STATEMENT_BUDGET > 0:
+    install_statement_budget(app, engine, config.SQL_STATEMENT_BUDGET)
+
   # Register routes
   register_routes(app)
 
@@ -1,4 +1,8 @@
 from .user import User
 from .parking import ParkingLot
-from .reservation import Reservation
-from .notification import Notification
\ No newline at end of file
+from .reservation import Reservation, RESERVATION_STATUSES, get_reservation_status
+from .notification import Notification
+from .capacity_bucket import LotCapacityBucket
+from .idempotency_key import IdempotencyKey
+from .scheduled_notification import ScheduledNotification
+from .notification_archive import NotificationArchive
\ No newline at end of file
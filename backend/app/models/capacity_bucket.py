@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from app.core.database import Base
+
+class LotCapacityBucket(Base):
+  __tablename__ = "lot_capacity_buckets"
+
+  parking_id = Column(Integer, ForeignKey("parking_lots.id", ondelete="CASCADE"), primary_key=True)
+  bucket_start = Column(DateTime(timezone=True), primary_key=True)
+  reserved_count = Column(Integer, default=0, nullable=False)
+
+  def __repr__(self):
+    return f"<LotCapacityBucket(parking_id={self.parking_id}, bucket_start={self.bucket_start}, reserved_count={self.reserved_count})>"
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from app.core.database import Base
+
+class IdempotencyKey(Base):
+  __tablename__ = "idempotency_keys"
+
+  # Keys are scoped per endpoint and per user, anonymous requests use the owner 0 with keys scoped per client
+  scope = Column(String(50), primary_key=True)
+  owner_id = Column(Integer, primary_key=True)
+  key = Column(String(255), primary_key=True)
+  request_hash = Column(String(64), nullable=False)
+  status_code = Column(Integer, nullable=True)
+  # zlib compressed JSON body of the response, null while the request is being processed
+  response_body = Column(LargeBinary, nullable=True)
+  created_at = Column(DateTime(timezone=True), nullable=False)
+  expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+  def __repr__(self):
+    return f"<IdempotencyKey(scope={self.scope}, owner_id={self.owner_id}, key={self.key}, status_code={self.status_code})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index, func, text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -6,11 +6,18 @@ from app.core.database import Base
 
 class Notification(Base):
   __tablename__ = "notifications"
+  __table_args__ = (
+    # The inbox of a user, newest first, and its unread part
+    Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+    Index("ix_notifications_user_unread", "user_id", "created_at", "id", postgresql_where=text("is_read = false")),
+    {"postgresql_partition_by": "RANGE (created_at)"},
+  )
 
-  id = Column(Integer, primary_key=True, index=True)
+  id = Column(Integer, primary_key=True, index=True, autoincrement=True)
   user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
   message = Column(String, nullable=False)
-  created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+  # Notifications are range partitioned by month of created_at, the partition key is part of the primary key
+  created_at = Column(DateTime(timezone=True), primary_key=True, default=func.now(), server_default=func.now(), nullable=False)
   is_read = Column(Boolean, default=False, nullable=False)
 
   user = relationship("User", back_populates="notifications")
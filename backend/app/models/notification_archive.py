@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, func
+from app.core.database import Base
+
+class NotificationArchive(Base):
+  """Notifications moved out of the notifications table by the retention job, when it archives instead of deleting."""
+  __tablename__ = "notifications_archive"
+
+  id = Column(Integer, primary_key=True, autoincrement=False)
+  # No foreign key, archived notifications outlive the users they were sent to
+  user_id = Column(Integer, nullable=False, index=True)
+  message = Column(String, nullable=False)
+  created_at = Column(DateTime(timezone=True), nullable=False)
+  is_read = Column(Boolean, nullable=False)
+  archived_at = Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False)
+
+  def __repr__(self):
+    return f"<NotificationArchive(id={self.id}, user_id={self.user_id}, created_at={self.created_at}, archived_at={self.archived_at})>"
@@ -1,9 +1,12 @@
 from app.core.database import Base
-from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint, Boolean, Float, func
+from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint, Boolean, Float, Index, func
 from sqlalchemy.orm import validates, relationship
 
 class ParkingLot(Base):
   __tablename__ = 'parking_lots'
+  __table_args__ = (
+    Index("ix_parking_lots_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   name = Column(String(100), nullable=False, unique=True)
@@ -13,6 +16,8 @@ class ParkingLot(Base):
   updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
   rate=Column(Float, nullable=False, default=0)
   is_active = Column(Boolean, default=True, nullable=False)
+  latitude = Column(Float, nullable=True)
+  longitude = Column(Float, nullable=True)
 
   reservations = relationship("Reservation", back_populates="parking", cascade="all, delete-orphan")
   
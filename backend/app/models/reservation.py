@@ -1,15 +1,54 @@
 from app.core.database import Base
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, CheckConstraint, Boolean, Float, func, event
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, CheckConstraint, Boolean, Float, Index, ColumnElement, func, text, case, and_
+from sqlalchemy.ext.hybrid import hybrid_method
+from sqlalchemy.orm import relationship, query_expression
+from datetime import datetime
 from app.models.parking import ParkingLot
 
+# Reservation statuses, in their sort order
+RESERVATION_STATUSES = ("Active", "Upcoming", "Completed", "Cancelled")
+
+def get_reservation_status(is_cancelled: bool, start_time: datetime, end_time: datetime, now: datetime) -> str:
+  """Status of a reservation at `now`."""
+  if is_cancelled:
+    return "Cancelled"
+  if start_time > now:
+    return "Upcoming"
+  if end_time < now:
+    return "Completed"
+  return "Active"
+
+def reservation_status_predicates(is_cancelled, start_time, end_time, now) -> dict[str, ColumnElement]:
+  """
+  SQL predicate of each reservation status at `now`, mutually exclusive and in evaluation order.
+  Live reservations are matched on is_cancelled = false first so the partial indexes of the table serve them.
+  """
+  return {
+    "Cancelled": is_cancelled == True,
+    "Upcoming": and_(is_cancelled == False, start_time > now),
+    "Completed": and_(is_cancelled == False, end_time < now),
+    "Active": and_(is_cancelled == False, start_time <= now, end_time >= now),
+  }
+
+def reservation_status_case(is_cancelled, start_time, end_time, now, values: dict | None = None) -> ColumnElement:
+  """SQL CASE giving the status at `now`, or the value mapped to the status in `values`."""
+  values = values or {status: status for status in RESERVATION_STATUSES}
+  predicates = reservation_status_predicates(is_cancelled, start_time, end_time, now)
+  return case(
+    (predicates["Cancelled"], values["Cancelled"]),
+    (predicates["Upcoming"], values["Upcoming"]),
+    (predicates["Completed"], values["Completed"]),
+    else_=values["Active"],
+  )
+
 class Reservation(Base):
   __tablename__ = 'reservations'
 
-  id = Column(Integer, primary_key=True, index=True)
-  user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-  parking_id = Column(Integer, ForeignKey('parking_lots.id', ondelete='CASCADE'), nullable=False)
-  start_time = Column(DateTime(timezone=True), nullable=False)
+  id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+  user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+  parking_id = Column(Integer, ForeignKey('parking_lots.id', ondelete='CASCADE'), nullable=False, index=True)
+  # Reservations are range partitioned by month of start_time, the partition key is part of the primary key
+  start_time = Column(DateTime(timezone=True), primary_key=True, nullable=False)
   end_time = Column(DateTime(timezone=True), nullable=False)
   duration_hours = Column(Float, nullable=False, default=0.0)
   total_cost = Column(Float, nullable=False, default=0.0)
@@ -17,6 +56,8 @@ class Reservation(Base):
   created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
   updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
   notified = Column(Boolean, default=False, nullable=False)
+  # Status selected by the database, at the transaction time unless a query sets it with with_expression(status_at(now))
+  status = query_expression(reservation_status_case(is_cancelled, start_time, end_time, func.now()))
 
   user = relationship("User", back_populates="reservations")
   parking = relationship("ParkingLot", back_populates="reservations")
@@ -26,32 +67,39 @@ class Reservation(Base):
     name="check_start_time_before_end_time"
   )
 
+  __table_args__ = (
+    # Serves the capacity sweep: only live reservations ending after the window start are scanned
+    Index(
+      "ix_reservations_parking_window",
+      "parking_id", "end_time", "start_time",
+      postgresql_where=text("is_cancelled = false"),
+    ),
+    # Serve the status filters: upcoming on start_time, completed on end_time, cancelled by ID
+    Index("ix_reservations_live_start", "start_time", postgresql_where=text("is_cancelled = false")),
+    Index("ix_reservations_live_end", "end_time", postgresql_where=text("is_cancelled = false")),
+    Index("ix_reservations_cancelled", "id", postgresql_where=text("is_cancelled = true")),
+    {"postgresql_partition_by": "RANGE (start_time)"},
+  )
+
+  @hybrid_method
+  def status_at(self, now: datetime) -> str:
+    """Status of the reservation at `now`, usable in Python and in SQL."""
+    return get_reservation_status(self.is_cancelled, self.start_time, self.end_time, now)
+
+  @status_at.expression
+  def status_at(cls, now: datetime) -> ColumnElement:
+    return reservation_status_case(cls.is_cancelled, cls.start_time, cls.end_time, now)
+
+  @classmethod
+  def status_rank_at(cls, now: datetime) -> ColumnElement:
+    """Sort rank of the status at `now`, following RESERVATION_STATUSES."""
+    ranks = {status: rank for rank, status in enumerate(RESERVATION_STATUSES)}
+    return reservation_status_case(cls.is_cancelled, cls.start_time, cls.end_time, now, ranks)
+
+  @classmethod
+  def status_filter(cls, status: str, now: datetime) -> ColumnElement:
+    """SQL predicate matching the reservations with a status at `now`."""
+    return reservation_status_predicates(cls.is_cancelled, cls.start_time, cls.end_time, now)[status]
+
   def __repr__(self):
     return f"<Reservation(id={self.id}, user_id={self.user_id}, parking_id={self.parking_id}, start_time={self.start_time}, end_time={self.end_time}, is_cancelled={self.is_cancelled})>"
-
-@event.listens_for(Reservation, "before_insert")
-def calculate_duration_and_cost(mapper, connection, target: Reservation):
-  print(target.start_time, target.end_time, target.parking, target.is_cancelled, flush=True)
-
-  if (
-    target.start_time and 
-    target.end_time and 
-    not target.is_cancelled
-  ):
-    # Use the current connection to create a session
-    session = Session(bind=connection)
-    parking = session.query(ParkingLot).get(target.parking_id)
-
-    if parking and parking.rate is not None:
-        target.duration_hours = (
-            target.end_time - target.start_time
-        ).total_seconds() / 3600.0
-        rate = parking.rate
-        target.total_cost = round(target.duration_hours * rate, 2)
-    else:
-        target.duration_hours = 0.0
-        target.total_cost = 0.0
-    session.close()
-  else:
-    target.duration_hours = 0.0
-    target.total_cost = 0.0 
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, UniqueConstraint, text
+from app.core.database import Base
+
+class ScheduledNotification(Base):
+  """Outbox of the reservation reminders, delivered as notifications by the sweeper once due."""
+  __tablename__ = "scheduled_notifications"
+  __table_args__ = (
+    # One reminder of each kind per reservation, also serves the removal of a reservation's reminders
+    UniqueConstraint("reservation_id", "kind", name="uq_scheduled_notifications_reservation_kind"),
+    # Only the pending reminders are scanned by the sweeper
+    Index("ix_scheduled_notifications_pending", "due_at", postgresql_where=text("sent_at IS NULL")),
+  )
+
+  id = Column(BigInteger, primary_key=True, autoincrement=True)
+  # No foreign key, reservations are keyed by (id, start_time) since they are partitioned
+  reservation_id = Column(Integer, nullable=False)
+  user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+  kind = Column(String(20), nullable=False)
+  message = Column(String, nullable=False)
+  due_at = Column(DateTime(timezone=True), nullable=False)
+  sent_at = Column(DateTime(timezone=True), nullable=True)
+
+  def __repr__(self):
+    return f"<ScheduledNotification(id={self.id}, reservation_id={self.reservation_id}, kind={self.kind}, due_at={self.due_at}, sent_at={self.sent_at})>"
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, func, event
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func, event
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 class User(Base):
   __tablename__ = "users"
+  __table_args__ = (
+    Index("ix_users_first_name_trgm", "first_name", postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"}),
+    Index("ix_users_last_name_trgm", "last_name", postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"}),
+    Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   email = Column(String(100), unique=True, index=True, nullable=False)
@@ -14,6 +19,8 @@ class User(Base):
   is_active = Column(Boolean, default=True, nullable=False)
   last_login = Column(DateTime(timezone=True), nullable=True)
   last_seen = Column(DateTime(timezone=True), nullable=True)
+  # Unread notifications of the user, kept in step with every write to their notifications
+  unread_notifications_count = Column(Integer, default=0, server_default="0", nullable=False)
   created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
   updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
 
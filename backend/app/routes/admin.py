@@ -5,7 +5,7 @@ from sqlalchemy import func
 from app.core.database import get_db
 from app.models import User, Reservation, ParkingLot
 from app.schema import DashboardSummary
-from app.utils import get_admin_user, get_today_utc_range, get_month_utc_range
+from app.utils import get_admin_user, get_today_utc_range, get_month_utc_range, summary_cache, geo_index, booking_pipeline, reminder_wheel, notification_hub, notification_retention
 
 router = APIRouter(
   prefix="/admin",
@@ -100,4 +100,21 @@ def get_dashboard_summary(
     raise HTTPException(
       status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
       detail="An error occurred while fetching the dashboard summary."
-    )
\ No newline at end of file
+    )
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+def get_metrics(
+  current_user: User = Depends(get_admin_user)
+):
+  """
+  Get the counters of the in-process caches, indexes and background jobs.
+  Counters are per worker process.
+  """
+  return {
+    "summary_cache": summary_cache.stats(),
+    "geo_index": geo_index.stats(),
+    "booking_pipeline": booking_pipeline.stats(),
+    "reminder_wheel": reminder_wheel.stats(),
+    "notification_hub": notification_hub.stats(),
+    "notification_retention": notification_retention.stats(),
+  }
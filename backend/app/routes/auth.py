@@ -1,10 +1,10 @@
 from app.core.database import get_db
 from app.models import User
 from app.schema import UserCreate, UserResponse, UserProfile, LoginResponse
-from app.utils import hash_password, verify_password, create_token, get_current_user
+from app.utils import hash_password, verify_password, create_token, get_current_user, get_current_utc_time, begin_idempotent_request, save_idempotent_response, anonymous_idempotency_key
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header
 from datetime import datetime, timezone
 
 router = APIRouter(
@@ -13,11 +13,22 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(
+  user: UserCreate,
+  idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+  db: Session = Depends(get_db)
+):
   """
   Endpoint to register a new user.
+  A request repeating an Idempotency-Key gets the stored response back.
   """
   try:
+    # Anonymous requests share the owner 0, their keys are scoped to the email being registered
+    idempotency_key = anonymous_idempotency_key(idempotency_key, user.email)
+    replay = begin_idempotent_request(db, "auth.register", 0, idempotency_key, user, get_current_utc_time())
+    if replay is not None:
+      return replay
+
     # Check if the user already exists
     existing_user = db.query(User).filter(User.email == user.email).first()
 
@@ -32,12 +43,16 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
     new_user = User(**user.model_dump())
     db.add(new_user)
+    db.flush()
+
+    response = UserResponse.model_validate(new_user).model_dump()
+    save_idempotent_response(db, "auth.register", 0, idempotency_key, status.HTTP_201_CREATED, response)
     db.commit()
-    db.refresh(new_user)
 
-    return UserResponse.model_validate(new_user).model_dump()
+    return response
     
   except HTTPException as e:
+    db.rollback()
     raise e
   except Exception as e:
     print("Error registering user:", e, flush=True)
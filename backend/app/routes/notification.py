@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi.sse import EventSourceResponse, ServerSentEvent
 from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import AsyncIterator
 
 from app.core.database import get_db
 from app.models import Notification, User
-from app.schema import NotificationBase, NotificationResponse
-from app.utils import get_current_user
+from app.schema import NotificationBase, NotificationResponse, NotificationPage, UnreadNotificationsCount, NotificationBulkDelete
+from app.utils import get_current_user, apply_loading_plan, keyset_paginate, notification_hub, adjust_unread_count, mark_all_read, delete_notifications
 
 router = APIRouter(
   prefix="/notifications",
@@ -14,18 +17,45 @@ router = APIRouter(
 @router.get("/{user_id}", response_model=NotificationResponse, status_code=status.HTTP_200_OK)
 def get_notifications(
   user_id: int,
+  cursor: str = None,
+  limit: int = 20,
   db: Session = Depends(get_db),
   current_user: User = Depends(get_current_user)
 ):
   """
-  Retrieve all notifications for the current user.
+  Retrieve all notifications for the current user. \n
+  Pass a cursor (empty for the first page) to get the newest `limit` notifications per page instead.
   """
   try:
     if current_user.id != user_id:
       raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access these notifications.")
     
+    if cursor is not None:
+      # Counts of the whole inbox in one aggregate, then one page ordered newest first
+      counts = db.query(
+        func.count(Notification.id),
+        func.count(Notification.id).filter(Notification.is_read == True),
+      ).filter(Notification.user_id == user_id).one()
+
+      page_query = apply_loading_plan(db.query(Notification), NotificationBase, Notification).filter(Notification.user_id == user_id)
+      notifications, next_cursor = keyset_paginate(
+        page_query,
+        [(Notification.created_at, "desc"), (Notification.id, "desc")],
+        limit, cursor, sort="notifications:created_at:desc"
+      )
+
+      return NotificationResponse(
+        read_notifications=[notif for notif in notifications if notif.is_read],
+        unread_notifications=[notif for notif in notifications if not notif.is_read],
+        all_notifications_count=counts[0],
+        read_notifications_count=counts[1],
+        unread_notifications_count=counts[0] - counts[1],
+        next_cursor=next_cursor
+      ).model_dump()
+
     all_notifications = db.query(Notification).filter(Notification.user_id == user_id).order_by(Notification.created_at.desc())
     all_notifications_count = all_notifications.count()
+    all_notifications = apply_loading_plan(all_notifications, NotificationBase, Notification)
 
     # Read notifs
     read_notifications = all_notifications.filter(Notification.is_read == True).all()
@@ -50,6 +80,88 @@ def get_notifications(
     print(f"Unexpected error: {str(e)}")
     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.get("/{user_id}/inbox", response_model=NotificationPage, status_code=status.HTTP_200_OK)
+def get_notification_inbox(
+  user_id: int,
+  cursor: str = None,
+  limit: int = 20,
+  unread_only: bool = False,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+):
+  """
+  Get one page of the notifications of the current user, newest first, without their user. \n
+  Pass the `next_cursor` of a page as `cursor` to get the next page, and `unread_only` to list only the unread notifications. \n
+  The unread count is read from the user's counter, no notification is counted.
+  """
+  try:
+    if current_user.id != user_id:
+      raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access these notifications.")
+
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if unread_only:
+      query = query.filter(Notification.is_read == False)
+
+    notifications, next_cursor = keyset_paginate(
+      query,
+      [(Notification.created_at, "desc"), (Notification.id, "desc")],
+      limit, cursor, sort=f"notifications:inbox:{'unread' if unread_only else 'all'}"
+    )
+
+    return NotificationPage(
+      notifications=notifications,
+      unread_notifications_count=current_user.unread_notifications_count,
+      next_cursor=next_cursor
+    ).model_dump()
+
+  except HTTPException as e:
+    print(f"HTTPException: {e.detail}")
+    raise e
+  except Exception as e:
+    print(f"Unexpected error: {str(e)}")
+    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/{user_id}/unread-count", response_model=UnreadNotificationsCount, status_code=status.HTTP_200_OK)
+def get_unread_notifications_count(
+  user_id: int,
+  current_user: User = Depends(get_current_user)
+):
+  """
+  Get the number of unread notifications of the current user, for the notification badge. \n
+  Read from the counter on the user loaded by authentication, so it costs no query of its own.
+  """
+  if current_user.id != user_id:
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access these notifications.")
+  return UnreadNotificationsCount(unread_notifications_count=current_user.unread_notifications_count).model_dump()
+
+def get_stream_owner(
+  user_id: int,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+) -> int:
+  """
+  Dependency letting only the owner of the notifications open their stream.
+  The session is closed before the stream starts so an open stream does not hold a pooled connection.
+  """
+  if current_user.id != user_id:
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access these notifications.")
+  db.close()
+  return user_id
+
+@router.get("/{user_id}/stream", response_class=EventSourceResponse)
+async def stream_notifications(
+  last_id: int | None = None,
+  last_event_id: int | None = Header(None, alias="Last-Event-ID"),
+  user_id: int = Depends(get_stream_owner)
+) -> AsyncIterator[ServerSentEvent]:
+  """
+  Stream the new notifications of the current user as Server-Sent Events, instead of polling. \n
+  Each `notification` event carries one notification and its ID as the event ID, keep-alive comments are sent while idle. \n
+  Pass the last notification ID seen as `last_id`, or reconnect with the Last-Event-ID header, to get the notifications created since first.
+  """
+  async for item in notification_hub.stream(user_id, last_event_id if last_event_id is not None else last_id):
+    yield ServerSentEvent(data=item, event="notification", id=str(item.id))
+
 @router.patch("/{notification_id}/toggle-read", response_model=NotificationBase, status_code=status.HTTP_200_OK)
 def mark_notification_as_read(
   notification_id: int,
@@ -60,15 +172,17 @@ def mark_notification_as_read(
   Toggle the read status of a notification for the current user.
   """
   try:
+    # Lock the notification so concurrent toggles count it once
     notif = db.query(Notification).filter(
       Notification.id == notification_id,
       Notification.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     
     if not notif:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found.")
     
     notif.is_read = not notif.is_read 
+    adjust_unread_count(db, current_user.id, -1 if notif.is_read else 1)
     db.commit()
     db.refresh(notif)
     
@@ -89,20 +203,45 @@ def mark_all_notifications_as_read(
   current_user: User = Depends(get_current_user)
 ):
   """
-  Mark all notifications as read for the current user.
+  Mark all notifications as read for the current user, in one statement.
   """
   try:
     if current_user.id != user_id:
       raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to mark these notifications as read.")
       
-    notifs = db.query(Notification).filter(Notification.user_id == current_user.id, Notification.is_read == False).all()
-    
-    for notif in notifs:
-      notif.is_read = True
-    
+    marked = mark_all_read(db, current_user.id)
     db.commit()
     
-    return {"message": "All notifications marked as read."}
+    return {"message": "All notifications marked as read.", "marked": marked}
+  except HTTPException as e:
+    db.rollback()
+    print(f"HTTPException: {e.detail}")
+    raise e
+  except Exception as e:
+    db.rollback()
+    print(f"Unexpected error: {str(e)}")
+    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/{user_id}/bulk-delete", status_code=status.HTTP_200_OK)
+def bulk_delete_notifications(
+  user_id: int,
+  criteria: NotificationBulkDelete,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+):
+  """
+  Delete many notifications of the current user in one statement. \n
+  Without criteria every notification is deleted, otherwise only the listed `ids`, the read ones (`read_only`)
+  and the ones created `before` a datetime, combined.
+  """
+  try:
+    if current_user.id != user_id:
+      raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete these notifications.")
+
+    deleted = delete_notifications(db, current_user.id, criteria.ids, criteria.read_only, criteria.before)
+    db.commit()
+
+    return {"message": "Notifications deleted successfully.", "deleted": deleted}
   except HTTPException as e:
     db.rollback()
     print(f"HTTPException: {e.detail}")
@@ -125,11 +264,13 @@ def delete_notification(
     notif = db.query(Notification).filter(
       Notification.id == notification_id,
       Notification.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     
     if not notif:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found.")
     
+    if not notif.is_read:
+      adjust_unread_count(db, current_user.id, -1)
     db.delete(notif)
     db.commit()
     
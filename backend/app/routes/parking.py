@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from sqlalchemy import true, delete
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.utils import get_current_user, get_admin_user
-from app.models import ParkingLot, User, Reservation, Notification
-from app.schema import ParkingCreate, ParkingResponse, PaginatedParkingResponse, ParkingSummaryResponse
-from typing import Literal
+from app.utils import get_current_user, get_admin_user, cancel_lot_reservations, get_current_utc_time, lot_occupancy_lateral, load_lot_occupancy, apply_loading_plan, keyset_paginate, offset_paginate, search_parking_lots, search_rank, PARKING_SEARCH_COLUMNS, lot_availability_query, to_utc, import_parking_lots, get_parking_summary, summary_cache, geo_index, guess_import_format, notification_hub
+from app.models import ParkingLot, User
+from app.schema import ParkingCreate, ParkingResponse, PaginatedParkingResponse, ParkingSummaryResponse, ParkingDetailResponse, ParkingAvailabilityResponse, ParkingNearbyResponse, BulkImportResult
+from typing import Literal, List
+from datetime import datetime
+import io
 
 router = APIRouter(
   prefix="/parking",
@@ -36,6 +38,8 @@ async def create_parking_lot(
     db.add(new_parking_lot)
     db.commit()
     db.refresh(new_parking_lot)
+    summary_cache.invalidate()
+    geo_index.sync(new_parking_lot)
 
     new_parking_lot.available_slots = new_parking_lot.total_slots  # Initialize available slots
     return ParkingResponse.model_validate(new_parking_lot).model_dump()
@@ -52,6 +56,34 @@ async def create_parking_lot(
       detail="An error occurred while creating the parking lot."
     )
 
+@router.post("/lots/import", response_model=BulkImportResult, status_code=status.HTTP_200_OK)
+def import_parking_lots_file(
+  file: UploadFile = File(...),
+  format: Literal["csv", "ndjson"] | None = None,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_admin_user)
+):
+  """
+  Endpoint to bulk import parking lots from a CSV or NDJSON file.
+  Rows are validated and inserted in chunks, invalid rows are reported without failing the others.
+  param file: UploadFile - File with name, location, total_slots, rate and optionally latitude and longitude on each row.
+  param format: str - 'csv' or 'ndjson', guessed from the file name by default.
+  """
+  try:
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    result = import_parking_lots(db, stream, format or guess_import_format(file.filename))
+    summary_cache.invalidate()
+    geo_index.invalidate()
+    return result
+
+  except Exception as e:
+    db.rollback()
+    print(f"Error importing parking lots: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="An error occurred while importing the parking lots."
+    )
+
 @router.get("/lots", response_model=PaginatedParkingResponse, status_code=status.HTTP_200_OK)
 async def get_parking_lots(
   db: Session = Depends(get_db),
@@ -60,31 +92,58 @@ async def get_parking_lots(
   page: int = 1,
   name: str = None,
   status: Literal["active", "inactive", "all"] = "all",
+  sort: Literal["id", "relevance"] = "id",
+  cursor: str = None,
+  count: Literal["exact", "estimated"] = "exact",
 ):
   """
   Endpoint to retrieve a list of parking lots. \n
   param limit: int - The maximum number of parking lots to return. \n
   param page: int - The page number for pagination. \n
-  param detailed: bool - Whether to return detailed information about the parking lots.
+  param name: str - Search term matched against the parking lot name. \n
+  param sort: str - Sort by ID or by search relevance when a name is given. \n
+  param cursor: str - Cursor of the previous page, pass an empty cursor to start cursor pagination without a total count. \n
+  param count: str - Exact total, or the planner's estimate for large results (estimated).
   """
   try:
-    # Calculate offset for pagination
-    offset = (page - 1) * limit
-
     filtered_query = db.query(ParkingLot).filter(
       ParkingLot.is_active == (status == "active") if status in ["active", "inactive"] else True,
-      ParkingLot.name.ilike(f"%{name}%") if name else True
+      search_parking_lots(name) if name else True
     )
-    total = filtered_query.count()
-    total_pages = (total + limit - 1) // limit
-    lots = filtered_query.offset(offset).limit(limit).all()
+
+    # Count the active and upcoming reservations of the page in the same statement
+    occupancy = lot_occupancy_lateral(get_current_utc_time())
+    page_query = filtered_query.add_columns(
+      occupancy.c.active_reservations,
+      occupancy.c.upcoming_reservations
+    ).outerjoin(occupancy, true())
+
+    keys = [(ParkingLot.id, "asc")]
+    if sort == "relevance" and name:
+      keys.insert(0, (search_rank(PARKING_SEARCH_COLUMNS, name), "desc"))
+
+    total = total_pages = next_cursor = None
+    total_is_estimate = False
+    if cursor is not None:
+      rows, next_cursor = keyset_paginate(page_query, keys, limit, cursor, sort=f"lots:{sort}:{name}")
+    else:
+      rows, total, total_is_estimate = offset_paginate(page_query, keys, page, limit, count, filtered_query)
+      total_pages = (total + limit - 1) // limit
+
+    lots = []
+    for lot, active_reservations, upcoming_reservations in rows:
+      lot.active_reservations = active_reservations
+      lot.upcoming_reservations = upcoming_reservations
+      lots.append(lot)
     
     return PaginatedParkingResponse(
       parking_lots=lots,
       total=total,
       page=page,
       limit=limit,
-      total_pages=total_pages
+      total_pages=total_pages,
+      total_is_estimate=total_is_estimate,
+      next_cursor=next_cursor
     ).model_dump()
 
   except HTTPException as e:
@@ -97,25 +156,146 @@ async def get_parking_lots(
       detail="An error occurred while retrieving parking lots."
     )
 
-@router.get("/lots/{parking_lot_id}", response_model=ParkingResponse, status_code=status.HTTP_200_OK)
+@router.get("/availability", response_model=List[ParkingAvailabilityResponse], status_code=status.HTTP_200_OK)
+async def get_parking_availability(
+  start: datetime,
+  end: datetime,
+  min_free: int = 1,
+  sort: Literal["free", "rate"] = "free",
+  limit: int = 20,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user),
+):
+  """
+  Endpoint to find the active parking lots with free capacity over a time window. \n
+  param start: datetime - Start of the requested window. \n
+  param end: datetime - End of the requested window. \n
+  param min_free: int - Minimum number of slots that must stay free for the whole window. \n
+  param sort: str - Order by most free slots or by the lowest rate. \n
+  param limit: int - The maximum number of parking lots to return.
+  """
+  try:
+    if start.tzinfo is None or end.tzinfo is None:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Start and end must include a timezone."
+      )
+
+    start, end = to_utc(start), to_utc(end)
+    if start >= end:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Start must be before end."
+      )
+
+    rows = db.execute(lot_availability_query(start, end, min_free, sort).limit(limit)).all()
+
+    lots = []
+    for lot, peak_reserved, free_slots in rows:
+      lot.peak_reserved = peak_reserved
+      lot.free_slots = free_slots
+      lots.append(ParkingAvailabilityResponse.model_validate(lot).model_dump())
+    return lots
+
+  except HTTPException as e:
+    print(f"Error retrieving parking availability: {e.detail}", flush=True)
+    raise e
+  except Exception as e:
+    print(f"Error retrieving parking availability: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="An error occurred while retrieving parking availability."
+    )
+
+@router.get("/nearby", response_model=List[ParkingNearbyResponse], status_code=status.HTTP_200_OK)
+async def get_nearby_parking_lots(
+  latitude: float,
+  longitude: float,
+  k: int = 10,
+  radius_km: float = None,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user),
+):
+  """
+  Endpoint to find the nearest active parking lots of a point, closest first. \n
+  param latitude: float - Latitude of the point in degrees. \n
+  param longitude: float - Longitude of the point in degrees. \n
+  param k: int - The maximum number of parking lots to return. \n
+  param radius_km: float - Only return parking lots within this distance in kilometers.
+  """
+  try:
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Latitude must be between -90 and 90 and longitude between -180 and 180."
+      )
+    if not 1 <= k <= 100 or (radius_km is not None and radius_km <= 0):
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="K must be between 1 and 100 and the radius must be positive."
+      )
+
+    # The grid index finds the candidates, only those lots are loaded with their live occupancy
+    distances = dict(geo_index.nearest(db, latitude, longitude, k, radius_km))
+    if not distances:
+      return []
+
+    occupancy = lot_occupancy_lateral(get_current_utc_time())
+    rows = db.query(ParkingLot).add_columns(
+      occupancy.c.active_reservations,
+      occupancy.c.upcoming_reservations
+    ).outerjoin(occupancy, true()).filter(
+      ParkingLot.id.in_(distances.keys()),
+      ParkingLot.is_active == True
+    ).all()
+
+    lots = []
+    for lot, active_reservations, upcoming_reservations in rows:
+      lot.active_reservations = active_reservations
+      lot.upcoming_reservations = upcoming_reservations
+      lot.distance_km = round(distances[lot.id], 3)
+      lots.append(lot)
+    lots.sort(key=lambda lot: lot.distance_km)
+
+    return [ParkingNearbyResponse.model_validate(lot).model_dump() for lot in lots]
+
+  except HTTPException as e:
+    print(f"Error retrieving nearby parking lots: {e.detail}", flush=True)
+    raise e
+  except Exception as e:
+    print(f"Error retrieving nearby parking lots: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="An error occurred while retrieving nearby parking lots."
+    )
+
+@router.get("/lots/{parking_lot_id}", response_model=ParkingDetailResponse, status_code=status.HTTP_200_OK)
 async def get_parking_lot(
   parking_lot_id: int,
+  include_reservations: bool = False,
   db: Session = Depends(get_db),
   current_user: User = Depends(get_current_user),
 ):
   """
   Endpoint to retrieve a parking lot by its ID. \n
-  param parking_lot_id: int - The ID of the parking lot to be retrieved.
+  param parking_lot_id: int - The ID of the parking lot to be retrieved. \n
+  param include_reservations: bool - Whether to include every reservation of the parking lot.
   """
   try:
     # Retrieve the parking lot by ID
-    parking_lot = db.query(ParkingLot).filter(ParkingLot.id == parking_lot_id).first()
+    query = db.query(ParkingLot).filter(ParkingLot.id == parking_lot_id)
+    if include_reservations:
+      query = apply_loading_plan(query, ParkingDetailResponse, ParkingLot)
+    parking_lot = query.first()
     if not parking_lot:
       raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Parking lot not found."
       )
     
+    load_lot_occupancy(db, parking_lot, get_current_utc_time())
+    if include_reservations:
+      return ParkingDetailResponse.model_validate(parking_lot).model_dump()
     return ParkingResponse.model_validate(parking_lot).model_dump()
 
   except HTTPException as e:
@@ -164,7 +344,10 @@ async def update_parking_lot(
     
     db.commit()
     db.refresh(parking_lot)
+    summary_cache.invalidate()
+    geo_index.sync(parking_lot)
 
+    load_lot_occupancy(db, parking_lot, get_current_utc_time())
     return ParkingResponse.model_validate(parking_lot).model_dump()
   except HTTPException as e:
     db.rollback()
@@ -197,25 +380,19 @@ async def delete_parking_lot(
         detail="Parking lot not found."
       )
     
-    # Cancel all reservations for this parking lot
-    reservations = db.query(Reservation).filter(
-      Reservation.parking_id == parking_lot.id,
-      Reservation.is_cancelled == False,
+    # Cancel all reservations for this parking lot and notify their users
+    notifications = cancel_lot_reservations(
+      db,
+      parking_lot.id,
+      f"Your reservation for parking lot '{parking_lot.name}' has been cancelled due to the lot being deleted.",
     )
-    for reservation in reservations:
-      reservation.is_cancelled = True
-      # Create a notification for the user
-      notification = Notification(
-        user_id = reservation.user_id,
-        message = f"Your reservation for parking lot '{parking_lot.name}' has been cancelled due to the lot being deleted.",
-      )
-      reservation.notified = True
-      db.add(notification)
-      db.add(reservation)
 
-    # Delete the parking lot
-    db.delete(parking_lot)
+    # Delete the parking lot, its reservations are removed by the foreign key cascade
+    db.execute(delete(ParkingLot).where(ParkingLot.id == parking_lot.id))
     db.commit()
+    summary_cache.invalidate()
+    geo_index.remove(parking_lot_id)
+    notification_hub.publish(notifications)
 
     return {
       "detail": "Parking lot deleted successfully."
@@ -242,23 +419,13 @@ async def get_parking_summary(
   Endpoint to retrieve a summary of parking lots.
   """
   try:
-    query = db.query(ParkingLot)
-    now = func.now()
-
-    total_parking_lots = query.count()
-    total_active_parking_lots = query.filter(ParkingLot.is_active == True).count()
-    total_available_slots = db.query(func.sum(ParkingLot.total_slots)).scalar() or 0
-    total_reserved_slots = db.query(Reservation).filter(
-      Reservation.end_time > now,
-      Reservation.is_cancelled == False
-    ).count()
-
-    return ParkingSummaryResponse(
-      total_parking_lots=total_parking_lots,
-      total_active_parking_lots=total_active_parking_lots,
-      total_available_slots=total_available_slots,
-      total_reserved_slots=total_reserved_slots
-    ).model_dump()
+    # The summary is shared by every user, it is cached until the next lot or reservation write
+    summary = summary_cache.get_or_compute(
+      "parking_summary",
+      lambda: get_parking_summary(db, get_current_utc_time()),
+    )
+
+    return ParkingSummaryResponse(**summary).model_dump()
 
   except HTTPException as e:
     print(f"Error retrieving parking summary: {e.detail}", flush=True)
@@ -292,27 +459,20 @@ async def toggle_parking_lot_status(
     # Toggle the status
     parking_lot.is_active = not parking_lot.is_active
 
-    # If toggling to inactive, cancel all reservations
+    # If toggling to inactive, cancel all reservations and notify their users
+    notifications = []
     if not parking_lot.is_active:
-      reservations = db.query(Reservation).filter(
-        Reservation.parking_id == parking_lot.id,
-        Reservation.is_cancelled == False,
+      notifications = cancel_lot_reservations(
+        db,
+        parking_lot.id,
+        f"Your reservation for parking lot '{parking_lot.name}' has been cancelled due to the lot being deactivated.",
       )
-      
-      # Cancel all reservations for this parking lot
-      for reservation in reservations:
-        reservation.is_cancelled = True
-        # Create a notification for the user
-        notification = Notification(
-          user_id = reservation.user_id,
-          message = f"Your reservation for parking lot '{parking_lot.name}' has been cancelled due to the lot being deactivated.",
-        )
-        reservation.notified = True
-        db.add(notification)
-        db.add(reservation)
 
     db.commit()
     db.refresh(parking_lot)
+    summary_cache.invalidate()
+    geo_index.sync(parking_lot)
+    notification_hub.publish(notifications)
 
     return {
       "detail": "Parking lot status toggled successfully.",
@@ -1,12 +1,18 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import select, String, or_, and_
-from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session, with_expression
+from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header
+from fastapi.responses import JSONResponse
 from typing import Literal
+from datetime import datetime
+import io
 
-from app.models import Reservation, User, ParkingLot, Notification
-from app.schema import ReservationCreate, ReservationResponse, PaginatedReservations, ReservationSummary
+from app.models import Reservation, User, ParkingLot
+from app.schema import ReservationCreate, ReservationResponse, PaginatedReservations, ReservationSummary, ReservationQuote, ReservationBatchCreate, ReservationBatchResult, ReservationBatchFailure, BulkImportResult
 from app.core.database import get_db
-from app.utils import get_current_user, is_valid_request, get_admin_user, sort_reservations, get_current_utc_time, sort_by_status, send_notification_for_reservation, scheduler
+from app.core.config import get_config
+from app.utils import get_current_user, is_valid_request, get_admin_user, get_current_utc_time, schedule_reservation_reminders, unschedule_reservation_reminders, release_capacity, apply_loading_plan, keyset_paginate, offset_paginate, get_cursor_now, get_reservation_sort_keys, search_reservations, import_reservations, guess_import_format, summary_cache, calculate_price, get_batch_windows, book_reservation_batch, begin_idempotent_request, save_idempotent_response, booking_pipeline, notification_hub, create_notification
+
+config = get_config()
 
 router = APIRouter(
   prefix="/reservations",
@@ -16,37 +22,59 @@ router = APIRouter(
 @router.post("/", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED)
 async def create_reservation(
   reservation: ReservationCreate,
+  idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
   db: Session = Depends(get_db),
   current_user: User = Depends(get_current_user)
 ):
   """
   Create a new reservation.
+  A request repeating an Idempotency-Key gets the stored response back without booking again.
   param reservation: ReservationCreate
+  param idempotency_key: Optional key making retries of the request safe.
   """
   now = get_current_utc_time()
 
   try:
-    # Lock the parking lot to prevent concurrent modifications
-    parking_lot = db.execute(
-      select(ParkingLot)
-      .where(ParkingLot.id == reservation.parking_id)
-      .with_for_update()
-    ).scalar_one_or_none()
+    if config.BOOKING_PIPELINE_ENABLED:
+      # Queue the booking with the other bookings of the lot, the lot's writer commits them together
+      # with the idempotency key and its response. The request's session is closed first so waiting bookings
+      # do not hold pooled connections the lot's writer needs, the loaded user stays usable detached
+      db.close()
+      new_reservation = await booking_pipeline.submit(reservation, current_user, idempotency_key)
+      if isinstance(new_reservation, JSONResponse):
+        return new_reservation
+      response = ReservationResponse.model_validate(new_reservation).model_dump()
+    else:
+      replay = begin_idempotent_request(db, "reservations.create", current_user.id, idempotency_key, reservation, now)
+      if replay is not None:
+        return replay
 
-    # Check if the request is valid
-    is_valid_request(now, reservation, parking_lot, current_user, db)
+      # Share-lock the parking lot so it cannot be updated or deactivated mid-booking,
+      # concurrent bookings only wait on each other through the ledger buckets they share
+      parking_lot = db.execute(
+        select(ParkingLot)
+        .where(ParkingLot.id == reservation.parking_id)
+        .with_for_update(read=True)
+      ).scalar_one_or_none()
 
-    # Create the reservation
-    new_reservation = Reservation(**reservation.model_dump())
-    db.add(new_reservation)
-    db.commit()
-    db.refresh(new_reservation)
+      # Check if the request is valid and claim a slot over the window
+      is_valid_request(now, reservation, parking_lot, current_user, db)
 
-    # Create a notification for the user
-    send_notification_for_reservation(new_reservation, db)
+      # Create the reservation and its reminders
+      new_reservation = Reservation(**reservation.model_dump())
+      db.add(new_reservation)
+      db.flush()
+      schedule_reservation_reminders(db, [new_reservation], now)
+
+      # The response is stored with the idempotency key in the booking transaction
+      response = ReservationResponse.model_validate(new_reservation).model_dump()
+      save_idempotent_response(db, "reservations.create", current_user.id, idempotency_key, status.HTTP_201_CREATED, response)
+      db.commit()
+      db.refresh(new_reservation)
+      summary_cache.invalidate()
 
     # Return the created reservation
-    return ReservationResponse.model_validate(new_reservation).model_dump()
+    return response
   except HTTPException as e:
     db.rollback()
     print(f"Validation error: {e.detail}", flush=True)
@@ -59,6 +87,149 @@ async def create_reservation(
       detail="Failed to create reservation. Please check your input and try again."
     )
 
+@router.post("/batch", response_model=ReservationBatchResult, status_code=status.HTTP_201_CREATED)
+async def create_reservation_batch(
+  batch: ReservationBatchCreate,
+  idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+):
+  """
+  Create many reservations on one parking lot in a single transaction.
+  The windows are given as a list or as a daily/weekly recurrence rule.
+  In all_or_nothing mode a single rejected window fails the request, in best_effort mode
+  the valid windows are booked and the rejected ones are reported.
+  param batch: ReservationBatchCreate
+  param idempotency_key: Optional key making retries of the request safe.
+  """
+  now = get_current_utc_time()
+
+  try:
+    replay = begin_idempotent_request(db, "reservations.batch", current_user.id, idempotency_key, batch, now)
+    if replay is not None:
+      return replay
+
+    windows = get_batch_windows(batch)
+
+    # Share-lock the parking lot like a single booking does
+    parking_lot = db.execute(
+      select(ParkingLot)
+      .where(ParkingLot.id == batch.parking_id)
+      .with_for_update(read=True)
+    ).scalar_one_or_none()
+
+    created, failures = book_reservation_batch(
+      db, now, windows, parking_lot, current_user,
+      all_or_nothing=batch.mode == "all_or_nothing"
+    )
+
+    if failures and batch.mode == "all_or_nothing":
+      start_time, end_time, error = failures[0]
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Reservation from {start_time.isoformat()} to {end_time.isoformat()} cannot be made: {error}"
+      )
+
+    response = ReservationBatchResult(
+      created=[ReservationResponse.model_validate(reservation) for reservation in created],
+      failed=[
+        ReservationBatchFailure(start_time=start_time, end_time=end_time, error=error)
+        for start_time, end_time, error in failures
+      ]
+    ).model_dump()
+    save_idempotent_response(db, "reservations.batch", current_user.id, idempotency_key, status.HTTP_201_CREATED, response)
+    schedule_reservation_reminders(db, created, now)
+    db.commit()
+    summary_cache.invalidate()
+
+    return response
+  except HTTPException as e:
+    db.rollback()
+    print(f"Validation error: {e.detail}", flush=True)
+    raise e
+  except Exception as e:
+    db.rollback()
+    print(f"Error creating reservations: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Failed to create reservations. Please check your input and try again."
+    )
+
+@router.get("/quote", response_model=ReservationQuote, status_code=status.HTTP_200_OK)
+def get_reservation_quote(
+  parking_id: int,
+  start_time: datetime,
+  end_time: datetime,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+):
+  """
+  Quote the price of a reservation window, priced exactly like a booking.
+  param parking_id: ID of the parking lot
+  param start_time: Start of the reservation
+  param end_time: End of the reservation
+  """
+  try:
+    if start_time >= end_time:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Start time must be before end time."
+      )
+
+    parking_lot = db.query(ParkingLot).filter(ParkingLot.id == parking_id).first()
+    if not parking_lot:
+      raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Parking lot not found."
+      )
+
+    price = calculate_price(start_time, end_time, parking_lot.rate)
+    return ReservationQuote(
+      parking_id=parking_id,
+      start_time=start_time,
+      end_time=end_time,
+      rate=parking_lot.rate,
+      duration_hours=price.duration_hours,
+      total_cost=price.total_cost
+    ).model_dump()
+
+  except HTTPException as e:
+    print(f"Error quoting reservation: {e.detail}", flush=True)
+    raise e
+  except Exception as e:
+    print(f"Error quoting reservation: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="An error occurred while quoting the reservation."
+    )
+
+@router.post("/import", response_model=BulkImportResult, status_code=status.HTTP_200_OK)
+def import_reservations_file(
+  file: UploadFile = File(...),
+  format: Literal["csv", "ndjson"] | None = None,
+  db: Session = Depends(get_db),
+  current_user: User = Depends(get_admin_user)
+):
+  """
+  Bulk import historical reservations from a CSV or NDJSON file.
+  Durations and costs are computed from the lot rates, capacity is not checked and no reminders are scheduled.
+  param file: File with user_id, parking_id, start_time, end_time and optionally is_cancelled on each row.
+  param format: 'csv' or 'ndjson', guessed from the file name by default.
+  """
+  try:
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    result = import_reservations(db, stream, format or guess_import_format(file.filename))
+    summary_cache.invalidate()
+    return result
+
+  except Exception as e:
+    db.rollback()
+    print(f"Error importing reservations: {e}", flush=True)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="An error occurred while importing the reservations."
+    )
+
 @router.get("/", response_model=PaginatedReservations, status_code=status.HTTP_200_OK)
 async def get_reservations(
   page: int = 1,
@@ -67,6 +238,8 @@ async def get_reservations(
   sort: Literal["id", "user", "status", "time", "name", "parking"] = "id",
   order: Literal["asc", "desc"] = "asc",
   status: Literal["active", "upcoming", "completed", "cancelled", "all"] = "all", 
+  cursor: str = None,
+  count: Literal["exact", "estimated"] = "exact",
   db: Session = Depends(get_db),
   current_user: User = Depends(get_current_user)
 ):
@@ -75,40 +248,36 @@ async def get_reservations(
   param page: Page number for pagination\n
   param limit: Number of reservations per page \n
   param term: Search term to filter reservations by id, name, or parking lot name \n
-  param status: Filter reservations by status (active, upcoming, completed, cancelled)
+  param status: Filter reservations by status (active, upcoming, completed, cancelled) \n
+  param cursor: Cursor of the previous page, pass an empty cursor to start cursor pagination without a total count \n
+  param count: Exact total, or the planner's estimate for large results (estimated)
   """
 
   try:
-    now = get_current_utc_time()
+    # Cursor pages keep the time of the first page so statuses do not shift between pages
+    sort_signature = f"reservations:{sort}:{order}"
+    now = get_cursor_now(cursor, sort_signature, get_current_utc_time())
+    # Filter, sort and serialize on the same SQL status evaluated at `now`
     query = db.query(Reservation).join(Reservation.user).join(Reservation.parking).filter(
-      or_(
-        Reservation.id.cast(String).ilike(f"%{term}%") if term else True,
-        User.first_name.ilike(f"%{term}%") | User.last_name.ilike(f"%{term}%") if term else True,
-        ParkingLot.name.ilike(f"%{term}%") if term else True,
-      ),
-      Reservation.is_cancelled == (status == "cancelled") if status == "cancelled" else True,
-      and_(
-        Reservation.start_time <= now,
-        Reservation.end_time >= now,
-        Reservation.is_cancelled == False
-      ) if status == "active" else True,
-      and_(
-        Reservation.start_time > now,
-        Reservation.is_cancelled == False
-      ) if status == "upcoming" else True,
-      and_(
-        Reservation.end_time < now,
-        Reservation.is_cancelled == False,
-      ) if status == "completed" else True,
-    )
+      search_reservations(term) if term else True,
+      Reservation.status_filter(status.capitalize(), now) if status != "all" else True,
+    ).options(with_expression(Reservation.status, Reservation.status_at(now)))
 
-    total = query.count()
-    total_pages = (total + limit - 1) // limit
-    if (sort == "status"):
-      reservations = sort_by_status(now=now, query=query, sort_order=order)
+    total = total_pages = next_cursor = None
+    total_is_estimate = False
+    if cursor is not None:
+      keys = get_reservation_sort_keys(sort, order, now)
+      reservations, next_cursor = keyset_paginate(
+        apply_loading_plan(query, ReservationResponse, Reservation),
+        keys, limit, cursor, sort=sort_signature, now=now
+      )
     else:
-      reservations = sort_reservations(query, sort, order)
-    reservations = reservations.offset((page - 1) * limit).limit(limit).all()
+      # The total comes back with the page in the same statement
+      reservations, total, total_is_estimate = offset_paginate(
+        apply_loading_plan(query, ReservationResponse, Reservation),
+        get_reservation_sort_keys(sort, order, now), page, limit, count, query
+      )
+      total_pages = (total + limit - 1) // limit
 
     return PaginatedReservations(
       reservations=reservations,
@@ -116,6 +285,8 @@ async def get_reservations(
       page=page,
       limit=limit,
       total_pages=total_pages,
+      total_is_estimate=total_is_estimate,
+      next_cursor=next_cursor,
     ).model_dump()
 
   except HTTPException as e:
@@ -186,8 +357,9 @@ async def cancel_reservation(
   try:
     now = get_current_utc_time()
 
+    # Lock the row so concurrent cancels of the same reservation release its capacity only once
     reservation = db.execute(
-      select(Reservation).where(Reservation.id == reservation_id)
+      select(Reservation).where(Reservation.id == reservation_id).with_for_update()
     ).scalar_one_or_none()
 
     if not reservation:
@@ -212,23 +384,19 @@ async def cancel_reservation(
 
     # Update the reservation status
     reservation.is_cancelled = True
+    release_capacity(db, reservation.parking_id, reservation.start_time, reservation.end_time)
 
-    # remove the scheduled notifications for this reservation
-    for suffix in ["start_30", "start_exact", "end_30", "end_exact"]:
-      job_id = f"notify_{suffix}_{reservation.id}"
-      if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    # Remove the pending reminders of this reservation
+    unschedule_reservation_reminders(db, [reservation.id])
 
     # Create a notification for the user
-    notif = Notification(
-      user_id = reservation.user_id,
-      message = f"Your reservation for {reservation.parking.name} has been cancelled.",
-    )
+    notif = create_notification(db, reservation.user_id, f"Your reservation for {reservation.parking.name} has been cancelled.")
     reservation.notified = True
 
-    db.add(notif)
     db.commit()
     db.refresh(reservation)
+    summary_cache.invalidate()
+    notification_hub.publish([notif])
 
     return {"message": "Reservation cancelled successfully."}
 
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, with_expression
 from sqlalchemy import or_, func
 from datetime import datetime, timezone, timedelta
 from typing import Literal
 
 from app.core.database import get_db
-from app.models import User, Reservation, Notification
-from app.schema import UserBase, UserResponse, UpdatePassword, AdminUserSummary, PaginatedUsers, UserDashboardSummary, UserReservationSummary
-from app.utils import get_current_user, verify_password, hash_password, get_admin_user, get_current_utc_time, get_today_utc_range, get_month_utc_range
+from app.models import User, Reservation
+from app.schema import UserBase, UserResponse, UpdatePassword, AdminUserSummary, PaginatedUsers, UserDashboardSummary, UserReservationSummary, ReservationResponse
+from app.utils import get_current_user, verify_password, hash_password, get_admin_user, get_current_utc_time, get_today_utc_range, get_month_utc_range, apply_loading_plan, keyset_paginate, offset_paginate, search_users, search_rank, USER_SEARCH_COLUMNS, notification_hub, create_notification
 
 router = APIRouter(
   prefix="/users",
@@ -155,34 +155,48 @@ async def get_users(
   q: str = None,
   status: Literal["active", "inactive"] = None,
   role: Literal["user", "admin"] = None,
+  sort: Literal["id", "relevance"] = "id",
+  cursor: str = None,
+  count: Literal["exact", "estimated"] = "exact",
   db: Session = Depends(get_db),
   current_user: User = Depends(get_admin_user)
 ):
   """
   Get a paginated list of users. \n
   Only accessible by admin users. \n
+  param q: Search term matched against names and email \n
+  param sort: Sort by ID or by search relevance when a search term is given \n
+  param cursor: Cursor of the previous page, pass an empty cursor to start cursor pagination without a total count \n
+  param count: Exact total, or the planner's estimate for large results (estimated)
   """
 
   try: 
     query = db.query(User).filter(
-      or_(
-        User.first_name.ilike(f"%{q}%") if q else True,
-        User.last_name.ilike(f"%{q}%") if q else True,
-        User.email.ilike(f"%{q}%") if q else True
-      ),
+      search_users(q) if q else True,
       User.is_active == (status == "active") if status else True,
       User.role == role if role else True,
     )
-    total = query.count()
-    total_pages = (total + limit - 1) // limit
-    users = query.offset((page - 1) * limit).limit(limit).all()
+
+    keys = [(User.id, "asc")]
+    if sort == "relevance" and q:
+      keys.insert(0, (search_rank(USER_SEARCH_COLUMNS, q), "desc"))
+
+    total = total_pages = next_cursor = None
+    total_is_estimate = False
+    if cursor is not None:
+      users, next_cursor = keyset_paginate(query, keys, limit, cursor, sort=f"users:{sort}:{q}")
+    else:
+      users, total, total_is_estimate = offset_paginate(query, keys, page, limit, count)
+      total_pages = (total + limit - 1) // limit
 
     return PaginatedUsers(
       users=users,
       total=total,
       page=page,
       limit=limit,
-      total_pages=total_pages
+      total_pages=total_pages,
+      total_is_estimate=total_is_estimate,
+      next_cursor=next_cursor
     ).model_dump()
 
   except HTTPException as e:
@@ -219,14 +233,11 @@ async def deactivate_user(
     user.is_active = False
 
     # Create a notification for the user
-    notif = Notification(
-      user_id = user.id,
-      message = message,
-    )
+    notif = create_notification(db, user.id, message)
 
-    db.add(notif)
     db.commit()
     db.refresh(user)
+    notification_hub.publish([notif])
 
     return {
       "message": "User deactivated successfully."
@@ -267,14 +278,11 @@ async def activate_user(
     user.is_active = True
 
     # Create a notification for the user
-    notif = Notification(
-      user_id = user.id,
-      message = f"Your account has been activated. You can now log in.",
-    )
+    notif = create_notification(db, user.id, "Your account has been activated. You can now log in.")
 
-    db.add(notif)
     db.commit()
     db.refresh(user)
+    notification_hub.publish([notif])
 
     return {
       "message": "User activated successfully."
@@ -353,7 +361,10 @@ async def get_user_dashboard_summary(
     ).scalar() or 0.0
 
     # Fetch the active and upcoming reservations for the user
-    recent_reservations = db.query(Reservation).filter(
+    # Statuses are serialized at the same `now` as the counts above
+    recent_reservations = apply_loading_plan(db.query(Reservation), ReservationResponse, Reservation).options(
+      with_expression(Reservation.status, Reservation.status_at(now))
+    ).filter(
       Reservation.user_id == user_id,
       Reservation.is_cancelled == False,
       or_(
@@ -409,17 +420,15 @@ async def get_user_reservation_summary(
     # Fetch all reservations for the user
     all_reservation_count = reservation_query.count()
 
+    # Statuses are filtered and serialized at the same `now`
+    status_at_now = with_expression(Reservation.status, Reservation.status_at(now))
+
     # Fetch active reservations for the user
-    active_reservations = reservation_query.filter(
-      Reservation.start_time <= now,
-      Reservation.end_time >= now
-    )
+    active_reservations = reservation_query.filter(Reservation.status_filter("Active", now)).options(status_at_now)
     active_reservation_count = active_reservations.count()
 
     # Fetch upcoming reservations for the user
-    upcoming_reservations = reservation_query.filter(
-      Reservation.start_time > now
-    )
+    upcoming_reservations = reservation_query.filter(Reservation.status_filter("Upcoming", now)).options(status_at_now)
     upcoming_reservation_count = upcoming_reservations.count()
 
     # Fetch the past reservations for the user
@@ -427,10 +436,10 @@ async def get_user_reservation_summary(
       Reservation.user_id == user_id,
       Reservation.created_at < now,
       or_(
-        Reservation.end_time < now,
-        Reservation.is_cancelled == True
+        Reservation.status_filter("Completed", now),
+        Reservation.status_filter("Cancelled", now)
       )
-    )
+    ).options(status_at_now)
     past_reservation_count = past_reservations.count()
 
     # Fetch the total spent by the user on reservations
@@ -442,10 +451,10 @@ async def get_user_reservation_summary(
       all_reservation_count=all_reservation_count,
       active_reservation_count=active_reservation_count,
       upcoming_reservation_count=upcoming_reservation_count,
-      active_reservations=active_reservations.all(),
-      upcoming_reservations=upcoming_reservations.all(),
+      active_reservations=apply_loading_plan(active_reservations, ReservationResponse, Reservation).all(),
+      upcoming_reservations=apply_loading_plan(upcoming_reservations, ReservationResponse, Reservation).all(),
       past_reservation_count=past_reservation_count,
-      past_reservations=past_reservations.all(),
+      past_reservations=apply_loading_plan(past_reservations, ReservationResponse, Reservation).all(),
       total_spent=total_spent
     ).model_dump()
 
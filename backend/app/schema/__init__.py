@@ -1,10 +1,12 @@
 from .user import UserBase, UserCreate, UserResponse, UserProfile, UpdatePassword, AdminUserSummary, PaginatedUsers, UserDashboardSummary, UserReservationSummary
 from .auth import LoginResponse, TokenData, TokenPayload
-from .parking import ParkingBase, ParkingCreate, ParkingResponse, PaginatedParkingResponse, ParkingSummaryResponse, ParkingResponseWithoutReservations
-from .reservation import ReservationUser, ReservationCreate, ReservationResponse, PaginatedReservations, ReservationSummary
+from .parking import ParkingBase, ParkingCreate, ParkingResponse, PaginatedParkingResponse, ParkingSummaryResponse, ParkingResponseWithoutReservations, ParkingDetailResponse, ParkingAvailabilityResponse, ParkingNearbyResponse
+from .reservation import ReservationUser, ReservationCreate, ReservationImport, ReservationQuote, ReservationWindow, RecurrenceRule, ReservationBatchCreate, ReservationBatchFailure, ReservationBatchResult, ReservationResponse, PaginatedReservations, ReservationSummary
 from .admin import DashboardSummary 
-from .notification import NotificationBase, NotificationResponse
+from .notification import NotificationBase, NotificationItem, NotificationResponse, NotificationPage, UnreadNotificationsCount, NotificationBulkDelete
+from .bulk_import import BulkImportError, BulkImportResult
 
 ReservationResponse.model_rebuild()
+ReservationBatchResult.model_rebuild()
 UserDashboardSummary.model_rebuild()
 UserReservationSummary.model_rebuild()
\ No newline at end of file
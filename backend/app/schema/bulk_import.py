@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+class BulkImportError(BaseModel):
+  row: int
+  error: str
+
+class BulkImportResult(BaseModel):
+  total_rows: int
+  imported: int
+  failed: int
+  errors: List[BulkImportError]
+  errors_truncated: bool = False
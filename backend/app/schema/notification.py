@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from .user import UserResponse 
-from typing import List
+from typing import List, Optional
 
 class NotificationBase(BaseModel):
   id: int
@@ -15,9 +15,34 @@ class NotificationBase(BaseModel):
     "from_attributes": True,
   }
 
+class NotificationItem(BaseModel):
+  id: int
+  user_id: int
+  message: str
+  created_at: datetime
+  is_read: bool = False
+
+  model_config = {
+    "from_attributes": True,
+  }
+
 class NotificationResponse(BaseModel):
   read_notifications: List[NotificationBase]
   unread_notifications: List[NotificationBase]
   all_notifications_count: int
   read_notifications_count: int
-  unread_notifications_count: int
\ No newline at end of file
+  unread_notifications_count: int
+  next_cursor: Optional[str] = None
+
+class NotificationPage(BaseModel):
+  notifications: List[NotificationItem]
+  unread_notifications_count: int
+  next_cursor: Optional[str] = None
+
+class UnreadNotificationsCount(BaseModel):
+  unread_notifications_count: int
+
+class NotificationBulkDelete(BaseModel):
+  ids: Optional[List[int]] = Field(None, max_length=1000, description="Only delete these notifications")
+  read_only: bool = Field(False, description="Only delete the notifications already read")
+  before: Optional[datetime] = Field(None, description="Only delete the notifications created before this datetime")
\ No newline at end of file
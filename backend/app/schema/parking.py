@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, computed_field
-from typing import List
+from pydantic import BaseModel, Field, computed_field, model_validator
+from typing import List, Optional
 from datetime import datetime
 from .reservation import ReservationResponse
 
@@ -9,6 +9,14 @@ class ParkingBase(BaseModel):
   location: str
   total_slots: int = Field(..., ge=2, description="Total number of slots must be greater than 1")
   rate: float = Field(..., ge=1, description="Rate per hour")
+  latitude: Optional[float] = Field(None, ge=-90, le=90, description="Latitude in degrees")
+  longitude: Optional[float] = Field(None, ge=-180, le=180, description="Longitude in degrees")
+
+  @model_validator(mode="after")
+  def check_coordinates(self):
+    if (self.latitude is None) != (self.longitude is None):
+      raise ValueError("Latitude and longitude must be given together")
+    return self
 
   model_config = {
     'from_attributes': True,
@@ -36,13 +44,19 @@ class ParkingResponse(ParkingBase):
   created_at: datetime
   updated_at: datetime
   is_active: bool
-  reservations: List[ReservationResponse]
+  active_reservations: int = 0
+  upcoming_reservations: int = 0
 
   @computed_field
   def available_slots(self) -> int:
-    if self.reservations:
-      return self.total_slots - len([r for r in self.reservations if r.status == 'Active' or r.status == 'Upcoming'])
-    return self.total_slots
+    return self.total_slots - self.active_reservations - self.upcoming_reservations
+
+  model_config = {
+    'from_attributes': True,
+  }
+
+class ParkingDetailResponse(ParkingResponse):
+  reservations: Optional[List[ReservationResponse]] = None
 
   model_config = {
     'from_attributes': True,
@@ -50,13 +64,19 @@ class ParkingResponse(ParkingBase):
 
 class PaginatedParkingResponse(BaseModel):
   parking_lots: List[ParkingResponse]
-  total: int
-  page: int
+  total: Optional[int] = None
+  page: int = 1
   limit: int
-  total_pages: int
+  total_pages: Optional[int] = None
+  # Whether total is the planner's estimate (count=estimated) rather than an exact count
+  total_is_estimate: bool = False
+  next_cursor: Optional[str] = None
 
   @computed_field
   def has_next(self) -> bool:
+    # Cursor pages skip the count and only know whether a next page exists
+    if self.total is None:
+      return self.next_cursor is not None
     return (self.page * self.limit) < self.total
   
   @computed_field
@@ -67,6 +87,22 @@ class PaginatedParkingResponse(BaseModel):
     'from_attributes': True,
   }
 
+class ParkingAvailabilityResponse(ParkingBase):
+  id: int
+  peak_reserved: int
+  free_slots: int
+
+  model_config = {
+    'from_attributes': True,
+  }
+
+class ParkingNearbyResponse(ParkingResponse):
+  distance_km: float
+
+  model_config = {
+    'from_attributes': True,
+  }
+
 class ParkingSummaryResponse(BaseModel):
   total_parking_lots: int
   total_active_parking_lots: int
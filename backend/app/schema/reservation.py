@@ -1,7 +1,8 @@
-from pydantic import BaseModel, computed_field
-from datetime import datetime, timezone
+from pydantic import BaseModel, Field, computed_field, model_validator
+from datetime import datetime, date, timezone
 from .user import UserResponse
-from typing import TYPE_CHECKING
+from app.models.reservation import get_reservation_status
+from typing import Optional, List, Literal, TYPE_CHECKING
 
 if TYPE_CHECKING:
   from app.schema import ParkingResponseWithoutReservations
@@ -16,6 +17,71 @@ class ReservationBase(BaseModel):
 class ReservationCreate(ReservationBase):
   pass
 
+class ReservationImport(ReservationBase):
+  is_cancelled: bool = False
+
+  @model_validator(mode="after")
+  def validate_window(self):
+    # Naive times in import files are read as UTC
+    if self.start_time.tzinfo is None:
+      self.start_time = self.start_time.replace(tzinfo=timezone.utc)
+    if self.end_time.tzinfo is None:
+      self.end_time = self.end_time.replace(tzinfo=timezone.utc)
+    if self.start_time >= self.end_time:
+      raise ValueError("start_time must be before end_time")
+    return self
+
+class ReservationWindow(BaseModel):
+  start_time: datetime
+  end_time: datetime
+
+class RecurrenceRule(BaseModel):
+  frequency: Literal["daily", "weekly"]
+  start_time: datetime = Field(..., description="Start of the first occurrence")
+  end_time: datetime = Field(..., description="End of the first occurrence")
+  until: date = Field(..., description="Last day an occurrence may start on")
+  interval: int = Field(1, ge=1, description="Repeat every `interval` days or weeks")
+  weekdays: Optional[List[int]] = Field(None, description="Only keep occurrences on these weekdays, 0 is Monday")
+
+  @model_validator(mode="after")
+  def validate_rule(self):
+    if self.start_time >= self.end_time:
+      raise ValueError("start_time must be before end_time")
+    if self.weekdays is not None:
+      if any(day < 0 or day > 6 for day in self.weekdays):
+        raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+      # Occurrences only land on the weekdays reached from the first one by steps of the rule
+      step_days = self.interval * (7 if self.frequency == "weekly" else 1)
+      reachable = {(self.start_time.weekday() + step_days * step) % 7 for step in range(7)}
+      if not reachable.intersection(self.weekdays):
+        raise ValueError("weekdays must contain a weekday the recurrence falls on")
+    return self
+
+class ReservationBatchCreate(BaseModel):
+  parking_id: int
+  windows: Optional[List[ReservationWindow]] = None
+  recurrence: Optional[RecurrenceRule] = None
+  mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+  @model_validator(mode="after")
+  def validate_source(self):
+    if (self.windows is None) == (self.recurrence is None):
+      raise ValueError("Provide either windows or a recurrence rule")
+    return self
+
+class ReservationBatchFailure(BaseModel):
+  start_time: datetime
+  end_time: datetime
+  error: str
+
+class ReservationQuote(BaseModel):
+  parking_id: int
+  start_time: datetime
+  end_time: datetime
+  rate: float
+  duration_hours: float
+  total_cost: float
+
 class ReservationResponse(ReservationBase):
   id: int
   is_cancelled: bool
@@ -25,24 +91,23 @@ class ReservationResponse(ReservationBase):
   total_cost: float
   user: UserResponse
   parking: "ParkingResponseWithoutReservations"
+  # Selected by the query (Reservation.status), only computed here for rows that were just written
+  status: Optional[Literal["Active", "Upcoming", "Completed", "Cancelled"]] = None
 
-  @computed_field
-  def status(self) -> str:
-    """Determine the status of the reservation."""
-    if self.is_cancelled:
-      return "Cancelled"
-
-    if self.start_time <= datetime.now(timezone.utc) <= self.end_time:
-      return "Active"
-    elif self.start_time > datetime.now(timezone.utc):
-      return "Upcoming"
-    else:
-      return "Completed"
+  @model_validator(mode="after")
+  def fill_status(self):
+    if self.status is None:
+      self.status = get_reservation_status(self.is_cancelled, self.start_time, self.end_time, datetime.now(timezone.utc))
+    return self
     
   model_config = {
     'from_attributes': True,
   }
 
+class ReservationBatchResult(BaseModel):
+  created: List[ReservationResponse]
+  failed: List[ReservationBatchFailure]
+
 class ReservationUser(BaseModel):
   id: int
   first_name: str
@@ -54,13 +119,19 @@ class ReservationUser(BaseModel):
 
 class PaginatedReservations(BaseModel):
   reservations: list[ReservationResponse]
-  total: int
-  page: int
+  total: Optional[int] = None
+  page: int = 1
   limit: int
-  total_pages: int
+  total_pages: Optional[int] = None
+  # Whether total is the planner's estimate (count=estimated) rather than an exact count
+  total_is_estimate: bool = False
+  next_cursor: Optional[str] = None
 
   @computed_field
   def has_next(self) -> bool:
+    # Cursor pages skip the count and only know whether a next page exists
+    if self.total is None:
+      return self.next_cursor is not None
     return (self.page * self.limit) < self.total
   
   @computed_field
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, computed_field
-from typing import Literal, List, TYPE_CHECKING
+from typing import Literal, List, Optional, TYPE_CHECKING
 from datetime import datetime
 
 if TYPE_CHECKING:
@@ -55,13 +55,19 @@ class AdminUserSummary(BaseModel):
 
 class PaginatedUsers(BaseModel):
   users: List[UserProfile]
-  total: int
-  page: int
+  total: Optional[int] = None
+  page: int = 1
   limit: int
-  total_pages: int
+  total_pages: Optional[int] = None
+  # Whether total is the planner's estimate (count=estimated) rather than an exact count
+  total_is_estimate: bool = False
+  next_cursor: Optional[str] = None
 
   @computed_field
   def has_next(self) -> bool:
+    # Cursor pages skip the count and only know whether a next page exists
+    if self.total is None:
+      return self.next_cursor is not None
     return (self.page * self.limit) < self.total
   
   @computed_field
@@ -1,7 +1,23 @@
 from .auth import hash_password, verify_password, create_token, get_current_user, get_admin_user
 from .init_admin import init_admin
 from .alembic_runner import run_migrations
-from .parking import is_parking_full
-from .reservation import is_valid_request, sort_reservations, sort_by_status
+from .parking import get_peak_occupancy, peak_occupancy_query, lot_occupancy_lateral, load_lot_occupancy, lot_availability_query, get_parking_summary, claim_capacity
+from .capacity_ledger import reserve_capacity, reserve_capacity_windows, release_capacity, clear_capacity_ledger, rebuild_capacity_ledger, purge_capacity_ledger
+from .pricing import calculate_price, load_rates, ReservationPrice
+from .reservation import is_valid_request, check_booking_target, check_reservation_window, check_lot_windows, insert_reservations, get_reservation_sort_keys, cancel_lot_reservations, get_batch_windows, book_reservation_batch
+from .pagination import keyset_paginate, offset_paginate, estimate_count, get_cursor_now, order_by_keys
+from .search import search_predicate, search_rank, search_parking_lots, search_users, search_reservations, PARKING_SEARCH_COLUMNS, USER_SEARCH_COLUMNS
+from .ttl_cache import summary_cache
+from .geo_index import geo_index, haversine_km
+from .booking_pipeline import booking_pipeline
+from .notification_hub import notification_hub
+from .notification_inbox import create_notification, adjust_unread_count, mark_all_read, delete_notifications, rebuild_unread_counts
+from .notification_retention import notification_retention, purge_notification_batch
+from .loading import get_loading_plan, apply_loading_plan
+from .statement_budget import install_statement_budget
+from .bulk_import import import_parking_lots, import_reservations, guess_import_format
 from .time_helper import get_today_utc_range, get_month_utc_range, to_utc, get_local_timezone, get_current_utc_time
-from .notification_service import scheduler, send_notification_for_reservation
\ No newline at end of file
+from .timing_wheel import TimingWheel
+from .partitions import ensure_partitions, apply_retention, maintain_partitions
+from .idempotency import begin_idempotent_request, anonymous_idempotency_key, save_idempotent_response, release_idempotency_key, purge_idempotency_keys
+from .notification_service import scheduler, schedule_reservation_reminders, unschedule_reservation_reminders, dispatch_due_notifications, reminder_wheel, load_pending_reminders
\ No newline at end of file
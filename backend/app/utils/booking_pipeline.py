@@ -0,0 +1,193 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+import asyncio
+import threading
+
+from app.core.config import get_config
+from app.models import ParkingLot, Reservation, User
+from app.schema import ReservationCreate, ReservationResponse
+from .reservation import check_booking_target, check_reservation_window, check_lot_windows, insert_reservations
+from .ttl_cache import summary_cache
+from .time_helper import get_current_utc_time
+from .notification_service import schedule_reservation_reminders
+from .idempotency import begin_idempotent_request, save_idempotent_response, release_idempotency_key
+
+IDEMPOTENCY_SCOPE = "reservations.create"
+
+config = get_config()
+
+class BookingPipeline:
+  """
+  Group commit of single reservations under burst traffic.
+  Bookings of a parking lot are queued and drained by one writer task per lot, which waits up to
+  BOOKING_PIPELINE_MAX_WAIT_MS for the batch to fill up to BOOKING_PIPELINE_MAX_BATCH requests, then
+  checks capacity once for the whole batch, inserts the accepted reservations in one statement and
+  commits once. Each request gets its reservation or its HTTP error back through a future.
+  Idempotency keys are claimed and their responses stored in the batch's transaction, like the bookings they guard.
+  Writers live on the event loop and run the database work in a worker thread, they stop when their queue is empty.
+  """
+
+  def __init__(self, max_batch: int, max_wait_ms: int):
+    self.max_batch = max_batch
+    self.max_wait = max_wait_ms / 1000
+    self._queues: dict[int, asyncio.Queue] = {}
+    self._writers: dict[int, asyncio.Task] = {}
+    self._lock = threading.Lock()
+    self.batches = 0
+    self.bookings = 0
+    self.rejected = 0
+    self.replayed = 0
+    self.largest_batch = 0
+
+  async def submit(self, reservation: ReservationCreate, current_user: User, idempotency_key: str | None = None) -> Reservation | JSONResponse:
+    """
+    Queue a booking and wait for the batch it lands in to commit.
+    Returns the created reservation, detached from any session, the stored response of a repeated
+    idempotency key, or raises its HTTP error.
+    param reservation: ReservationCreate object.
+    param current_user: User making the reservation.
+    param idempotency_key: Optional value of the Idempotency-Key header.
+    """
+    parking_id = reservation.parking_id
+    future = asyncio.get_running_loop().create_future()
+
+    queue = self._queues.get(parking_id)
+    if queue is None:
+      queue = self._queues[parking_id] = asyncio.Queue()
+    queue.put_nowait((reservation, current_user, idempotency_key, future))
+
+    if parking_id not in self._writers:
+      self._writers[parking_id] = asyncio.create_task(self._drain(parking_id, queue))
+    return await future
+
+  async def _drain(self, parking_id: int, queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    try:
+      while not queue.empty():
+        batch = [queue.get_nowait()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+          if not queue.empty():
+            batch.append(queue.get_nowait())
+            continue
+          timeout = deadline - loop.time()
+          if timeout <= 0:
+            break
+          try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+          except asyncio.TimeoutError:
+            break
+
+        try:
+          results = await asyncio.to_thread(self._commit_batch, parking_id, [item[:3] for item in batch])
+        except Exception as e:
+          print(f"Error committing booking batch of parking lot {parking_id}: {e}", flush=True)
+          results = [e] * len(batch)
+
+        for (_, _, _, future), result in zip(batch, results):
+          # The client may have gone away, its booking stands
+          if future.done():
+            continue
+          if isinstance(result, Exception):
+            future.set_exception(result)
+          else:
+            future.set_result(result)
+    finally:
+      # No await since the last empty check, a new request cannot be queued without a writer
+      del self._writers[parking_id]
+      if queue.empty():
+        self._queues.pop(parking_id, None)
+
+  def _commit_batch(self, parking_id: int, requests: list[tuple[ReservationCreate, User, str | None]]) -> list[Reservation | JSONResponse | HTTPException]:
+    """Book a batch of requests of one parking lot in a single transaction."""
+    from app.core.database import SessionLocal
+
+    db: Session = SessionLocal(expire_on_commit=False)
+    try:
+      now = get_current_utc_time()
+      # Share-lock the parking lot like a single booking does
+      parking_lot = db.execute(
+        select(ParkingLot)
+        .where(ParkingLot.id == parking_id)
+        .with_for_update(read=True)
+      ).scalar_one_or_none()
+
+      results: list[Reservation | JSONResponse | HTTPException | None] = [None] * len(requests)
+      pending = []
+      claimed = []
+      for index, (reservation, user, key) in enumerate(requests):
+        try:
+          replay = begin_idempotent_request(db, IDEMPOTENCY_SCOPE, user.id, key, reservation, now)
+          if replay is not None:
+            results[index] = replay
+            continue
+        except HTTPException as e:
+          # The key belongs to another request, it is left as it is
+          results[index] = e
+          continue
+        claimed.append(index)
+
+        try:
+          check_booking_target(parking_lot, user)
+          check_reservation_window(reservation.start_time, reservation.end_time, now)
+          pending.append(index)
+        except HTTPException as e:
+          results[index] = e
+
+      windows = [(requests[index][1].id, requests[index][0].start_time, requests[index][0].end_time) for index in pending]
+      accepted = []
+      for index, window, error in zip(pending, windows, check_lot_windows(db, parking_lot, windows)):
+        if error is None:
+          accepted.append((index, window))
+        else:
+          results[index] = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+      created = insert_reservations(db, parking_lot, [window for _, window in accepted])
+      # The reservations leave the session with their lot and user attached for serialization
+      for (index, _), reservation in zip(accepted, created):
+        set_committed_value(reservation, "parking", parking_lot)
+        set_committed_value(reservation, "user", requests[index][1])
+      schedule_reservation_reminders(db, created, now)
+
+      # Store the responses on the keys of the bookings and free the keys of the rejected ones
+      for (index, _), reservation in zip(accepted, created):
+        response = ReservationResponse.model_validate(reservation).model_dump()
+        save_idempotent_response(db, IDEMPOTENCY_SCOPE, requests[index][1].id, requests[index][2], status.HTTP_201_CREATED, response)
+      for index in claimed:
+        if isinstance(results[index], HTTPException):
+          release_idempotency_key(db, IDEMPOTENCY_SCOPE, requests[index][1].id, requests[index][2])
+      db.commit()
+    finally:
+      db.close()
+
+    for (index, _), reservation in zip(accepted, created):
+      results[index] = reservation
+    if created:
+      summary_cache.invalidate()
+
+    with self._lock:
+      self.batches += 1
+      self.bookings += len(created)
+      replayed = sum(isinstance(result, JSONResponse) for result in results)
+      self.replayed += replayed
+      self.rejected += len(requests) - len(created) - replayed
+      self.largest_batch = max(self.largest_batch, len(requests))
+    return results
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "enabled": config.BOOKING_PIPELINE_ENABLED,
+        "batches": self.batches,
+        "bookings": self.bookings,
+        "rejected": self.rejected,
+        "replayed": self.replayed,
+        "largest_batch": self.largest_batch,
+        "average_batch": round((self.bookings + self.rejected) / self.batches, 2) if self.batches else 0,
+        "queued": sum(queue.qsize() for queue in list(self._queues.values())),
+      }
+
+booking_pipeline = BookingPipeline(config.BOOKING_PIPELINE_MAX_BATCH, config.BOOKING_PIPELINE_MAX_WAIT_MS)
@@ -0,0 +1,317 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from pydantic import BaseModel, ValidationError
+from typing import Iterable, Iterator, Literal, TextIO
+from abc import ABC, abstractmethod
+import argparse
+import csv
+import io
+import json
+
+from app.core.config import get_config
+from app.schema import ParkingCreate, ReservationImport, BulkImportError, BulkImportResult
+from .capacity_ledger import rebuild_capacity_ledger, MAX_RESERVATION_LENGTH
+from .pricing import calculate_price, load_rates
+
+config = get_config()
+
+ImportFormat = Literal["csv", "ndjson"]
+
+def guess_import_format(filename: str | None) -> ImportFormat:
+  """Guess the format of an import file from its extension, CSV by default."""
+  return "ndjson" if filename and filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+def iter_records(stream: TextIO, file_format: ImportFormat) -> Iterator[tuple[int, dict | None, str | None]]:
+  """
+  Stream the records of a CSV (with a header) or NDJSON file.
+  Yields (row number, record, parse error) tuples, rows are numbered from 1 without the header.
+  param stream: Text stream of the file.
+  param file_format: 'csv' or 'ndjson'.
+  """
+  if file_format == "csv":
+    for row_number, record in enumerate(csv.DictReader(stream), start=1):
+      # Empty CSV cells mean the field was not given
+      yield row_number, {key: value for key, value in record.items() if value != ""}, None
+    return
+
+  row_number = 0
+  for line in stream:
+    if not line.strip():
+      continue
+    row_number += 1
+    try:
+      record = json.loads(line)
+      if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+      yield row_number, record, None
+    except ValueError as e:
+      yield row_number, None, f"Invalid JSON: {e}"
+
+def _format_validation_error(error: ValidationError) -> str:
+  return "; ".join(
+    f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+  )
+
+def _copy_rows(db: Session, table: str, columns: list[str], rows: Iterable[tuple]):
+  """COPY rows into a staging table over the session connection."""
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for row in rows:
+    writer.writerow(["t" if value is True else "f" if value is False else value for value in row])
+  buffer.seek(0)
+
+  cursor = db.connection().connection.cursor()
+  try:
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+  finally:
+    cursor.close()
+
+class _Importer(ABC):
+  """
+  Shared chunking and error bookkeeping of the bulk imports.
+  Each chunk is validated, copied into a temporary staging table, merged set-wise and committed,
+  so a bad row only fails itself and memory stays bounded by the chunk size.
+  """
+  schema: type[BaseModel]
+
+  def __init__(self, db: Session):
+    self.db = db
+    self.total_rows = 0
+    self.imported = 0
+    self.failed = 0
+    self.errors: list[BulkImportError] = []
+    self.errors_truncated = False
+
+  def fail(self, row_number: int, error: str):
+    self.failed += 1
+    if len(self.errors) < config.BULK_IMPORT_MAX_ERRORS:
+      self.errors.append(BulkImportError(row=row_number, error=error))
+    else:
+      self.errors_truncated = True
+
+  @abstractmethod
+  def create_staging(self):
+    """Create the temporary staging table of the import if it does not exist yet."""
+
+  @abstractmethod
+  def merge_chunk(self, chunk: list[tuple[int, BaseModel]]):
+    """Copy a chunk of validated rows into the staging table, merge them and commit."""
+
+  def finish(self):
+    pass
+
+  def flush(self, chunk: list[tuple[int, BaseModel]]):
+    # The connection may change after each commit, the staging table is created on demand
+    self.create_staging()
+    self.merge_chunk(chunk)
+
+  def run(self, records: Iterable[tuple[int, dict | None, str | None]]) -> BulkImportResult:
+    chunk: list[tuple[int, BaseModel]] = []
+    for row_number, record, parse_error in records:
+      self.total_rows += 1
+      if parse_error:
+        self.fail(row_number, parse_error)
+        continue
+      try:
+        chunk.append((row_number, self.schema.model_validate(record)))
+      except ValidationError as e:
+        self.fail(row_number, _format_validation_error(e))
+
+      if len(chunk) >= config.BULK_IMPORT_CHUNK_SIZE:
+        self.flush(chunk)
+        chunk = []
+
+    if chunk:
+      self.flush(chunk)
+    self.finish()
+
+    return BulkImportResult(
+      total_rows=self.total_rows,
+      imported=self.imported,
+      failed=self.failed,
+      errors=self.errors,
+      errors_truncated=self.errors_truncated,
+    )
+
+class ParkingLotImporter(_Importer):
+  schema = ParkingCreate
+
+  def create_staging(self):
+    self.db.execute(text("""
+      CREATE TEMP TABLE IF NOT EXISTS staging_parking_lots (
+        line_number integer NOT NULL,
+        name varchar(100) NOT NULL,
+        location varchar(255) NOT NULL,
+        total_slots integer NOT NULL,
+        rate double precision NOT NULL,
+        latitude double precision,
+        longitude double precision
+      ) ON COMMIT DELETE ROWS
+    """))
+
+  def merge_chunk(self, chunk: list[tuple[int, ParkingCreate]]):
+    _copy_rows(
+      self.db,
+      "staging_parking_lots",
+      ["line_number", "name", "location", "total_slots", "rate", "latitude", "longitude"],
+      (
+        (row_number, lot.name, lot.location, lot.total_slots, lot.rate, lot.latitude, lot.longitude)
+        for row_number, lot in chunk
+      ),
+    )
+
+    # Names already taken, or repeated earlier in the file, are rejected
+    rejected = self.db.execute(text("""
+      SELECT s.line_number FROM (
+        SELECT line_number, name, row_number() OVER (PARTITION BY name ORDER BY line_number) AS occurrence
+        FROM staging_parking_lots
+      ) s
+      WHERE s.occurrence > 1 OR EXISTS (SELECT 1 FROM parking_lots p WHERE p.name = s.name)
+    """)).scalars().all()
+    for row_number in rejected:
+      self.fail(row_number, "Parking lot with this name already exists.")
+
+    # A concurrent writer may take a name between the check and the insert, the rows losing the conflict
+    # are not returned by the insert and are reported as duplicates too
+    merged = self.db.execute(text("""
+      WITH candidates AS (
+        SELECT DISTINCT ON (s.name) s.line_number, s.name, s.location, s.total_slots, s.rate, s.latitude, s.longitude
+        FROM staging_parking_lots s
+        WHERE NOT EXISTS (SELECT 1 FROM parking_lots p WHERE p.name = s.name)
+        ORDER BY s.name, s.line_number
+      ), inserted AS (
+        INSERT INTO parking_lots (name, location, total_slots, rate, latitude, longitude, is_active, created_at, updated_at)
+        SELECT c.name, c.location, c.total_slots, c.rate, c.latitude, c.longitude, true, now(), now()
+        FROM candidates c
+        ON CONFLICT (name) DO NOTHING
+        RETURNING name
+      )
+      SELECT c.line_number, i.name IS NOT NULL AS inserted
+      FROM candidates c
+      LEFT JOIN inserted i ON i.name = c.name
+    """)).all()
+    for row in merged:
+      if row.inserted:
+        self.imported += 1
+      else:
+        self.fail(row.line_number, "Parking lot with this name already exists.")
+    self.db.commit()
+
+class ReservationImporter(_Importer):
+  """
+  Backfills reservations as they are, without capacity checks or reminders.
+  The capacity ledger of every touched lot is rebuilt once the import is done.
+  """
+  schema = ReservationImport
+
+  def __init__(self, db: Session):
+    super().__init__(db)
+    self.parking_ids: set[int] = set()
+
+  def create_staging(self):
+    self.db.execute(text("""
+      CREATE TEMP TABLE IF NOT EXISTS staging_reservations (
+        line_number integer NOT NULL,
+        user_id integer NOT NULL,
+        parking_id integer NOT NULL,
+        start_time timestamptz NOT NULL,
+        end_time timestamptz NOT NULL,
+        is_cancelled boolean NOT NULL,
+        duration_hours double precision NOT NULL,
+        total_cost double precision NOT NULL
+      ) ON COMMIT DELETE ROWS
+    """))
+
+  def merge_chunk(self, chunk: list[tuple[int, ReservationImport]]):
+    # Rows are priced with the same rule as bookings, from the rates of the chunk's lots
+    rates = load_rates(self.db, (r.parking_id for _, r in chunk))
+    rows = []
+    for row_number, r in chunk:
+      # Availability queries rely on reservations being at most RESERVATION_MAX_HOURS long
+      if r.end_time - r.start_time > MAX_RESERVATION_LENGTH:
+        self.fail(row_number, f"Reservation cannot be longer than {config.RESERVATION_MAX_HOURS} hours.")
+        continue
+      price = calculate_price(r.start_time, r.end_time, rates.get(r.parking_id), r.is_cancelled)
+      rows.append((
+        row_number, r.user_id, r.parking_id, r.start_time.isoformat(), r.end_time.isoformat(),
+        r.is_cancelled, repr(price.duration_hours), repr(price.total_cost),
+      ))
+    _copy_rows(
+      self.db,
+      "staging_reservations",
+      ["line_number", "user_id", "parking_id", "start_time", "end_time", "is_cancelled", "duration_hours", "total_cost"],
+      rows,
+    )
+
+    missing = self.db.execute(text("""
+      SELECT s.line_number,
+        NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.user_id) AS missing_user,
+        NOT EXISTS (SELECT 1 FROM parking_lots p WHERE p.id = s.parking_id) AS missing_lot
+      FROM staging_reservations s
+      WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.user_id)
+        OR NOT EXISTS (SELECT 1 FROM parking_lots p WHERE p.id = s.parking_id)
+    """)).all()
+    for row in missing:
+      self.fail(row.line_number, "User not found." if row.missing_user else "Parking lot not found.")
+
+    inserted = self.db.execute(text("""
+      INSERT INTO reservations (
+        user_id, parking_id, start_time, end_time, duration_hours, total_cost,
+        is_cancelled, notified, created_at, updated_at
+      )
+      SELECT s.user_id, s.parking_id, s.start_time, s.end_time, s.duration_hours, s.total_cost,
+        s.is_cancelled, false, now(), now()
+      FROM staging_reservations s
+      JOIN parking_lots p ON p.id = s.parking_id
+      JOIN users u ON u.id = s.user_id
+      RETURNING parking_id
+    """)).scalars().all()
+    self.imported += len(inserted)
+    self.parking_ids.update(inserted)
+    self.db.commit()
+
+  def finish(self):
+    for parking_id in self.parking_ids:
+      rebuild_capacity_ledger(self.db, parking_id)
+
+def import_parking_lots(db: Session, stream: TextIO, file_format: ImportFormat) -> BulkImportResult:
+  """
+  Import parking lots from a CSV or NDJSON stream with the fields of ParkingCreate.
+  param db: Database session.
+  param stream: Text stream of the file.
+  param file_format: 'csv' or 'ndjson'.
+  """
+  return ParkingLotImporter(db).run(iter_records(stream, file_format))
+
+def import_reservations(db: Session, stream: TextIO, file_format: ImportFormat) -> BulkImportResult:
+  """
+  Import reservations from a CSV or NDJSON stream with parking_id, user_id, start_time, end_time and is_cancelled.
+  param db: Database session.
+  param stream: Text stream of the file.
+  param file_format: 'csv' or 'ndjson'.
+  """
+  return ReservationImporter(db).run(iter_records(stream, file_format))
+
+if __name__ == "__main__":
+  from app.core.database import SessionLocal
+
+  parser = argparse.ArgumentParser(description="Bulk import parking lots or reservations from a CSV or NDJSON file.")
+  parser.add_argument("kind", choices=["lots", "reservations"], help="What the file contains.")
+  parser.add_argument("path", help="Path of the CSV or NDJSON file.")
+  parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="File format, guessed from the extension by default.")
+  args = parser.parse_args()
+
+  file_format = args.format or guess_import_format(args.path)
+  importer = import_parking_lots if args.kind == "lots" else import_reservations
+
+  db = SessionLocal()
+  try:
+    with open(args.path, newline="", encoding="utf-8") as stream:
+      result = importer(db, stream, file_format)
+    print(result.model_dump_json(indent=2), flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error importing {args.kind}: {e}", flush=True)
+    raise e
+  finally:
+    db.close()
@@ -0,0 +1,196 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+import argparse
+
+from app.core.config import get_config
+from app.models import LotCapacityBucket
+
+config = get_config()
+BUCKET_SECONDS = config.CAPACITY_BUCKET_MINUTES * 60
+# Reservations overlapping a moment started at most this long before it, a lower bound on start_time
+# lets the queries on the reservations partitions skip the months that cannot overlap
+MAX_RESERVATION_LENGTH = timedelta(hours=config.RESERVATION_MAX_HOURS)
+
+def get_bucket_start(moment: datetime) -> datetime:
+  """
+  Floor a datetime to the start of its ledger bucket.
+  param moment: Timezone-aware datetime.
+  """
+  epoch = int(moment.timestamp())
+  return datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=timezone.utc)
+
+def get_bucket_range(start_time: datetime, end_time: datetime) -> list[datetime]:
+  """
+  Get the start of every ledger bucket touched by the half-open window [start_time, end_time).
+  param start_time: Start of the window.
+  param end_time: End of the window.
+  """
+  buckets = []
+  bucket = get_bucket_start(start_time)
+  while bucket < end_time:
+    buckets.append(bucket)
+    bucket += timedelta(seconds=BUCKET_SECONDS)
+  return buckets
+
+def reserve_capacity(db: Session, parking_id: int, start_time: datetime, end_time: datetime, count: int = 1):
+  """
+  Add reservations to the ledger buckets of a window. Runs in the caller's transaction.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  param start_time: Start of the reservation.
+  param end_time: End of the reservation.
+  param count: Number of reservations to add.
+  """
+  reserve_capacity_windows(db, parking_id, [(start_time, end_time)], count)
+
+def reserve_capacity_windows(db: Session, parking_id: int, windows: list[tuple[datetime, datetime]], count: int = 1):
+  """
+  Add many reservations of a parking lot to the ledger with a single upsert. Runs in the caller's transaction.
+  Bucket rows are written, and so locked, in time order so concurrent bookings cannot deadlock on them.
+  A count of 0 only creates and locks the buckets of the windows.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  param windows: (start, end) tuples of the reservations.
+  param count: Number of reservations to add per window.
+  """
+  counts = Counter()
+  for start_time, end_time in windows:
+    for bucket in get_bucket_range(start_time, end_time):
+      counts[bucket] += count
+
+  rows = [
+    {"parking_id": parking_id, "bucket_start": bucket, "reserved_count": counts[bucket]}
+    for bucket in sorted(counts)
+  ]
+  if not rows:
+    return
+
+  statement = insert(LotCapacityBucket).values(rows)
+  db.execute(statement.on_conflict_do_update(
+    index_elements=[LotCapacityBucket.parking_id, LotCapacityBucket.bucket_start],
+    set_={"reserved_count": LotCapacityBucket.reserved_count + statement.excluded.reserved_count},
+  ))
+
+def release_capacity(db: Session, parking_id: int, start_time: datetime, end_time: datetime, count: int = 1):
+  """
+  Remove reservations from the ledger buckets of a window. Runs in the caller's transaction.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  param start_time: Start of the reservation.
+  param end_time: End of the reservation.
+  param count: Number of reservations to remove.
+  """
+  db.execute(
+    update(LotCapacityBucket)
+    .where(
+      LotCapacityBucket.parking_id == parking_id,
+      LotCapacityBucket.bucket_start >= get_bucket_start(start_time),
+      LotCapacityBucket.bucket_start < end_time,
+    )
+    .values(reserved_count=func.greatest(LotCapacityBucket.reserved_count - count, 0))
+  )
+
+def clear_capacity_ledger(db: Session, parking_id: int):
+  """
+  Drop every ledger bucket of a parking lot, used when all of its reservations are cancelled.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  """
+  db.execute(delete(LotCapacityBucket).where(LotCapacityBucket.parking_id == parking_id))
+
+def get_reserved_peak(db: Session, parking_id: int, start_time: datetime, end_time: datetime) -> int:
+  """
+  Get the highest bucket count of a window.
+  Buckets count every reservation touching them, so this is an upper bound of the real peak.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  param start_time: Start of the window.
+  param end_time: End of the window.
+  """
+  peak = db.execute(
+    select(func.max(LotCapacityBucket.reserved_count)).where(
+      LotCapacityBucket.parking_id == parking_id,
+      LotCapacityBucket.bucket_start >= get_bucket_start(start_time),
+      LotCapacityBucket.bucket_start < end_time,
+    )
+  ).scalar()
+  return peak or 0
+
+def purge_capacity_ledger():
+  """Scheduled job deleting the ledger buckets that ended, they are never checked again."""
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    result = db.execute(
+      delete(LotCapacityBucket).where(LotCapacityBucket.bucket_start < get_bucket_start(datetime.now(timezone.utc)))
+    )
+    db.commit()
+    if result.rowcount:
+      print(f"Purged {result.rowcount} expired capacity ledger buckets", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error purging capacity ledger: {e}", flush=True)
+  finally:
+    db.close()
+
+REBUILD_LEDGER_SQL = text("""
+  INSERT INTO lot_capacity_buckets (parking_id, bucket_start, reserved_count)
+  SELECT r.parking_id, b.bucket_start, count(*)
+  FROM reservations r
+  CROSS JOIN LATERAL generate_series(
+    to_timestamp(floor(extract(epoch FROM r.start_time) / :bucket_seconds) * :bucket_seconds),
+    r.end_time - interval '1 microsecond',
+    make_interval(secs => :bucket_seconds)
+  ) AS b(bucket_start)
+  WHERE r.is_cancelled = false
+    AND r.end_time > :now
+    AND r.start_time > :earliest_start
+    AND (CAST(:parking_id AS INTEGER) IS NULL OR r.parking_id = :parking_id)
+  GROUP BY r.parking_id, b.bucket_start
+""")
+
+def rebuild_capacity_ledger(db: Session, parking_id: int | None = None, now: datetime | None = None) -> int:
+  """
+  Recompute the ledger from the reservations table to repair drift.
+  Past buckets are dropped since they are never checked again.
+  param db: Database session.
+  param parking_id: Optional parking lot ID, all lots are rebuilt when omitted.
+  param now: Current datetime in UTC.
+  """
+  now = now or datetime.now(timezone.utc)
+
+  clear = delete(LotCapacityBucket)
+  if parking_id is not None:
+    clear = clear.where(LotCapacityBucket.parking_id == parking_id)
+  db.execute(clear)
+
+  result = db.execute(REBUILD_LEDGER_SQL, {
+    "bucket_seconds": BUCKET_SECONDS,
+    "now": now,
+    "earliest_start": now - MAX_RESERVATION_LENGTH,
+    "parking_id": parking_id,
+  })
+  db.commit()
+  return result.rowcount
+
+if __name__ == "__main__":
+  from app.core.database import SessionLocal
+
+  parser = argparse.ArgumentParser(description="Rebuild the lot capacity ledger from the reservations table.")
+  parser.add_argument("--parking-id", type=int, default=None, help="Only rebuild the ledger of this parking lot.")
+  args = parser.parse_args()
+
+  db = SessionLocal()
+  try:
+    buckets = rebuild_capacity_ledger(db, args.parking_id)
+    print(f"Capacity ledger rebuilt with {buckets} buckets.", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error rebuilding capacity ledger: {e}", flush=True)
+    raise e
+  finally:
+    db.close()
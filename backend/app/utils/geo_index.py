@@ -0,0 +1,183 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from math import radians, sin, cos, asin, sqrt, floor
+import heapq
+import threading
+import time
+
+from app.core.config import get_config
+from app.models import ParkingLot
+
+config = get_config()
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+  """Great-circle distance in kilometers between two points given in degrees."""
+  dlat = radians(lat2 - lat1)
+  dlon = radians(lon2 - lon1)
+  a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+class GeoIndex:
+  """
+  Process-resident grid index of the coordinates of the active parking lots.
+  The world is cut into square cells of `cell_degrees`, a nearest neighbour search visits rings
+  of cells around the query point and stops as soon as no unvisited cell can hold a closer lot.
+  The index is loaded lazily, kept in sync by the lot write paths and reloaded after
+  GEO_INDEX_MAX_AGE_SECONDS to bound drift from writes made by other workers.
+  """
+
+  def __init__(self, cell_degrees: float, max_age_seconds: int):
+    self.cell_degrees = cell_degrees
+    self.max_age_seconds = max_age_seconds
+    self._lon_cells = floor(360 / cell_degrees)
+    self._points: dict[int, tuple[float, float]] = {}
+    self._cells: dict[tuple[int, int], set[int]] = {}
+    self._loaded_at: float | None = None
+    self._lock = threading.Lock()
+    self.searches = 0
+    self.reloads = 0
+
+  def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+    return floor(latitude / self.cell_degrees), self._wrap(floor(longitude / self.cell_degrees), self._lon_cells)
+
+  @staticmethod
+  def _wrap(cell_lon: int, lon_cells: int) -> int:
+    """Wrap a longitude cell index across the antimeridian."""
+    return (cell_lon + lon_cells // 2) % lon_cells - lon_cells // 2
+
+  def _put(self, parking_id: int, latitude: float, longitude: float):
+    self._drop(parking_id)
+    self._points[parking_id] = (latitude, longitude)
+    self._cells.setdefault(self._cell(latitude, longitude), set()).add(parking_id)
+
+  def _drop(self, parking_id: int):
+    point = self._points.pop(parking_id, None)
+    if point is None:
+      return
+    cell = self._cell(*point)
+    members = self._cells[cell]
+    members.discard(parking_id)
+    if not members:
+      del self._cells[cell]
+
+  def _ensure_loaded(self, db: Session):
+    with self._lock:
+      if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age_seconds:
+        return
+
+    rows = db.execute(
+      select(ParkingLot.id, ParkingLot.latitude, ParkingLot.longitude).where(
+        ParkingLot.is_active == True,
+        ParkingLot.latitude.isnot(None),
+        ParkingLot.longitude.isnot(None),
+      )
+    ).all()
+
+    with self._lock:
+      self._points = {}
+      self._cells = {}
+      for row in rows:
+        self._put(row.id, row.latitude, row.longitude)
+      self._loaded_at = time.monotonic()
+      self.reloads += 1
+
+  def sync(self, parking_lot: ParkingLot):
+    """Add, move or drop a parking lot after a write, only active lots with coordinates are indexed."""
+    with self._lock:
+      if self._loaded_at is None:
+        return
+      if parking_lot.is_active and parking_lot.latitude is not None and parking_lot.longitude is not None:
+        self._put(parking_lot.id, parking_lot.latitude, parking_lot.longitude)
+      else:
+        self._drop(parking_lot.id)
+
+  def remove(self, parking_id: int):
+    """Drop a deleted parking lot."""
+    with self._lock:
+      self._drop(parking_id)
+
+  def invalidate(self):
+    """Forget every lot so the index is reloaded on next use."""
+    with self._lock:
+      self._loaded_at = None
+
+  def _ring_lower_bound_km(self, latitude: float, ring: int) -> float:
+    """Smallest distance from the query point to a lot outside the first `ring` rings of cells."""
+    gap = ring * self.cell_degrees
+    # Meridians converge, a longitude gap is shortest at the highest latitude the next ring reaches
+    max_latitude = min(90.0, abs(latitude) + (ring + 1) * self.cell_degrees)
+    lon_gap_km = 2 * EARTH_RADIUS_KM * asin(min(1.0, cos(radians(max_latitude)) * sin(radians(min(gap, 180.0) / 2))))
+    return min(EARTH_RADIUS_KM * radians(gap), lon_gap_km)
+
+  def nearest(self, db: Session, latitude: float, longitude: float, k: int, radius_km: float | None = None) -> list[tuple[int, float]]:
+    """
+    Find the k nearest active parking lots of a point.
+    Returns (parking lot ID, distance in kilometers) tuples, closest first.
+    param db: Database session used to load the index.
+    param latitude: Latitude of the point in degrees.
+    param longitude: Longitude of the point in degrees.
+    param k: Maximum number of lots to return.
+    param radius_km: Only return lots within this distance when given.
+    """
+    self._ensure_loaded(db)
+
+    with self._lock:
+      self.searches += 1
+      center_lat, center_lon = self._cell(latitude, longitude)
+      lon_cells = self._lon_cells
+      best: list[tuple[float, int]] = []  # max-heap of the k best as (-distance, id)
+
+      def consider(parking_id: int):
+        point_lat, point_lon = self._points[parking_id]
+        distance = haversine_km(latitude, longitude, point_lat, point_lon)
+        if radius_km is not None and distance > radius_km:
+          return
+        if len(best) < k:
+          heapq.heappush(best, (-distance, parking_id))
+        elif distance < -best[0][0]:
+          heapq.heapreplace(best, (-distance, parking_id))
+
+      visited = 0
+      ring = 0
+      while visited < len(self._cells):
+        # Past this size the remaining rings hold more cells than the index, scan what is left instead
+        if (2 * ring + 1) ** 2 > len(self._cells):
+          for (cell_lat, cell_lon), members in self._cells.items():
+            lon_distance = abs(cell_lon - center_lon) % lon_cells
+            if max(abs(cell_lat - center_lat), min(lon_distance, lon_cells - lon_distance)) >= ring:
+              for parking_id in members:
+                consider(parking_id)
+          break
+
+        for cell_lat in range(center_lat - ring, center_lat + ring + 1):
+          on_edge = cell_lat in (center_lat - ring, center_lat + ring)
+          # Inner rows of the ring only hold its first and last cells
+          step = 1 if on_edge else 2 * ring
+          for cell_lon in range(center_lon - ring, center_lon + ring + 1, step):
+            members = self._cells.get((cell_lat, self._wrap(cell_lon, lon_cells)))
+            if members:
+              visited += 1
+              for parking_id in members:
+                consider(parking_id)
+
+        bound = self._ring_lower_bound_km(latitude, ring)
+        if radius_km is not None and bound > radius_km:
+          break
+        if len(best) == k and bound >= -best[0][0]:
+          break
+        ring += 1
+
+      return [(parking_id, -distance) for distance, parking_id in sorted(best, reverse=True)]
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "searches": self.searches,
+        "reloads": self.reloads,
+        "indexed_lots": len(self._points),
+        "cells": len(self._cells),
+      }
+
+geo_index = GeoIndex(config.GEO_INDEX_CELL_DEGREES, config.GEO_INDEX_MAX_AGE_SECONDS)
@@ -0,0 +1,158 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, update, delete, and_
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import json
+import zlib
+
+from app.core.config import get_config
+from app.models import IdempotencyKey
+from .time_helper import get_current_utc_time
+
+config = get_config()
+
+def hash_request(payload) -> str:
+  """
+  Fingerprint a request body to detect a key reused for a different request.
+  The body is keyed with the app secret since it may hold credentials.
+  """
+  body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+  return hmac.new(config.SECRET_KEY.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+def anonymous_idempotency_key(key: str | None, client: str) -> str | None:
+  """
+  Scope the Idempotency-Key of an anonymous request to the client sending it.
+  Anonymous requests share the owner 0, so the key is keyed with what identifies the client in the request,
+  and two clients picking the same key never see each other's responses.
+  param key: Value of the Idempotency-Key header.
+  param client: Value identifying the client, such as the email being registered.
+  """
+  if key is None:
+    return None
+  return hmac.new(config.SECRET_KEY.encode(), f"{client}\n{key}".encode(), hashlib.sha256).hexdigest()
+
+def _key_filter(scope: str, owner_id: int, key: str):
+  return and_(IdempotencyKey.scope == scope, IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key)
+
+def begin_idempotent_request(db: Session, scope: str, owner_id: int, key: str | None, payload, now: datetime) -> JSONResponse | None:
+  """
+  Claim an idempotency key before processing a request, or get the response stored for it.
+  The key row is inserted in the request's own transaction, so a concurrent retry with the same key waits
+  on it and then either replays the committed response or takes the key over if the first request failed.
+  Returns None when the request has to be processed, the stored response otherwise.
+  param db: Database session.
+  param scope: Endpoint the key belongs to.
+  param owner_id: ID of the user sending the request, 0 for anonymous requests.
+  param key: Value of the Idempotency-Key header, the request is not idempotent without it.
+    Keys of anonymous requests go through anonymous_idempotency_key first.
+  param payload: Request body.
+  param now: Current datetime in UTC.
+  """
+  if key is None:
+    return None
+
+  request_hash = hash_request(payload)
+  values = {
+    "request_hash": request_hash,
+    "status_code": None,
+    "response_body": None,
+    "created_at": now,
+    "expires_at": now + timedelta(seconds=config.IDEMPOTENCY_KEY_TTL_SECONDS),
+  }
+
+  claimed = db.execute(
+    insert(IdempotencyKey)
+    .values(scope=scope, owner_id=owner_id, key=key, **values)
+    .on_conflict_do_nothing()
+    .returning(IdempotencyKey.key)
+  ).scalar()
+  if claimed is not None:
+    return None
+
+  # An expired key is taken over as if it was new
+  claimed = db.execute(
+    update(IdempotencyKey)
+    .where(_key_filter(scope, owner_id, key), IdempotencyKey.expires_at <= now)
+    .values(**values)
+    .returning(IdempotencyKey.key)
+  ).scalar()
+  if claimed is not None:
+    return None
+
+  stored = db.execute(
+    select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+    .where(_key_filter(scope, owner_id, key))
+  ).one_or_none()
+
+  if stored is None or stored.status_code is None:
+    raise HTTPException(
+      status_code=status.HTTP_409_CONFLICT,
+      detail="A request with this idempotency key is being processed, please retry."
+    )
+
+  if not hmac.compare_digest(stored.request_hash, request_hash):
+    raise HTTPException(
+      status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+      detail="This idempotency key was already used for a different request."
+    )
+
+  return JSONResponse(
+    status_code=stored.status_code,
+    content=json.loads(zlib.decompress(stored.response_body)),
+    headers={"Idempotent-Replayed": "true"},
+  )
+
+def save_idempotent_response(db: Session, scope: str, owner_id: int, key: str | None, status_code: int, response):
+  """
+  Store the response of a request on its idempotency key, before the request's transaction commits
+  so the key and the writes it guards are committed together.
+  param db: Database session.
+  param scope: Endpoint the key belongs to.
+  param owner_id: ID of the user sending the request, 0 for anonymous requests.
+  param key: Value of the Idempotency-Key header.
+  param status_code: HTTP status code of the response.
+  param response: Response body.
+  """
+  if key is None:
+    return
+
+  body = zlib.compress(json.dumps(jsonable_encoder(response), separators=(",", ":")).encode())
+  db.execute(
+    update(IdempotencyKey)
+    .where(_key_filter(scope, owner_id, key))
+    .values(status_code=status_code, response_body=body)
+  )
+
+def release_idempotency_key(db: Session, scope: str, owner_id: int, key: str | None):
+  """
+  Free the key of a request that failed, in a transaction that commits anyway, so a retry processes it again.
+  param db: Database session.
+  param scope: Endpoint the key belongs to.
+  param owner_id: ID of the user sending the request.
+  param key: Value of the Idempotency-Key header.
+  """
+  if key is None:
+    return
+
+  db.execute(delete(IdempotencyKey).where(_key_filter(scope, owner_id, key), IdempotencyKey.status_code.is_(None)))
+
+def purge_idempotency_keys():
+  """Scheduled job deleting the expired idempotency keys."""
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= get_current_utc_time()))
+    db.commit()
+    if result.rowcount:
+      print(f"Purged {result.rowcount} expired idempotency keys", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error purging idempotency keys: {e}", flush=True)
+  finally:
+    db.close()
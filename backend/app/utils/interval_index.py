@@ -0,0 +1,33 @@
+from bisect import bisect_left, bisect_right, insort
+
+class LotIntervals:
+  """
+  Sorted start and end timestamps of the reservations of a single parking lot over a span,
+  answering peak occupancy questions without going back to the database.
+  """
+  __slots__ = ("starts", "ends", "intervals")
+
+  def __init__(self, intervals: dict[int, tuple[float, float]]):
+    self.intervals = intervals
+    self.starts = sorted(start for start, _ in intervals.values())
+    self.ends = sorted(end for _, end in intervals.values())
+
+  def add(self, reservation_id: int, start: float, end: float):
+    if reservation_id in self.intervals:
+      return
+    self.intervals[reservation_id] = (start, end)
+    insort(self.starts, start)
+    insort(self.ends, end)
+
+  def occupied_at(self, moment: float) -> int:
+    """Number of reservations covering an instant, reservations are half-open intervals."""
+    return bisect_right(self.starts, moment) - bisect_right(self.ends, moment)
+
+  def peak(self, window_start: float, window_end: float) -> int:
+    """Peak number of concurrent reservations inside [window_start, window_end)."""
+    peak = self.occupied_at(window_start)
+    first = bisect_right(self.starts, window_start)
+    last = bisect_left(self.starts, window_end)
+    for start in self.starts[first:last]:
+      peak = max(peak, self.occupied_at(start))
+    return peak
@@ -0,0 +1,55 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query, selectinload, joinedload
+from pydantic import BaseModel
+from functools import lru_cache
+from typing import get_args
+import inspect as pyinspect
+
+def _nested_schema(annotation) -> type[BaseModel] | None:
+  """
+  Find the Pydantic model wrapped by a field annotation such as `UserResponse`, `List[...]` or `Optional[...]`.
+  """
+  if pyinspect.isclass(annotation) and issubclass(annotation, BaseModel):
+    return annotation
+  for arg in get_args(annotation):
+    nested = _nested_schema(arg)
+    if nested is not None:
+      return nested
+  return None
+
+@lru_cache(maxsize=None)
+def get_loading_plan(schema: type[BaseModel], model: type) -> tuple:
+  """
+  Derive the loader options needed to serialize `model` rows with `schema` without lazy loads.
+  Every nested schema field backed by a relationship is loaded eagerly, recursively:
+  many-to-one relationships are joined into the same statement and collections use one extra SELECT IN.
+  param schema: Pydantic response schema the rows are validated with.
+  param model: SQLAlchemy model of the rows.
+  """
+  mapper = inspect(model)
+  options = []
+  for name, field in schema.model_fields.items():
+    relationship = mapper.relationships.get(name)
+    nested = _nested_schema(field.annotation)
+    if relationship is None or nested is None:
+      continue
+
+    attribute = getattr(model, name)
+    if relationship.uselist:
+      loader = selectinload(attribute)
+    else:
+      nullable = any(column.nullable for column in relationship.local_columns)
+      loader = joinedload(attribute, innerjoin=not nullable)
+
+    nested_options = get_loading_plan(nested, relationship.mapper.class_)
+    options.append(loader.options(*nested_options) if nested_options else loader)
+  return tuple(options)
+
+def apply_loading_plan(query: Query, schema: type[BaseModel], model: type) -> Query:
+  """
+  Apply the loading plan of a response schema to a query.
+  param query: Query returning `model` rows.
+  param schema: Pydantic response schema the rows are validated with.
+  param model: SQLAlchemy model of the rows.
+  """
+  return query.options(*get_loading_plan(schema, model))
@@ -0,0 +1,164 @@
+from sqlalchemy import select
+from typing import AsyncIterator, Iterable
+import asyncio
+import threading
+
+from app.core.config import get_config
+from app.models import Notification
+from app.schema import NotificationItem
+
+config = get_config()
+
+class Subscription:
+  """One connection streaming the notifications of a user, bound to the event loop it was opened on."""
+
+  def __init__(self, user_id: int, queue_size: int):
+    self.user_id = user_id
+    self.loop = asyncio.get_running_loop()
+    self.queue: asyncio.Queue[NotificationItem] = asyncio.Queue(queue_size)
+    self.lagged = False
+
+def load_notifications_after(user_id: int, after_id: int, limit: int) -> list[NotificationItem]:
+  """
+  Read the notifications of a user created after a notification ID, oldest first.
+  param user_id: ID of the user.
+  param after_id: Last notification ID the client has seen.
+  param limit: Most notifications returned.
+  """
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    rows = db.execute(
+      select(Notification.id, Notification.user_id, Notification.message, Notification.created_at, Notification.is_read)
+      .where(Notification.user_id == user_id, Notification.id > after_id)
+      .order_by(Notification.id)
+      .limit(limit)
+    ).all()
+    return [NotificationItem.model_validate(row) for row in rows]
+  finally:
+    db.close()
+
+class NotificationHub:
+  """
+  In-process fan-out of new notifications to the connections streaming them.
+  Each connection gets a queue of NOTIFICATION_STREAM_QUEUE_SIZE events. A connection that falls behind
+  stops receiving events and reads what it missed from the database once it catches up, so a slow client
+  never grows memory or blocks a publisher. Notifications are published after their transaction commits,
+  from any thread, and only reach the connections of this worker process.
+  """
+
+  def __init__(self, queue_size: int, replay_batch: int):
+    self.queue_size = queue_size
+    self.replay_batch = replay_batch
+    self._subscribers: dict[int, set[Subscription]] = {}
+    self._lock = threading.Lock()
+    self.published = 0
+    self.pushed = 0
+    self.replayed = 0
+    self.overflows = 0
+
+  def _subscribe(self, user_id: int) -> Subscription:
+    subscription = Subscription(user_id, self.queue_size)
+    with self._lock:
+      self._subscribers.setdefault(user_id, set()).add(subscription)
+    return subscription
+
+  def _unsubscribe(self, subscription: Subscription):
+    with self._lock:
+      subscribers = self._subscribers.get(subscription.user_id)
+      if subscribers is not None:
+        subscribers.discard(subscription)
+        if not subscribers:
+          del self._subscribers[subscription.user_id]
+
+  def _offer(self, subscription: Subscription, item: NotificationItem):
+    """Queue an event on the subscription's loop, a full queue flags the connection to replay instead."""
+    if subscription.lagged:
+      return
+    try:
+      subscription.queue.put_nowait(item)
+    except asyncio.QueueFull:
+      subscription.lagged = True
+      with self._lock:
+        self.overflows += 1
+
+  def publish(self, notifications: Iterable):
+    """
+    Push committed notifications to the connected clients of their users.
+    param notifications: Notification objects or rows with the NotificationItem fields.
+    """
+    notifications = [(notification.user_id, notification) for notification in notifications]
+    with self._lock:
+      self.published += len(notifications)
+      targets = [
+        (notification, list(self._subscribers.get(user_id, ())))
+        for user_id, notification in notifications
+      ]
+
+    for notification, subscriptions in targets:
+      if not subscriptions:
+        continue
+      item = NotificationItem.model_validate(notification)
+      for subscription in subscriptions:
+        try:
+          subscription.loop.call_soon_threadsafe(self._offer, subscription, item)
+        except RuntimeError:
+          # The loop of the connection is closed, it unsubscribes on its way out
+          pass
+
+  async def stream(self, user_id: int, last_id: int | None = None) -> AsyncIterator[NotificationItem]:
+    """
+    Yield the notifications of a user as they are published, until the consumer stops iterating.
+    When `last_id` is given, the notifications created after it are read from the database first.
+    param user_id: ID of the user.
+    param last_id: Last notification ID the client has seen.
+    """
+    # Subscribe before replaying so nothing committed in between is missed, replayed events are not sent twice
+    subscription = self._subscribe(user_id)
+    subscription.lagged = last_id is not None
+    replayed: set[int] = set()
+    try:
+      while True:
+        if subscription.lagged:
+          # Drop the queued events, they are read again with the dropped ones
+          queued = []
+          while not subscription.queue.empty():
+            queued.append(subscription.queue.get_nowait().id)
+          if last_id is None:
+            last_id = min(queued) - 1
+          subscription.lagged = False
+
+          replayed = set()
+          while True:
+            items = await asyncio.to_thread(load_notifications_after, user_id, last_id, self.replay_batch)
+            for item in items:
+              replayed.add(item.id)
+              last_id = item.id
+              self.replayed += 1
+              yield item
+            if len(items) < self.replay_batch:
+              break
+          continue
+
+        item = await subscription.queue.get()
+        if item.id in replayed:
+          continue
+        last_id = max(last_id or 0, item.id)
+        self.pushed += 1
+        yield item
+    finally:
+      self._unsubscribe(subscription)
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "users": len(self._subscribers),
+        "connections": sum(len(subscribers) for subscribers in self._subscribers.values()),
+        "published": self.published,
+        "pushed": self.pushed,
+        "replayed": self.replayed,
+        "overflows": self.overflows,
+      }
+
+notification_hub = NotificationHub(config.NOTIFICATION_STREAM_QUEUE_SIZE, config.NOTIFICATION_STREAM_REPLAY_BATCH)
@@ -0,0 +1,141 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, func, literal, Row, CTE
+from sqlalchemy.sql import ColumnElement
+from datetime import datetime
+import argparse
+
+from app.models import Notification, User
+
+def count_unread_change(rows: CTE, delta: int, where: ColumnElement | None = None) -> CTE:
+  """
+  Add `delta` for each notification changed by a CTE to the unread counter of its user.
+  Returns the counting CTE, to attach to the statement of the change so both happen at once.
+  param rows: CTE of an insert, update or delete of notifications returning `user_id`.
+  param delta: 1 for notifications that became unread, -1 for unread ones that were read or removed.
+  param where: Optional condition on the rows of the CTE that count.
+  """
+  changed = select(rows.c.user_id, (func.count() * delta).label("delta")).group_by(rows.c.user_id)
+  if where is not None:
+    changed = changed.where(where)
+  changed = changed.subquery("changed")
+  return (
+    update(User)
+    .where(User.id == changed.c.user_id)
+    .values(unread_notifications_count=User.unread_notifications_count + changed.c.delta, updated_at=User.updated_at)
+    .cte("counted")
+  )
+
+def create_notification(db: Session, user_id: int, message: str) -> Row:
+  """
+  Notify a user in the caller's transaction and count the notification as unread, in a single statement.
+  Returns the created notification (id, user_id, message, created_at), to publish once the caller commits.
+  param db: Database session.
+  param user_id: ID of the user.
+  param message: Notification message.
+  """
+  created = (
+    insert(Notification)
+    .from_select(["user_id", "message"], select(literal(user_id), literal(message)))
+    .returning(Notification.id, Notification.user_id, Notification.message, Notification.created_at)
+    .cte("created")
+  )
+  return db.execute(select(created).add_cte(count_unread_change(created, 1))).one()
+
+def mark_all_read(db: Session, user_id: int) -> int:
+  """
+  Mark every unread notification of a user as read and clear them from the unread counter, in a single statement.
+  Returns the number of notifications marked.
+  param db: Database session.
+  param user_id: ID of the user.
+  """
+  marked = (
+    update(Notification)
+    .where(Notification.user_id == user_id, Notification.is_read == False)
+    .values(is_read=True)
+    .returning(Notification.user_id)
+    .cte("marked")
+  )
+  return db.execute(select(func.count()).select_from(marked).add_cte(count_unread_change(marked, -1))).scalar()
+
+def delete_notifications(
+  db: Session,
+  user_id: int,
+  ids: list[int] | None = None,
+  read_only: bool = False,
+  before: datetime | None = None
+) -> int:
+  """
+  Delete notifications of a user and take the unread ones off the unread counter, in a single statement.
+  Returns the number of notifications deleted.
+  param db: Database session.
+  param user_id: ID of the user.
+  param ids: Only delete these notifications when given.
+  param read_only: Only delete the notifications already read.
+  param before: Only delete the notifications created before this datetime.
+  """
+  statement = delete(Notification).where(Notification.user_id == user_id)
+  if ids is not None:
+    statement = statement.where(Notification.id.in_(ids))
+  if read_only:
+    statement = statement.where(Notification.is_read == True)
+  if before is not None:
+    statement = statement.where(Notification.created_at < before)
+
+  deleted = statement.returning(Notification.user_id, Notification.is_read).cte("deleted")
+  counted = count_unread_change(deleted, -1, deleted.c.is_read == False)
+  return db.execute(select(func.count()).select_from(deleted).add_cte(counted)).scalar()
+
+def adjust_unread_count(db: Session, user_id: int, delta: int):
+  """
+  Add `delta` to the unread counter of a user in the caller's transaction.
+  param db: Database session.
+  param user_id: ID of the user.
+  param delta: Change of the number of unread notifications.
+  """
+  if delta:
+    db.execute(
+      update(User)
+      .where(User.id == user_id)
+      .values(unread_notifications_count=User.unread_notifications_count + delta, updated_at=User.updated_at)
+    )
+
+def rebuild_unread_counts(db: Session, user_id: int | None = None) -> int:
+  """
+  Recount the unread notifications of users from the notifications table to repair drift.
+  Returns the number of counters that changed.
+  param db: Database session.
+  param user_id: Optional user ID, every user is recounted when omitted.
+  """
+  unread = (
+    select(func.count())
+    .where(Notification.user_id == User.id, Notification.is_read == False)
+    .scalar_subquery()
+  )
+  statement = (
+    update(User)
+    .where(User.unread_notifications_count != unread)
+    .values(unread_notifications_count=unread, updated_at=User.updated_at)
+  )
+  if user_id is not None:
+    statement = statement.where(User.id == user_id)
+  result = db.execute(statement)
+  db.commit()
+  return result.rowcount
+
+if __name__ == "__main__":
+  from app.core.database import SessionLocal
+
+  parser = argparse.ArgumentParser(description="Recount the unread notifications of users.")
+  parser.add_argument("--user-id", type=int, default=None, help="Only recount this user.")
+  args = parser.parse_args()
+
+  db = SessionLocal()
+  try:
+    changed = rebuild_unread_counts(db, args.user_id)
+    print(f"Unread counters repaired: {changed}.", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error recounting unread notifications: {e}", flush=True)
+    raise e
+  finally:
+    db.close()
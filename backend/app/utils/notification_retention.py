@@ -0,0 +1,156 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, delete, func, tuple_
+from datetime import datetime, timedelta
+import threading
+import time
+
+from app.core.config import get_config
+from app.models import Notification, NotificationArchive
+from .notification_inbox import count_unread_change
+from .time_helper import get_current_utc_time
+
+config = get_config()
+
+def purge_notification_batch(
+  db: Session,
+  cutoff: datetime,
+  batch_size: int,
+  archive: bool = False,
+  after_id: int = 0
+) -> tuple[int, int, int | None]:
+  """
+  Delete, or move to the archive, one batch of the notifications created before `cutoff` in a single statement
+  and commit it. The unread ones are taken off the unread counters of their users in the same statement, and
+  rows locked by other transactions are skipped until a later run.
+  Batches walk the expired rows by ID range from `after_id` along the primary key index, so each batch reads
+  the next `batch_size` rows instead of sorting the whole remaining backlog again.
+  Returns the number of notifications removed, how many of them were unread and the last ID removed.
+  param db: Database session.
+  param cutoff: Notifications created before this datetime are removed.
+  param batch_size: Most notifications removed.
+  param archive: Copy the notifications to notifications_archive before removing them.
+  param after_id: Only remove notifications with a greater ID, the last ID of the previous batch.
+  """
+  expired = (
+    select(Notification.id, Notification.created_at)
+    .where(Notification.id > after_id, Notification.created_at < cutoff)
+    .order_by(Notification.id)
+    .limit(batch_size)
+    .with_for_update(skip_locked=True)
+    .cte("expired")
+  )
+  purged = (
+    delete(Notification)
+    .where(tuple_(Notification.id, Notification.created_at).in_(select(expired.c.id, expired.c.created_at)))
+    .returning(Notification.id, Notification.user_id, Notification.message, Notification.created_at, Notification.is_read)
+    .cte("purged")
+  )
+
+  ctes = [count_unread_change(purged, -1, purged.c.is_read == False)]
+  if archive:
+    ctes.append(
+      insert(NotificationArchive)
+      .from_select(
+        ["id", "user_id", "message", "created_at", "is_read"],
+        select(purged.c.id, purged.c.user_id, purged.c.message, purged.c.created_at, purged.c.is_read),
+      )
+      .cte("archived")
+    )
+
+  removed, unread, last_id = db.execute(
+    select(func.count(), func.count().filter(purged.c.is_read == False), func.max(purged.c.id))
+    .select_from(purged)
+    .add_cte(*ctes)
+  ).one()
+  db.commit()
+  return removed, unread, last_id
+
+class NotificationRetention:
+  """
+  Background purge of the notifications older than NOTIFICATION_PURGE_AFTER_DAYS.
+  Rows are deleted, or moved to notifications_archive, NOTIFICATION_PURGE_BATCH_SIZE at a time with one commit
+  per batch, so locks are short lived and an interrupted run loses nothing. Whole expired months are cheaper to
+  remove with the partition retention (NOTIFICATION_RETENTION_MONTHS), this job trims the rows in between.
+  Counts the rows it reclaimed for the metrics endpoint.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.runs = 0
+    self.batches = 0
+    self.deleted = 0
+    self.archived = 0
+    self.unread_removed = 0
+    self.errors = 0
+    self.last_run_at: datetime | None = None
+    self.last_run_rows = 0
+    self.last_run_seconds = 0.0
+
+  def run(self, now: datetime | None = None) -> int:
+    """
+    Scheduled job removing the expired notifications batch after batch until none is left.
+    Returns the number of notifications removed.
+    param now: Current datetime in UTC.
+    """
+    if config.NOTIFICATION_PURGE_AFTER_DAYS <= 0:
+      return 0
+
+    from app.core.database import SessionLocal
+
+    now = now or get_current_utc_time()
+    cutoff = now - timedelta(days=config.NOTIFICATION_PURGE_AFTER_DAYS)
+    archive = config.NOTIFICATION_PURGE_ACTION == "archive"
+    batch_size = config.NOTIFICATION_PURGE_BATCH_SIZE
+    started = time.perf_counter()
+    total = 0
+    last_id = 0
+
+    db = SessionLocal()
+    try:
+      while True:
+        removed, unread, last_id = purge_notification_batch(db, cutoff, batch_size, archive, last_id)
+        total += removed
+        if removed:
+          with self._lock:
+            self.batches += 1
+            self.unread_removed += unread
+            if archive:
+              self.archived += removed
+            else:
+              self.deleted += removed
+        if last_id is None:
+          break
+
+      if total:
+        print(f"Notifications {'archived' if archive else 'deleted'}: {total}", flush=True)
+    except Exception as e:
+      db.rollback()
+      with self._lock:
+        self.errors += 1
+      print(f"Error purging notifications: {e}", flush=True)
+    finally:
+      db.close()
+      with self._lock:
+        self.runs += 1
+        self.last_run_at = now
+        self.last_run_rows = total
+        self.last_run_seconds = round(time.perf_counter() - started, 3)
+    return total
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "after_days": config.NOTIFICATION_PURGE_AFTER_DAYS,
+        "action": config.NOTIFICATION_PURGE_ACTION,
+        "runs": self.runs,
+        "batches": self.batches,
+        "deleted": self.deleted,
+        "archived": self.archived,
+        "unread_removed": self.unread_removed,
+        "errors": self.errors,
+        "last_run_at": self.last_run_at,
+        "last_run_rows": self.last_run_rows,
+        "last_run_seconds": self.last_run_seconds,
+      }
+
+notification_retention = NotificationRetention()
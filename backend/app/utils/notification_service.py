@@ -1,76 +1,211 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from app.models import Reservation, Notification
-from app.utils import get_current_utc_time
-from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import select, insert, update, delete, tuple_
+from typing import Iterable
+from datetime import datetime, timedelta
+
+from app.core.config import get_config
+from app.models import Reservation, Notification, ScheduledNotification
+from .time_helper import get_current_utc_time
+from .timing_wheel import TimingWheel
+from .notification_hub import notification_hub
+from .notification_inbox import count_unread_change
 
+config = get_config()
+
+# Runs the periodic jobs of the app, reservation reminders live in the scheduled_notifications outbox
 scheduler = BackgroundScheduler()
 
-def send_notification_for_reservation(reservation: Reservation, db: Session):
-  """Create a notification instance for a reservation."""
-
-  user_id = reservation.user_id
-  now = get_current_utc_time()
-
-  start_30 = reservation.start_time - timedelta(minutes=30)
-  start_exact = reservation.start_time
-  end_30 = reservation.end_time - timedelta(minutes=30)
-  end_exact = reservation.end_time
-
-  # If the resesrvation is starting in 30 minutes
-  if start_30 > now:
-    message = f"Your reservation for parking spot at {reservation.parking.name} is starting in 30 minutes."
-    scheduler.add_job(
-      send_notification_job,
-      'date',
-      run_date=start_30,
-      args=[user_id, message, reservation, db],
-      id=f"notify_start_30_{reservation.id}"
-    )
-  
-  if start_exact > now:
-    message = f"Your reservation for parking spot at {reservation.parking.name} is starting now."
-    scheduler.add_job(
-      send_notification_job,
-      'date',
-      run_date=start_exact,
-      args=[user_id, message, reservation, db],
-      id=f"notify_start_exact_{reservation.id}"
-    )
-    
-  # Only create a notification if the reservation is longer than 30 minutes
-  if end_30 > now and (reservation.end_time - reservation.start_time) > timedelta(minutes=30):
-    message = f"Your reservation for parking spot at {reservation.parking.name} is expiring in 30 minutes."
-    scheduler.add_job(
-      send_notification_job,
-      'date',
-      run_date=end_30,
-      args=[user_id, message, reservation, db],
-      id=f"notify_end_30_{reservation.id}"
+# Reminder kinds with their message, the lot name is filled in when the reminder is scheduled
+REMINDER_MESSAGES = {
+  "start_30": "Your reservation for parking spot at {name} is starting in 30 minutes.",
+  "start_exact": "Your reservation for parking spot at {name} is starting now.",
+  "end_30": "Your reservation for parking spot at {name} is expiring in 30 minutes.",
+  "end_exact": "Your reservation for parking spot at {name} has expired.",
+}
+
+REMINDER_KINDS = tuple(REMINDER_MESSAGES)
+
+def reminder_key(reservation_id: int, kind: str) -> int:
+  """Pack a reminder into one integer for the timing wheel: the reservation ID followed by two kind bits."""
+  return reservation_id << 2 | REMINDER_KINDS.index(kind)
+
+def unpack_reminder_key(key: int) -> tuple[int, str]:
+  return key >> 2, REMINDER_KINDS[key & 3]
+
+def get_reservation_reminders(reservation: Reservation, now: datetime) -> list[dict]:
+  """
+  Get the outbox rows of the reminders of a reservation that are still ahead.
+  param reservation: Reservation with its parking lot loaded.
+  param now: Current datetime in UTC.
+  """
+  due = {
+    "start_30": reservation.start_time - timedelta(minutes=30),
+    "start_exact": reservation.start_time,
+    "end_30": reservation.end_time - timedelta(minutes=30),
+    "end_exact": reservation.end_time,
+  }
+  # Only remind of the expiry when the reservation is longer than 30 minutes
+  if reservation.end_time - reservation.start_time <= timedelta(minutes=30):
+    del due["end_30"]
+
+  return [
+    {
+      "reservation_id": reservation.id,
+      "user_id": reservation.user_id,
+      "kind": kind,
+      "message": REMINDER_MESSAGES[kind].format(name=reservation.parking.name),
+      "due_at": due_at,
+    }
+    for kind, due_at in due.items()
+    if due_at > now
+  ]
+
+def schedule_reservation_reminders(db: Session, reservations: Iterable[Reservation], now: datetime | None = None):
+  """
+  Write the reminders of new reservations to the outbox in the caller's transaction,
+  so they are committed with the reservations and survive restarts.
+  param db: Database session.
+  param reservations: Flushed reservations with their parking lot loaded.
+  param now: Current datetime in UTC.
+  """
+  now = now or get_current_utc_time()
+  rows = [row for reservation in reservations for row in get_reservation_reminders(reservation, now)]
+  if rows:
+    db.execute(insert(ScheduledNotification), rows)
+
+  # Fire them on time from this process, a booking rolled back afterwards leaves keys that find nothing to deliver
+  for row in rows:
+    reminder_wheel.add(reminder_key(row["reservation_id"], row["kind"]), row["due_at"].timestamp())
+
+def unschedule_reservation_reminders(db: Session, reservation_ids: Iterable[int]):
+  """
+  Remove the pending reminders of reservations in the caller's transaction.
+  param db: Database session.
+  param reservation_ids: IDs of the reservations.
+  """
+  reservation_ids = list(reservation_ids)
+  if not reservation_ids:
+    return
+
+  removed = db.execute(
+    delete(ScheduledNotification).where(
+      ScheduledNotification.reservation_id.in_(reservation_ids),
+      ScheduledNotification.sent_at.is_(None),
+    ).returning(ScheduledNotification.reservation_id, ScheduledNotification.kind, ScheduledNotification.due_at)
+  ).all()
+  for row in removed:
+    reminder_wheel.cancel(reminder_key(row.reservation_id, row.kind), row.due_at.timestamp())
+
+def deliver_due_reminders(db: Session, now: datetime, batch_size: int, reminders: list[tuple[int, str]] | None = None) -> int:
+  """
+  Deliver one batch of due reminders in a single statement, commit it and push the notifications to connected clients.
+  The batch is claimed with FOR UPDATE SKIP LOCKED so concurrent sweepers of other workers take other rows.
+  Returns the number of notifications created.
+  param db: Database session.
+  param now: Current datetime in UTC.
+  param batch_size: Most reminders delivered.
+  param reminders: Only deliver these (reservation ID, kind) reminders when given.
+  """
+  due = (
+    select(ScheduledNotification.id)
+    .where(
+      ScheduledNotification.sent_at.is_(None),
+      ScheduledNotification.due_at <= now,
+      tuple_(ScheduledNotification.reservation_id, ScheduledNotification.kind).in_(reminders) if reminders else True,
     )
-  
-
-  # If the reservation is ending now, send a notification
-  if end_exact > now:
-    message = f"Your reservation for parking spot at {reservation.parking.name} has expired."
-    scheduler.add_job(
-      send_notification_job,
-      'date',
-      run_date=end_exact,
-      args=[user_id, message, reservation, db],
-      id=f"notify_end_exact_{reservation.id}"
+    .order_by(ScheduledNotification.due_at)
+    .limit(batch_size)
+    .with_for_update(skip_locked=True)
+    .cte("due")
+  )
+  sent = (
+    update(ScheduledNotification)
+    .where(ScheduledNotification.id.in_(select(due.c.id)))
+    .values(sent_at=now)
+    .returning(ScheduledNotification.user_id, ScheduledNotification.message)
+    .cte("sent")
+  )
+  created = (
+    insert(Notification)
+    .from_select(["user_id", "message"], select(sent.c.user_id, sent.c.message))
+    .returning(Notification.id, Notification.user_id, Notification.message, Notification.created_at)
+    .cte("created")
+  )
+  delivered = db.execute(select(created).add_cte(count_unread_change(created, 1))).all()
+  db.commit()
+  notification_hub.publish(delivered)
+  return len(delivered)
+
+def deliver_reminder_keys(keys: list[int]):
+  """Deliver the reminders fired by the timing wheel, the ones already delivered or removed are skipped."""
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    now = get_current_utc_time()
+    size = config.NOTIFICATION_SWEEP_BATCH_SIZE
+    for start in range(0, len(keys), size):
+      deliver_due_reminders(db, now, size, [unpack_reminder_key(key) for key in keys[start:start + size]])
+  except Exception as e:
+    db.rollback()
+    print(f"Error delivering reservation reminders: {e}", flush=True)
+  finally:
+    db.close()
+
+# Fires the reminders at their due second, the outbox sweeper catches anything this process did not schedule
+reminder_wheel = TimingWheel(deliver_reminder_keys)
+
+def load_pending_reminders() -> int:
+  """Load the pending reminders of the outbox into the timing wheel, on startup. Returns how many were loaded."""
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    rows = db.execute(
+      select(ScheduledNotification.reservation_id, ScheduledNotification.kind, ScheduledNotification.due_at)
+      .where(ScheduledNotification.sent_at.is_(None))
+      .execution_options(yield_per=10000)
     )
+    loaded = 0
+    for row in rows:
+      reminder_wheel.add(reminder_key(row.reservation_id, row.kind), row.due_at.timestamp())
+      loaded += 1
+    return loaded
+  finally:
+    db.close()
 
+def dispatch_due_notifications():
+  """
+  Scheduled job delivering the due reminders of the outbox as notifications, in batches of
+  NOTIFICATION_SWEEP_BATCH_SIZE, and purging the reminders sent more than
+  SCHEDULED_NOTIFICATION_RETENTION_HOURS ago.
+  Reminders are normally fired on time by the timing wheel, this sweep delivers the ones it missed.
+  """
+  from app.core.database import SessionLocal
 
-def send_notification_job(user_id: int, message: str, db: Session):
-  """Send a notification to a user."""
-  notification = Notification(
-    user_id=user_id,
-    message=message,
-  )
+  db = SessionLocal()
+  try:
+    now = get_current_utc_time()
+    total = 0
+    while True:
+      delivered = deliver_due_reminders(db, now, config.NOTIFICATION_SWEEP_BATCH_SIZE)
+      total += delivered
+      if delivered < config.NOTIFICATION_SWEEP_BATCH_SIZE:
+        break
 
-  db.add(notification)
-  db.commit()
-  print(f"Notification sent to user {user_id}: {message}", flush=True)
-    
\ No newline at end of file
+    expired = (
+      select(ScheduledNotification.id)
+      .where(ScheduledNotification.sent_at < now - timedelta(hours=config.SCHEDULED_NOTIFICATION_RETENTION_HOURS))
+      .limit(config.NOTIFICATION_SWEEP_BATCH_SIZE)
+    )
+    db.execute(delete(ScheduledNotification).where(ScheduledNotification.id.in_(expired)))
+    db.commit()
+
+    if total:
+      print(f"Delivered {total} reservation reminders", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error delivering reservation reminders: {e}", flush=True)
+  finally:
+    db.close()
@@ -0,0 +1,175 @@
+from sqlalchemy.orm import Query
+from sqlalchemy import or_, and_, func
+from fastapi import HTTPException, status
+from datetime import datetime
+from typing import Literal
+import base64
+import json
+
+from app.core.config import get_config
+
+config = get_config()
+
+SortKey = tuple  # (column expression, "asc" | "desc")
+
+def _encode_value(value):
+  if isinstance(value, datetime):
+    return {"dt": value.isoformat()}
+  return value
+
+def _decode_value(value):
+  if isinstance(value, dict) and "dt" in value:
+    return datetime.fromisoformat(value["dt"])
+  return value
+
+def encode_cursor(values: list, sort: str, now: datetime | None = None) -> str:
+  """
+  Encode the sort key values of the last row of a page into an opaque cursor.
+  param values: Values of the sort keys of the last row.
+  param sort: Signature of the sort the cursor was produced with.
+  param now: Reference time of the first page, reused by the following pages.
+  """
+  payload = {"k": [_encode_value(value) for value in values], "s": sort}
+  if now is not None:
+    payload["n"] = now.isoformat()
+  raw = json.dumps(payload, separators=(",", ":")).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> tuple[list, datetime | None]:
+  """
+  Decode a cursor produced by `encode_cursor`.
+  Raises a 400 error when the cursor is malformed or was produced with another sort.
+  param cursor: Opaque cursor from the previous page.
+  param sort: Signature of the current sort.
+  """
+  try:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    payload = json.loads(raw)
+    values = [_decode_value(value) for value in payload["k"]]
+    now = datetime.fromisoformat(payload["n"]) if "n" in payload else None
+  except Exception:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Invalid cursor."
+    )
+
+  if payload.get("s") != sort:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Cursor does not match the requested sort."
+    )
+  return values, now
+
+def _after(keys: list[SortKey], values: list):
+  """Build the predicate selecting rows strictly after `values` in the order of `keys`."""
+  clauses = []
+  for index, (column, order) in enumerate(keys):
+    equal_prefix = [keys[i][0] == values[i] for i in range(index)]
+    beyond = column > values[index] if order == "asc" else column < values[index]
+    clauses.append(and_(*equal_prefix, beyond))
+  return or_(*clauses)
+
+def order_by_keys(query: Query, keys: list[SortKey]):
+  """
+  Order a query by sort keys.
+  param query: SQLAlchemy session query object.
+  param keys: Sort keys as (column expression, 'asc' | 'desc') tuples.
+  """
+  return query.order_by(*[column.asc() if order == "asc" else column.desc() for column, order in keys])
+
+def keyset_paginate(query: Query, keys: list[SortKey], limit: int, cursor: str | None, sort: str, now: datetime | None = None):
+  """
+  Fetch one page of a query ordered by `keys`, starting after the cursor.
+  The last key must be unique (usually the primary key) so every row has a distinct position.
+  Returns the rows of the page and the cursor of the next page, or None on the last page.
+  param query: Query returning an entity, optionally followed by extra columns.
+  param keys: Sort keys as (column expression, "asc" | "desc") tuples.
+  param limit: Maximum number of rows of the page.
+  param cursor: Cursor of the previous page, None for the first page.
+  param sort: Signature of the sort, cursors are rejected when it changes.
+  param now: Reference time stored in the cursor.
+  """
+  if cursor:
+    values, _ = decode_cursor(cursor, sort)
+    if len(values) != len(keys):
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor."
+      )
+    query = query.filter(_after(keys, values))
+
+  query = query.add_columns(*[column.label(f"cursor_{index}") for index, (column, _) in enumerate(keys)])
+  query = order_by_keys(query.order_by(None), keys)
+  rows = query.limit(limit + 1).all()
+
+  width = len(keys)
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_cursor(list(rows[-1][-width:]), sort, now)
+
+  return _strip_columns(rows, width), next_cursor
+
+def _strip_columns(rows: list, width: int) -> list:
+  """Drop the last `width` extra columns of rows, single entity queries get their entities back."""
+  return [row[0] if len(row) == width + 1 else tuple(row[:-width]) for row in rows]
+
+def estimate_count(query: Query) -> int:
+  """
+  Get the planner's estimate of the number of rows of a query, without running it.
+  param query: Query to estimate.
+  """
+  statement = query.order_by(None).statement
+  connection = query.session.connection()
+  compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+  plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+  return int(plan[0]["Plan"]["Plan Rows"])
+
+def offset_paginate(
+  query: Query,
+  keys: list[SortKey],
+  page: int,
+  limit: int,
+  count: Literal["exact", "estimated"] = "exact",
+  count_query: Query | None = None,
+) -> tuple[list, int, bool]:
+  """
+  Fetch one page of a query ordered by `keys` together with the total number of rows.
+  The exact total is computed by COUNT(*) OVER () in the page statement, so the filters run once.
+  With `count` set to "estimated" the total is the planner's estimate instead, unless the estimate is
+  below ESTIMATED_COUNT_THRESHOLD where an exact total is cheap.
+  Returns the rows of the page, the total and whether the total is an estimate.
+  param query: Query returning an entity, optionally followed by extra columns.
+  param keys: Sort keys as (column expression, "asc" | "desc") tuples.
+  param page: Page number, starting at 1.
+  param limit: Maximum number of rows of the page.
+  param count: "exact" or "estimated" total.
+  param count_query: Query estimated for the total, defaults to `query`.
+  """
+  offset = (page - 1) * limit
+
+  if count == "estimated":
+    estimate = estimate_count(count_query or query)
+    if estimate >= config.ESTIMATED_COUNT_THRESHOLD:
+      return order_by_keys(query, keys).offset(offset).limit(limit).all(), estimate, True
+
+  # The window is computed over every filtered row before the LIMIT applies
+  counted = query.add_columns(func.count().over().label("total_count"))
+  rows = order_by_keys(counted, keys).offset(offset).limit(limit).all()
+  if rows:
+    return _strip_columns(rows, 1), rows[0][-1], False
+
+  # Past the last page the window has no row to report the total on
+  return [], (count_query or query).order_by(None).count() if offset else 0, False
+
+def get_cursor_now(cursor: str | None, sort: str, default: datetime) -> datetime:
+  """
+  Get the reference time stored in a cursor so every page is evaluated against the same instant.
+  param cursor: Cursor of the previous page.
+  param sort: Signature of the current sort.
+  param default: Time to use on the first page.
+  """
+  if not cursor:
+    return default
+  _, now = decode_cursor(cursor, sort)
+  return now or default
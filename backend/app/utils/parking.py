@@ -1,16 +1,169 @@
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, literal, union_all
 
-from app.models import ParkingLot
+from app.models import ParkingLot, Reservation
 from datetime import datetime
+from .capacity_ledger import get_reserved_peak, reserve_capacity, MAX_RESERVATION_LENGTH
 
-def is_parking_full(now: datetime, parking_lot: ParkingLot) -> bool:
+def peak_occupancy_query(window_start: datetime, window_end: datetime, parking_ids: list[int] | None = None):
   """
-  Check if the parking lot is full based on current time and reservations.
+  Build a query returning the peak number of concurrent reservations per parking lot inside a window.
+  Every overlapping reservation is clipped to the window and turned into a +1/-1 event pair,
+  then a running sum over the events gives the occupancy at every boundary.
+  param window_start: Start of the requested window in UTC.
+  param window_end: End of the requested window in UTC.
+  param parking_ids: Optional list of parking lot IDs to restrict the sweep to.
+  """
+  overlapping = select(
+    Reservation.parking_id.label("parking_id"),
+    func.greatest(Reservation.start_time, window_start).label("start_at"),
+    func.least(Reservation.end_time, window_end).label("end_at"),
+  ).where(
+    Reservation.is_cancelled == False,
+    Reservation.start_time < window_end,
+    Reservation.start_time > window_start - MAX_RESERVATION_LENGTH,
+    Reservation.end_time > window_start,
+  )
+  if parking_ids is not None:
+    overlapping = overlapping.where(Reservation.parking_id.in_(parking_ids))
+  overlapping = overlapping.cte("overlapping")
+
+  # Ends sort before starts at the same instant since reservations are half-open intervals
+  events = union_all(
+    select(overlapping.c.parking_id, overlapping.c.start_at.label("at"), literal(1).label("delta")),
+    select(overlapping.c.parking_id, overlapping.c.end_at.label("at"), literal(-1).label("delta")),
+  ).subquery("events")
+
+  sweep = select(
+    events.c.parking_id,
+    func.sum(events.c.delta).over(
+      partition_by=events.c.parking_id,
+      order_by=(events.c.at, events.c.delta),
+      rows=(None, 0),
+    ).label("occupied"),
+  ).subquery("sweep")
+
+  return select(
+    sweep.c.parking_id,
+    func.max(sweep.c.occupied).label("peak"),
+  ).group_by(sweep.c.parking_id)
+
+def lot_availability_query(window_start: datetime, window_end: datetime, min_free: int = 1, sort_by: str = "free"):
+  """
+  Build a query returning every active parking lot with at least `min_free` slots free for the whole window.
+  The peak occupancy of all lots is computed by one sweep and joined to the lots.
+  param window_start: Start of the requested window in UTC.
+  param window_end: End of the requested window in UTC.
+  param min_free: Minimum number of free slots over the window.
+  param sort_by: 'free' for the most free slots first, 'rate' for the cheapest first.
+  """
+  peaks = peak_occupancy_query(window_start, window_end).subquery("peaks")
+  peak_reserved = func.coalesce(peaks.c.peak, 0)
+  free_slots = ParkingLot.total_slots - peak_reserved
+
+  query = select(
+    ParkingLot,
+    peak_reserved.label("peak_reserved"),
+    free_slots.label("free_slots"),
+  ).outerjoin(peaks, peaks.c.parking_id == ParkingLot.id).where(
+    ParkingLot.is_active == True,
+    free_slots >= min_free,
+  )
+
+  if sort_by == "rate":
+    return query.order_by(ParkingLot.rate.asc(), free_slots.desc(), ParkingLot.id.asc())
+  return query.order_by(free_slots.desc(), ParkingLot.rate.asc(), ParkingLot.id.asc())
+
+def get_peak_occupancy(db: Session, parking_id: int, window_start: datetime, window_end: datetime) -> int:
+  """
+  Get the peak number of concurrent reservations of a parking lot inside a window.
+  param db: Database session.
+  param parking_id: ID of the parking lot to check.
+  param window_start: Start of the requested window in UTC.
+  param window_end: End of the requested window in UTC.
+  """
+  row = db.execute(peak_occupancy_query(window_start, window_end, [parking_id])).first()
+  return int(row.peak) if row else 0
+
+def lot_occupancy_lateral(now: datetime):
+  """
+  Build a lateral subquery counting the active and upcoming reservations of the outer ParkingLot row.
+  Join it to a page of lots with `outerjoin(occupancy, true())` so only the lots of the page are aggregated.
   param now: Current datetime in UTC.
-  param parking_lot: ParkingLot object to check.
   """
-  active_reservations = [
-    res for res in parking_lot.reservations if res.end_time > now and res.is_cancelled is False
-  ]
-  
-  return len(active_reservations) >= parking_lot.total_slots
\ No newline at end of file
+  return select(
+    func.count().filter(Reservation.start_time <= now).label("active_reservations"),
+    func.count().filter(Reservation.start_time > now).label("upcoming_reservations"),
+  ).where(
+    Reservation.parking_id == ParkingLot.id,
+    Reservation.is_cancelled == False,
+    Reservation.start_time >= now - MAX_RESERVATION_LENGTH,
+    Reservation.end_time >= now,
+  ).lateral("occupancy")
+
+def load_lot_occupancy(db: Session, parking_lot: ParkingLot, now: datetime) -> ParkingLot:
+  """
+  Set the active and upcoming reservation counts on a single parking lot.
+  param db: Database session.
+  param parking_lot: ParkingLot object to fill.
+  param now: Current datetime in UTC.
+  """
+  row = db.execute(
+    select(
+      func.count().filter(Reservation.start_time <= now).label("active_reservations"),
+      func.count().filter(Reservation.start_time > now).label("upcoming_reservations"),
+    ).where(
+      Reservation.parking_id == parking_lot.id,
+      Reservation.is_cancelled == False,
+      Reservation.start_time >= now - MAX_RESERVATION_LENGTH,
+      Reservation.end_time >= now,
+    )
+  ).one()
+  parking_lot.active_reservations = row.active_reservations
+  parking_lot.upcoming_reservations = row.upcoming_reservations
+  return parking_lot
+
+def get_parking_summary(db: Session, now: datetime) -> dict:
+  """
+  Compute the parking summary in one round trip with FILTER aggregates.
+  Reserved slots count the reservations that have not ended at `now`.
+  param db: Database session.
+  param now: Current datetime in UTC.
+  """
+  reserved_slots = select(func.count()).where(
+    Reservation.start_time > now - MAX_RESERVATION_LENGTH,
+    Reservation.end_time > now,
+    Reservation.is_cancelled == False,
+  ).scalar_subquery()
+
+  row = db.execute(
+    select(
+      func.count(ParkingLot.id).label("total_parking_lots"),
+      func.count(ParkingLot.id).filter(ParkingLot.is_active == True).label("total_active_parking_lots"),
+      func.coalesce(func.sum(ParkingLot.total_slots), 0).label("total_available_slots"),
+      reserved_slots.label("total_reserved_slots"),
+    )
+  ).one()
+  return dict(row._mapping)
+
+def claim_capacity(db: Session, parking_lot: ParkingLot, window_start: datetime, window_end: datetime) -> bool:
+  """
+  Claim one slot of a parking lot over a window, or report that the lot is full.
+  The booking is first added to the ledger buckets of the window: the upsert locks those bucket rows
+  in time order, so only bookings sharing a bucket wait on each other and bookings on other parts of
+  the lot's timeline proceed in parallel. Overlapping reservations always share a bucket, so every
+  check below sees all the committed competitors of the window.
+  Runs in the caller's transaction, which must be rolled back when False is returned.
+  param db: Database session.
+  param parking_lot: ParkingLot object to claim a slot of.
+  param window_start: Start of the requested window in UTC.
+  param window_end: End of the requested window in UTC.
+  """
+  reserve_capacity(db, parking_lot.id, window_start, window_end)
+
+  # The ledger now counts this booking and over-counts at bucket granularity, within capacity it is always free
+  if get_reserved_peak(db, parking_lot.id, window_start, window_end) <= parking_lot.total_slots:
+    return True
+
+  # Fall back to the exact sweep of the committed reservations, this booking is not inserted yet
+  return get_peak_occupancy(db, parking_lot.id, window_start, window_end) < parking_lot.total_slots
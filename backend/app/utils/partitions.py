@@ -0,0 +1,164 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, timezone
+import argparse
+import re
+
+from app.core.config import get_config
+from .time_helper import get_current_utc_time
+
+config = get_config()
+
+# Monthly range partitioned tables and their partition key
+PARTITIONED_TABLES = {
+  "reservations": "start_time",
+  "notifications": "created_at",
+}
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+  """Get the first instant (UTC) of the month of `moment`, shifted by `offset` months."""
+  moment = moment.astimezone(timezone.utc)
+  index = moment.year * 12 + moment.month - 1 + offset
+  return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(table: str, month: datetime) -> str:
+  return f"{table}_{month:%Y_%m}"
+
+def _list_partitions(db: Session, table: str) -> list[str]:
+  return db.execute(text("""
+    SELECT child.relname FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :table
+  """), {"table": table}).scalars().all()
+
+def create_month_partition(db: Session, table: str, month: datetime) -> bool:
+  """
+  Create the partition of a table for one month if it does not exist.
+  Rows of that month that landed in the default partition are moved into the new partition first,
+  otherwise Postgres refuses to create it.
+  Returns whether a partition was created.
+  param db: Database session.
+  param table: Partitioned table name.
+  param month: First instant of the month in UTC.
+  """
+  name = partition_name(table, month)
+  if db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+    return False
+
+  column = PARTITIONED_TABLES[table]
+  bounds = {"start": month, "end": month_start(month, 1)}
+  values = f"FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+
+  has_default_rows = db.execute(
+    text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {column} >= :start AND {column} < :end)"),
+    bounds,
+  ).scalar()
+
+  if not has_default_rows:
+    db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {values}"))
+    return True
+
+  db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+  db.execute(text(f"""
+    WITH moved AS (
+      DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *
+    )
+    INSERT INTO {name} SELECT * FROM moved
+  """), bounds)
+  db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {values}"))
+  return True
+
+def ensure_partitions(db: Session, now: datetime | None = None, months_ahead: int | None = None) -> list[str]:
+  """
+  Create the partitions of the current month and of the next `months_ahead` months for every partitioned table.
+  Returns the names of the created partitions.
+  param db: Database session.
+  param now: Current datetime in UTC.
+  param months_ahead: Number of future months to prepare, defaults to PARTITION_MONTHS_AHEAD.
+  """
+  now = now or get_current_utc_time()
+  months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+
+  created = []
+  for table in PARTITIONED_TABLES:
+    for offset in range(months_ahead + 1):
+      month = month_start(now, offset)
+      if create_month_partition(db, table, month):
+        created.append(partition_name(table, month))
+  db.commit()
+  return created
+
+def apply_retention(db: Session, now: datetime | None = None) -> list[str]:
+  """
+  Detach, or drop, the monthly partitions older than the retention of their table.
+  Detached partitions stay in the database as plain tables for archiving.
+  Returns the names of the partitions that were removed from their table.
+  param db: Database session.
+  param now: Current datetime in UTC.
+  """
+  now = now or get_current_utc_time()
+  retention = {
+    "reservations": config.RESERVATION_RETENTION_MONTHS,
+    "notifications": config.NOTIFICATION_RETENTION_MONTHS,
+  }
+
+  removed = []
+  for table, months in retention.items():
+    if months <= 0:
+      continue
+    cutoff = month_start(now, -months)
+    pattern = re.compile(rf"^{table}_(\d{{4}})_(\d{{2}})$")
+
+    for name in sorted(_list_partitions(db, table)):
+      match = pattern.match(name)
+      if not match:
+        continue
+      # A partition is expired once its whole month is before the cutoff
+      month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+      if month_start(month, 1) > cutoff:
+        continue
+
+      db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+      if table == "notifications":
+        # The unread notifications leaving with the partition leave the unread counters of their users too
+        db.execute(text(f"""
+          UPDATE users SET unread_notifications_count = unread_notifications_count - unread.count
+          FROM (SELECT user_id, count(*) AS count FROM {name} WHERE is_read = false GROUP BY user_id) AS unread
+          WHERE users.id = unread.user_id
+        """))
+      if config.PARTITION_RETENTION_ACTION == "drop":
+        db.execute(text(f"DROP TABLE {name}"))
+      removed.append(name)
+  db.commit()
+  return removed
+
+def maintain_partitions():
+  """Scheduled job creating the upcoming partitions and applying the retention policy."""
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    created = ensure_partitions(db)
+    removed = apply_retention(db)
+    if created or removed:
+      print(f"Partitions created: {created}, removed: {removed}", flush=True)
+  except Exception as e:
+    db.rollback()
+    print(f"Error maintaining partitions: {e}", flush=True)
+  finally:
+    db.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Create the upcoming monthly partitions and apply the retention policy.")
+  parser.add_argument("--months-ahead", type=int, default=None, help="Future months to prepare, defaults to PARTITION_MONTHS_AHEAD.")
+  args = parser.parse_args()
+
+  from app.core.database import SessionLocal
+
+  db = SessionLocal()
+  try:
+    print(f"Created: {ensure_partitions(db, months_ahead=args.months_ahead)}", flush=True)
+    print(f"Removed: {apply_retention(db)}", flush=True)
+  finally:
+    db.close()
@@ -0,0 +1,69 @@
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy import select, event
+from datetime import datetime
+from typing import NamedTuple, Iterable
+
+from app.models import ParkingLot, Reservation
+
+class ReservationPrice(NamedTuple):
+  duration_hours: float
+  total_cost: float
+
+FREE = ReservationPrice(0.0, 0.0)
+
+def calculate_price(start_time: datetime, end_time: datetime, rate: float | None, is_cancelled: bool = False) -> ReservationPrice:
+  """
+  Price a reservation window at an hourly rate.
+  This is the single pricing rule of the app, bookings, bulk imports and quotes all go through it.
+  Cancelled reservations and lots without a rate cost nothing.
+  param start_time: Start of the reservation.
+  param end_time: End of the reservation.
+  param rate: Hourly rate of the parking lot.
+  param is_cancelled: Whether the reservation is cancelled.
+  """
+  if is_cancelled or rate is None or not start_time or not end_time:
+    return FREE
+  duration_hours = (end_time - start_time).total_seconds() / 3600.0
+  return ReservationPrice(duration_hours, round(duration_hours * rate, 2))
+
+def load_rates(db: Session, parking_ids: Iterable[int]) -> dict[int, float]:
+  """
+  Load the hourly rates of parking lots in one query, for pricing many reservations at once.
+  param db: Database session.
+  param parking_ids: IDs of the parking lots.
+  """
+  parking_ids = set(parking_ids)
+  if not parking_ids:
+    return {}
+  rows = db.execute(select(ParkingLot.id, ParkingLot.rate).where(ParkingLot.id.in_(parking_ids))).all()
+  return {row.id: row.rate for row in rows}
+
+def _loaded_parking_lot(target: Reservation) -> ParkingLot | None:
+  """Get the parking lot of a reservation if it is already loaded in the session, without any SQL."""
+  parking = target.__dict__.get("parking")
+  if parking is not None:
+    return parking
+  session = object_session(target)
+  if session is None or target.parking_id is None:
+    return None
+  return session.identity_map.get(identity_key(ParkingLot, target.parking_id))
+
+@event.listens_for(Reservation, "before_insert")
+def price_reservation(mapper, connection, target: Reservation):
+  """
+  Fill the duration and cost of a reservation being inserted.
+  The booking flow has already loaded (and locked) the lot in the session, so its rate is read from
+  the identity map; the rate is only selected on the flush connection when the lot is not loaded.
+  """
+  if target.is_cancelled:
+    price = FREE
+  else:
+    parking = _loaded_parking_lot(target)
+    if parking is not None:
+      rate = parking.rate
+    else:
+      rate = connection.scalar(select(ParkingLot.rate).where(ParkingLot.id == target.parking_id))
+    price = calculate_price(target.start_time, target.end_time, rate)
+
+  target.duration_hours, target.total_cost = price
@@ -1,18 +1,24 @@
-from sqlalchemy.orm import Session, Query
-from sqlalchemy import or_, and_, case
-from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, select, insert, update, delete, literal, Row
+from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 
-from app.models import User, ParkingLot, Reservation
-from app.schema import ReservationCreate
-from .parking import is_parking_full
+from app.core.config import get_config
+from app.models import User, ParkingLot, Reservation, Notification, ScheduledNotification
+from app.schema import ReservationCreate, ReservationBatchCreate
+from .parking import claim_capacity
+from .interval_index import LotIntervals
+from .capacity_ledger import clear_capacity_ledger, reserve_capacity_windows, MAX_RESERVATION_LENGTH
+from .pricing import calculate_price
+from .notification_inbox import count_unread_change
 
-def is_valid_request(now: datetime, reservation: ReservationCreate, parking_lot: ParkingLot, current_user: User, db: Session) -> bool:
+config = get_config()
+
+def check_booking_target(parking_lot: ParkingLot, current_user: User):
   """
-  Validate the reservation request against the parking lot's current state.
-  param now: Current datetime in UTC.
-  param reservation: ReservationCreate object containing reservation details.
-  param parking_lot: ParkingLot object to check against.
+  Check that a user may book on a parking lot, raising the matching HTTP error otherwise.
+  param parking_lot: ParkingLot object, None when it does not exist.
+  param current_user: User making the reservation.
   """
 
   # Check if the user is not an admin
@@ -22,21 +28,69 @@ def is_valid_request(now: datetime, reservation: ReservationCreate, parking_lot:
       detail="Admins cannot create reservations."
     )
   
+  # Check if the parking lot exists
+  if not parking_lot:
+    raise HTTPException(
+      status_code=status.HTTP_404_NOT_FOUND,
+      detail="Parking lot not found."
+    )
+
   # Check if the parking lot is active
   if not parking_lot.is_active:
     raise HTTPException(
       status_code=status.HTTP_400_BAD_REQUEST,
       detail="Cannot create reservation for an inactive parking lot."
     )
+
+def check_reservation_window(start_time: datetime, end_time: datetime, now: datetime):
+  """
+  Check that a reservation window is bookable at `now`, raising the matching HTTP error otherwise.
+  param start_time: Start of the reservation.
+  param end_time: End of the reservation.
+  param now: Current datetime in UTC.
+  """
+  # Check if the reservation time is in the past
+  if start_time < now or end_time < now:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Reservation time cannot be in the past."
+    )
+
+  # Availability queries rely on reservations being at most RESERVATION_MAX_HOURS long
+  if end_time - start_time > MAX_RESERVATION_LENGTH:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Reservation cannot be longer than {config.RESERVATION_MAX_HOURS} hours."
+    )
+
+def is_valid_request(now: datetime, reservation: ReservationCreate, parking_lot: ParkingLot, current_user: User, db: Session) -> bool:
+  """
+  Validate the reservation request against the parking lot's current state and claim its capacity.
+  The slot is added to the capacity ledger in the caller's transaction, which must be rolled back on failure.
+  param now: Current datetime in UTC.
+  param reservation: ReservationCreate object containing reservation details.
+  param parking_lot: ParkingLot object to check against.
+  """
+  check_booking_target(parking_lot, current_user)
+  check_reservation_window(reservation.start_time, reservation.end_time, now)
   
+  # Claim a slot over the requested window, this locks the ledger buckets of the window until commit
+  if not claim_capacity(db, parking_lot, reservation.start_time, reservation.end_time):
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Parking lot is full. Cannot create reservation."
+    )
+
   # Check if the reservation overlaps with an existing reservation for the user
   # This checks if the user already has a reservation on the same parking that overlaps with the new one
+  # Overlapping bookings of the user wait on the same ledger buckets, so the check runs after the claim
   existing_reservation = db.query(Reservation).filter(
     Reservation.is_cancelled == False,
     Reservation.user_id == current_user.id,
     Reservation.parking_id == reservation.parking_id,
     and_(
       Reservation.start_time < reservation.end_time,
+      Reservation.start_time > reservation.start_time - MAX_RESERVATION_LENGTH,
       Reservation.end_time > reservation.start_time
     )
   ).first()
@@ -47,65 +101,218 @@ def is_valid_request(now: datetime, reservation: ReservationCreate, parking_lot:
       detail="You already have a reservation that overlaps with this one."
     )
 
-  # Check if the parking lot exists
-  if not parking_lot:
-    raise HTTPException(
-      status_code=status.HTTP_404_NOT_FOUND,
-      detail="Parking lot not found."
-    )
+  return True
   
-  # Check if the parking lot is full
-  if is_parking_full(now, parking_lot):
+def get_reservation_sort_keys(sort_by: str, sort_order: str, now: datetime | None = None) -> list[tuple]:
+  """
+  Get the sort keys of a reservation sort, ending with the reservation ID as a unique tie-breaker.
+  param sort_by: Field to sort by ('user', 'parking', 'time', 'status' or 'id').
+  param sort_order: Order of sorting ('asc' or 'desc').
+  param now: Current datetime in UTC, required when sorting by status.
+  """
+  if (sort_by == "status"):
+    return [(Reservation.status_rank_at(now), sort_order), (Reservation.start_time, sort_order), (Reservation.id, sort_order)]
+  elif (sort_by == "user"):
+    return [(User.first_name, sort_order), (Reservation.id, sort_order)]
+  elif (sort_by == "parking"):
+    return [(ParkingLot.name, sort_order), (Reservation.id, sort_order)]
+  elif (sort_by == "time"):
+    return [(Reservation.start_time, sort_order), (Reservation.id, sort_order)]
+  else:
+    return [(Reservation.id, sort_order)]
+
+def cancel_lot_reservations(db: Session, parking_id: int, message: str) -> list[Row]:
+  """
+  Cancel every live reservation of a parking lot, notify their users, count the notifications as unread
+  and remove their pending reminders in a single statement. The cancelled reservations are flagged as notified and the lot's capacity ledger is cleared.
+  Returns the created notifications, to publish once the caller commits.
+  param db: Database session.
+  param parking_id: ID of the parking lot.
+  param message: Notification message sent to each affected user.
+  """
+  cancelled = (
+    update(Reservation)
+    .where(Reservation.parking_id == parking_id, Reservation.is_cancelled == False)
+    .values(is_cancelled=True, notified=True)
+    .returning(Reservation.id, Reservation.user_id)
+    .cte("cancelled")
+  )
+  notified = (
+    insert(Notification)
+    .from_select(["user_id", "message"], select(cancelled.c.user_id, literal(message)))
+    .returning(Notification.id, Notification.user_id, Notification.message, Notification.created_at)
+    .cte("notified")
+  )
+  unscheduled = (
+    delete(ScheduledNotification)
+    .where(ScheduledNotification.reservation_id.in_(select(cancelled.c.id)), ScheduledNotification.sent_at.is_(None))
+    .cte("unscheduled")
+  )
+  notifications = db.execute(select(notified).add_cte(unscheduled, count_unread_change(notified, 1))).all()
+
+  clear_capacity_ledger(db, parking_id)
+  return notifications
+
+def get_batch_windows(batch: ReservationBatchCreate) -> list[tuple[datetime, datetime]]:
+  """
+  Get the (start, end) windows of a batch request, expanding its recurrence rule when given.
+  Raises a 400 error when the batch is empty or has more than RESERVATION_BATCH_MAX_OCCURRENCES windows.
+  param batch: ReservationBatchCreate object.
+  """
+  if batch.windows is not None:
+    windows = [(window.start_time, window.end_time) for window in batch.windows]
+  else:
+    rule = batch.recurrence
+    step = timedelta(days=rule.interval * (7 if rule.frequency == "weekly" else 1))
+    duration = rule.end_time - rule.start_time
+
+    # Every 7 steps reach each weekday of the rule, so the walk past the cap is bounded by steps as well
+    windows = []
+    start = rule.start_time
+    for _ in range(7 * (config.RESERVATION_BATCH_MAX_OCCURRENCES + 1)):
+      if start.date() > rule.until or len(windows) > config.RESERVATION_BATCH_MAX_OCCURRENCES:
+        break
+      if rule.weekdays is None or start.weekday() in rule.weekdays:
+        windows.append((start, start + duration))
+      try:
+        start += step
+      except OverflowError:
+        break
+
+  if not windows:
     raise HTTPException(
       status_code=status.HTTP_400_BAD_REQUEST,
-      detail="Parking lot is full. Cannot create reservation."
+      detail="The request does not contain any reservation."
     )
-
-  # Check if the reservation time is in the past
-  if reservation.start_time < now or reservation.end_time < now:
+  if len(windows) > config.RESERVATION_BATCH_MAX_OCCURRENCES:
     raise HTTPException(
       status_code=status.HTTP_400_BAD_REQUEST,
-      detail="Reservation time cannot be in the past."
+      detail=f"A batch cannot contain more than {config.RESERVATION_BATCH_MAX_OCCURRENCES} reservations."
     )
-  
-  return True
-  
-def sort_reservations(query: Query, sort_by: str, sort_order: str):
+  return windows
+
+def check_lot_windows(db: Session, parking_lot: ParkingLot, requests: list[tuple[int, datetime, datetime]]) -> list[str | None]:
   """
-  Sort reservations based on the provided sort_by and sort_order.
-  param query: SQLAlchemy session query object.
-  param sort_by: Field to sort by (e.g., 'start_time', 'end_time').
-  param sort_order: Order of sorting ('asc' or 'desc').
+  Check (user ID, start, end) booking requests on a parking lot in order, in the caller's transaction.
+  The ledger buckets of every window are locked in one upsert and the live reservations of the requests' span
+  are read once, each request is then checked against them and the requests accepted before it.
+  Returns the error of each request, None for the accepted ones.
+  param db: Database session.
+  param parking_lot: ParkingLot object, share-locked by the caller.
+  param requests: (user ID, start, end) tuples of the reservations to book.
   """
-  if (sort_by == "user"):
-    return query.order_by(
-      getattr(User, "first_name").asc() if sort_order == "asc" else getattr(User, "first_name").desc()
-    )
-  elif (sort_by == "parking"):
-    return query.order_by(
-      getattr(ParkingLot, "name").asc() if sort_order == "asc" else getattr(ParkingLot, "name").desc()
-    )
-  elif (sort_by == "time"):
-    return query.order_by(
-      Reservation.start_time.asc() if sort_order == "asc" else Reservation.start_time.desc()
-    )
-  else:
-    return query.order_by(
-      Reservation.id.asc() if sort_order == "asc" else Reservation.id.desc()
+  if not requests:
+    return []
+
+  # Lock the ledger buckets of every window so competing bookings wait, then read the span once
+  reserve_capacity_windows(db, parking_lot.id, [(start_time, end_time) for _, start_time, end_time in requests], count=0)
+  span_start = min(start_time for _, start_time, _ in requests)
+  span_end = max(end_time for _, _, end_time in requests)
+  rows = db.execute(
+    select(Reservation.id, Reservation.user_id, Reservation.start_time, Reservation.end_time).where(
+      Reservation.parking_id == parking_lot.id,
+      Reservation.is_cancelled == False,
+      Reservation.start_time < span_end,
+      Reservation.start_time > span_start - MAX_RESERVATION_LENGTH,
+      Reservation.end_time > span_start,
     )
+  ).all()
+  timeline = LotIntervals({row.id: (row.start_time.timestamp(), row.end_time.timestamp()) for row in rows})
+  user_windows: dict[int, list[tuple[datetime, datetime]]] = {}
+  for row in rows:
+    user_windows.setdefault(row.user_id, []).append((row.start_time, row.end_time))
 
-def sort_by_status(now: datetime, query: Query, sort_order: str = "asc"):
+  errors = []
+  for index, (user_id, start_time, end_time) in enumerate(requests):
+    own_windows = user_windows.setdefault(user_id, [])
+    if any(start < end_time and end > start_time for start, end in own_windows):
+      errors.append("You already have a reservation that overlaps with this one.")
+    elif timeline.peak(start_time.timestamp(), end_time.timestamp()) >= parking_lot.total_slots:
+      errors.append("Parking lot is full. Cannot create reservation.")
+    else:
+      # Accepted requests count against the following ones, they get negative keys
+      timeline.add(-(index + 1), start_time.timestamp(), end_time.timestamp())
+      own_windows.append((start_time, end_time))
+      errors.append(None)
+  return errors
+
+def insert_reservations(db: Session, parking_lot: ParkingLot, requests: list[tuple[int, datetime, datetime]]) -> list[Reservation]:
+  """
+  Add checked (user ID, start, end) reservations to the ledger in one upsert and insert them in one
+  multi-row statement, in the caller's transaction.
+  param db: Database session.
+  param parking_lot: ParkingLot object the reservations are made on.
+  param requests: (user ID, start, end) tuples of the reservations.
+  """
+  if not requests:
+    return []
+
+  reserve_capacity_windows(db, parking_lot.id, [(start_time, end_time) for _, start_time, end_time in requests])
+  values = []
+  for user_id, start_time, end_time in requests:
+    price = calculate_price(start_time, end_time, parking_lot.rate)
+    values.append({
+      "user_id": user_id,
+      "parking_id": parking_lot.id,
+      "start_time": start_time,
+      "end_time": end_time,
+      "duration_hours": price.duration_hours,
+      "total_cost": price.total_cost,
+      "is_cancelled": False,
+      "notified": False,
+    })
+  return list(db.scalars(insert(Reservation).returning(Reservation), values).all())
+
+def book_reservation_batch(
+  db: Session,
+  now: datetime,
+  windows: list[tuple[datetime, datetime]],
+  parking_lot: ParkingLot,
+  current_user: User,
+  all_or_nothing: bool = True,
+) -> tuple[list[Reservation], list[tuple[datetime, datetime, str]]]:
   """
-  Sort reservations by status.
+  Validate and insert many reservations of a user on a parking lot in the caller's transaction.
+  The windows are checked in time order with check_lot_windows and the accepted ones inserted in one statement.
+  Returns the created reservations and the (start, end, error) of the rejected windows.
+  Nothing is inserted when `all_or_nothing` is set and a window is rejected.
+  param db: Database session.
+  param now: Current datetime in UTC.
+  param windows: (start, end) windows to book.
+  param parking_lot: ParkingLot object, share-locked by the caller.
+  param current_user: User making the reservations.
+  param all_or_nothing: Whether a single rejected window rejects the whole batch.
   """
-  status_order_case = case(
-    (Reservation.is_cancelled == True, 3),  # Cancelled
-    (Reservation.end_time < now, 2),        # Complete
-    (Reservation.start_time > now, 1),      # Upcoming
-    else_=0  # Active
-  ).label("status_rank")
+  check_booking_target(parking_lot, current_user)
+
+  failures = []
+  candidates = []
+  latest_end = None
+  for start_time, end_time in sorted(windows):
+    if start_time >= end_time:
+      failures.append((start_time, end_time, "Start time must be before end time."))
+    elif start_time < now:
+      failures.append((start_time, end_time, "Reservation time cannot be in the past."))
+    elif end_time - start_time > MAX_RESERVATION_LENGTH:
+      failures.append((start_time, end_time, f"Reservation cannot be longer than {config.RESERVATION_MAX_HOURS} hours."))
+    elif latest_end is not None and start_time < latest_end:
+      failures.append((start_time, end_time, "Reservation overlaps with another reservation of the batch."))
+    else:
+      candidates.append((start_time, end_time))
+      latest_end = end_time
+
+  if not candidates or (all_or_nothing and failures):
+    return [], failures
+
+  errors = check_lot_windows(db, parking_lot, [(current_user.id, start_time, end_time) for start_time, end_time in candidates])
+  accepted = []
+  for (start_time, end_time), error in zip(candidates, errors):
+    if error is None:
+      accepted.append((current_user.id, start_time, end_time))
+    else:
+      failures.append((start_time, end_time, error))
+
+  if not accepted or (all_or_nothing and failures):
+    return [], failures
 
-  return query.order_by(
-    status_order_case.asc() if sort_order == "asc" else status_order_case.desc(),
-    Reservation.start_time.asc() if sort_order == "asc" else Reservation.start_time.desc()
-  )
\ No newline at end of file
+  return insert_reservations(db, parking_lot, accepted), failures
@@ -0,0 +1,54 @@
+from sqlalchemy import or_, select, func, false, cast, Double
+
+from app.models import User, ParkingLot, Reservation
+
+# Searchable columns of each entity, every column has a pg_trgm GIN index
+PARKING_SEARCH_COLUMNS = (ParkingLot.name,)
+USER_SEARCH_COLUMNS = (User.first_name, User.last_name, User.email)
+RESERVATION_USER_SEARCH_COLUMNS = (User.first_name, User.last_name)
+
+def _like_pattern(term: str) -> str:
+  escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+  return f"%{escaped}%"
+
+def search_predicate(columns: tuple, term: str):
+  """
+  Build a case-insensitive substring match over columns.
+  A pg_trgm GIN index serves `ILIKE '%term%'` for terms of three characters or more.
+  param columns: Columns to search.
+  param term: Search term.
+  """
+  pattern = _like_pattern(term)
+  return or_(*[column.ilike(pattern, escape="\\") for column in columns])
+
+def search_rank(columns: tuple, term: str):
+  """
+  Build a relevance score between 0 and 1 using the best trigram word similarity over columns.
+  word_similarity returns a real, the score is cast to double precision so the value stored in a keyset
+  cursor compares equal to the row it came from.
+  param columns: Columns to score.
+  param term: Search term.
+  """
+  scores = [func.word_similarity(term, column) for column in columns]
+  return cast(scores[0] if len(scores) == 1 else func.greatest(*scores), Double)
+
+def search_parking_lots(term: str):
+  """Filter parking lots by name."""
+  return search_predicate(PARKING_SEARCH_COLUMNS, term)
+
+def search_users(term: str):
+  """Filter users by first name, last name or email."""
+  return search_predicate(USER_SEARCH_COLUMNS, term)
+
+def search_reservations(term: str):
+  """
+  Filter reservations by exact ID, user name or parking lot name.
+  Users and lots are matched on their own trigram indexes and the reservations are then
+  looked up by foreign key, so the search never scans the joined rows.
+  param term: Search term.
+  """
+  return or_(
+    Reservation.id == int(term) if term.isdigit() and len(term) <= 9 else false(),
+    Reservation.user_id.in_(select(User.id).where(search_predicate(RESERVATION_USER_SEARCH_COLUMNS, term))),
+    Reservation.parking_id.in_(select(ParkingLot.id).where(search_parking_lots(term))),
+  )
@@ -0,0 +1,48 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextvars import ContextVar
+
+class StatementCounter:
+  __slots__ = ("count",)
+
+  def __init__(self):
+    self.count = 0
+
+_counter: ContextVar[StatementCounter | None] = ContextVar("sql_statement_counter", default=None)
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+  counter = _counter.get()
+  if counter is not None:
+    counter.count += 1
+
+def install_statement_budget(app: FastAPI, engine: Engine, budget: int):
+  """
+  Fail any request issuing more than `budget` SQL statements.
+  Meant for test runs to catch N+1 queries, every response also gets an `X-SQL-Statements` header.
+  param app: FastAPI application.
+  param engine: SQLAlchemy engine to count statements on.
+  param budget: Maximum number of statements per request.
+  """
+  event.listen(engine, "before_cursor_execute", _count_statement)
+
+  @app.middleware("http")
+  async def enforce_statement_budget(request: Request, call_next):
+    counter = StatementCounter()
+    token = _counter.set(counter)
+    try:
+      response = await call_next(request)
+    finally:
+      _counter.reset(token)
+
+    if counter.count > budget:
+      print(f"SQL statement budget exceeded on {request.method} {request.url.path}: {counter.count} > {budget}", flush=True)
+      return JSONResponse(
+        status_code=500,
+        content={"detail": f"SQL statement budget exceeded: {counter.count} statements, budget is {budget}."},
+        headers={"X-SQL-Statements": str(counter.count)},
+      )
+
+    response.headers["X-SQL-Statements"] = str(counter.count)
+    return response
@@ -0,0 +1,152 @@
+from array import array
+from math import ceil
+from typing import Callable
+import asyncio
+import threading
+import time
+
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+
+class TimingWheel:
+  """
+  Hierarchical timing wheel of integer keys with one second ticks.
+  Level 0 holds the keys due in the next 256 seconds, each following level covers 256 times the span of
+  the previous one (about 18 hours, 194 days and 136 years); keys move down a level when their slot comes up.
+  Slots are flat arrays of (key, due second) pairs, 16 bytes per pending key and no per-entry objects.
+  Adding a key is an append, cancelling one is a dict insert checked when it fires, both O(1).
+  Due times are rounded up to the second so keys never fire early.
+  The wheel runs as a task on the event loop and hands the keys due every second to `on_due`
+  in a worker thread.
+  """
+
+  def __init__(self, on_due: Callable[[list[int]], None]):
+    self.on_due = on_due
+    self._slots: list[list[array | None]] = [[None] * SLOTS for _ in range(LEVELS)]
+    self._overdue = array("q")
+    self._cancelled: dict[int, int] = {}
+    self._tick = int(time.time())
+    self._lock = threading.Lock()
+    self._task: asyncio.Task | None = None
+    self.pending = 0
+    self.fired = 0
+    self.cancelled = 0
+
+  def _insert(self, key: int, due: int):
+    delta = due - self._tick
+    if delta <= 0:
+      self._overdue.append(key)
+      return
+    level = 0
+    while level < LEVELS - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+      level += 1
+    index = (due >> (SLOT_BITS * level)) & SLOT_MASK
+    slot = self._slots[level][index]
+    if slot is None:
+      slot = self._slots[level][index] = array("q")
+    slot.append(key)
+    slot.append(due)
+
+  def add(self, key: int, due: float):
+    """
+    Schedule a key at a UNIX timestamp, keys already due fire on the next tick.
+    param key: Non negative integer key.
+    param due: UNIX timestamp in seconds.
+    """
+    with self._lock:
+      self._insert(key, ceil(due))
+      self.pending += 1
+
+  def cancel(self, key: int, due: float):
+    """
+    Cancel a pending key, it is dropped when its slot comes up.
+    param key: Key to cancel.
+    param due: UNIX timestamp the key was scheduled at.
+    """
+    with self._lock:
+      if ceil(due) > self._tick:
+        self._cancelled[key] = ceil(due)
+
+  def _collect(self, due_keys: list[int], keys):
+    """Add fired keys to `due_keys`, dropping the cancelled ones."""
+    self.pending -= len(keys)
+    if self._cancelled:
+      kept = [key for key in keys if self._cancelled.pop(key, None) is None]
+      self.cancelled += len(keys) - len(kept)
+      keys = kept
+    self.fired += len(keys)
+    due_keys.extend(keys)
+
+  def advance(self, until: int) -> list[int]:
+    """
+    Move the wheel up to the second `until` and collect the keys that came due.
+    param until: UNIX timestamp in seconds.
+    """
+    due_keys = []
+    with self._lock:
+      if self._overdue:
+        self._collect(due_keys, self._overdue)
+        self._overdue = array("q")
+
+      while self._tick < until:
+        self._tick += 1
+        tick = self._tick
+
+        # Cascade the higher levels whose slot starts at this tick, highest first
+        level = 1
+        while level < LEVELS and tick & ((1 << (SLOT_BITS * level)) - 1) == 0:
+          level += 1
+        for cascade in range(level - 1, 0, -1):
+          index = (tick >> (SLOT_BITS * cascade)) & SLOT_MASK
+          slot = self._slots[cascade][index]
+          if slot is not None:
+            self._slots[cascade][index] = None
+            for position in range(0, len(slot), 2):
+              key, due = slot[position], slot[position + 1]
+              if due <= tick:
+                self._collect(due_keys, [key])
+              else:
+                self._insert(key, due)
+
+        slot = self._slots[0][tick & SLOT_MASK]
+        if slot is not None:
+          self._slots[0][tick & SLOT_MASK] = None
+          self._collect(due_keys, slot[::2])
+
+        # Forget the cancellations of keys that were not scheduled here and should have fired by now
+        if tick & SLOT_MASK == 0 and self._cancelled:
+          self._cancelled = {key: due for key, due in self._cancelled.items() if due >= tick}
+    return due_keys
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self._tick + 1 - time.time())
+      due_keys = self.advance(int(time.time()))
+      if due_keys:
+        try:
+          await asyncio.to_thread(self.on_due, due_keys)
+        except Exception as e:
+          print(f"Error handling due timers: {e}", flush=True)
+
+  def start(self):
+    """Start ticking on the running event loop."""
+    if self._task is None:
+      with self._lock:
+        self._tick = max(self._tick, int(time.time()))
+      self._task = asyncio.get_running_loop().create_task(self._run())
+
+  def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "pending": self.pending,
+        "fired": self.fired,
+        "cancelled": self.cancelled,
+        "slots_in_use": sum(slot is not None for level in self._slots for slot in level),
+      }
@@ -0,0 +1,62 @@
+from typing import Any, Callable, Hashable
+import threading
+import time
+
+from app.core.config import get_config
+
+config = get_config()
+
+class TTLCache:
+  """
+  Small process-resident cache of computed values that expire after `ttl_seconds`.
+  Write paths call `invalidate` after commit; a value computed while an invalidation happened
+  is returned to its caller but never stored, so a stale result cannot outlive the write.
+  """
+
+  def __init__(self, ttl_seconds: float):
+    self.ttl_seconds = ttl_seconds
+    self._values: dict[Hashable, tuple[float, Any]] = {}
+    self._generation = 0
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+
+  def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+    """
+    Get the cached value of a key, computing and storing it when missing or expired.
+    param key: Cache key.
+    param compute: Function producing the value on a miss.
+    """
+    with self._lock:
+      entry = self._values.get(key)
+      if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+        self.hits += 1
+        return entry[1]
+      self.misses += 1
+      generation = self._generation
+
+    value = compute()
+    with self._lock:
+      if generation == self._generation:
+        self._values[key] = (time.monotonic(), value)
+    return value
+
+  def invalidate(self):
+    """Drop every cached value."""
+    with self._lock:
+      self._generation += 1
+      self._values.clear()
+      self.invalidations += 1
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "hits": self.hits,
+        "misses": self.misses,
+        "invalidations": self.invalidations,
+        "entries": len(self._values),
+      }
+
+# Parking summary aggregates, invalidated by the lot and reservation write paths
+summary_cache = TTLCache(config.SUMMARY_CACHE_TTL_SECONDS)
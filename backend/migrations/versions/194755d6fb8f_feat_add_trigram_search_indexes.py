@@ -0,0 +1,42 @@
+"""feat: add trigram search indexes.
+
+Revision ID: 194755d6fb8f
+Revises: 5b0e3c7d41f2
+Create Date: 2026-10-18 11:26:05.410973
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '194755d6fb8f'
+down_revision: Union[str, None] = '5b0e3c7d41f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.create_index('ix_parking_lots_name_trgm', 'parking_lots', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_users_first_name_trgm', 'users', ['first_name'], unique=False, postgresql_using='gin', postgresql_ops={'first_name': 'gin_trgm_ops'})
+    op.create_index('ix_users_last_name_trgm', 'users', ['last_name'], unique=False, postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'})
+    op.create_index('ix_users_email_trgm', 'users', ['email'], unique=False, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'})
+
+    # Reservations are searched through their user and parking lot
+    op.create_index(op.f('ix_reservations_user_id'), 'reservations', ['user_id'], unique=False)
+    op.create_index(op.f('ix_reservations_parking_id'), 'reservations', ['parking_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reservations_parking_id'), table_name='reservations')
+    op.drop_index(op.f('ix_reservations_user_id'), table_name='reservations')
+    op.drop_index('ix_users_email_trgm', table_name='users')
+    op.drop_index('ix_users_last_name_trgm', table_name='users')
+    op.drop_index('ix_users_first_name_trgm', table_name='users')
+    op.drop_index('ix_parking_lots_name_trgm', table_name='parking_lots')
@@ -0,0 +1,46 @@
+"""chore: check the reservation length cap.
+
+Revision ID: 3b9e6f2d8a45
+Revises: 8e3b5a7c9d21
+Create Date: 2026-10-19 09:12:05.318442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import get_config
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e6f2d8a45'
+down_revision: Union[str, None] = '8e3b5a7c9d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Availability queries skip the reservations starting more than RESERVATION_MAX_HOURS before their
+    # window, a live reservation longer than that would silently stop counting against its lot
+    max_hours = get_config().RESERVATION_MAX_HOURS
+    too_long = op.get_bind().execute(
+        sa.text("""
+            SELECT count(*) FROM reservations
+            WHERE is_cancelled = false
+              AND end_time > now()
+              AND end_time - start_time > make_interval(hours => :max_hours)
+        """),
+        {"max_hours": max_hours},
+    ).scalar()
+    if too_long:
+        raise RuntimeError(
+            f"{too_long} live reservations are longer than RESERVATION_MAX_HOURS={max_hours}, "
+            "raise RESERVATION_MAX_HOURS above the longest one before upgrading."
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
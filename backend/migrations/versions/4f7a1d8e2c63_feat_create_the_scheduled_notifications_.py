@@ -0,0 +1,56 @@
+"""feat: create the scheduled notifications outbox.
+
+Revision ID: 4f7a1d8e2c63
+Revises: 9b4c2e6f8d15
+Create Date: 2026-10-18 20:05:13.927541
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f7a1d8e2c63'
+down_revision: Union[str, None] = '9b4c2e6f8d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduled_notifications',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('reservation_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('message', sa.String(), nullable=False),
+    sa.Column('due_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('reservation_id', 'kind', name='uq_scheduled_notifications_reservation_kind')
+    )
+    op.create_index('ix_scheduled_notifications_pending', 'scheduled_notifications', ['due_at'], unique=False, postgresql_where=sa.text('sent_at IS NULL'))
+
+    # The reminders used to live in memory only, schedule the ones still ahead of the live reservations
+    op.execute("""
+        INSERT INTO scheduled_notifications (reservation_id, user_id, kind, message, due_at)
+        SELECT r.id, r.user_id, k.kind, format(k.template, p.name), k.due_at
+        FROM reservations r
+        JOIN parking_lots p ON p.id = r.parking_id
+        CROSS JOIN LATERAL (VALUES
+            ('start_30', r.start_time - interval '30 minutes', 'Your reservation for parking spot at %s is starting in 30 minutes.', true),
+            ('start_exact', r.start_time, 'Your reservation for parking spot at %s is starting now.', true),
+            ('end_30', r.end_time - interval '30 minutes', 'Your reservation for parking spot at %s is expiring in 30 minutes.', r.end_time - r.start_time > interval '30 minutes'),
+            ('end_exact', r.end_time, 'Your reservation for parking spot at %s has expired.', true)
+        ) AS k(kind, due_at, template, applies)
+        WHERE r.is_cancelled = false AND k.applies AND k.due_at > now()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scheduled_notifications_pending', table_name='scheduled_notifications', postgresql_where=sa.text('sent_at IS NULL'))
+    op.drop_table('scheduled_notifications')
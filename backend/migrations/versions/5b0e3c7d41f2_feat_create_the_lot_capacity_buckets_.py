@@ -0,0 +1,48 @@
+"""feat: create the lot capacity buckets ledger.
+
+Revision ID: 5b0e3c7d41f2
+Revises: a19971ba97f6
+Create Date: 2026-10-18 10:03:51.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e3c7d41f2'
+down_revision: Union[str, None] = 'a19971ba97f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lot_capacity_buckets',
+    sa.Column('parking_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('reserved_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['parking_id'], ['parking_lots.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('parking_id', 'bucket_start')
+    )
+
+    # Seed the ledger with the live reservations using the default 15 minute buckets
+    op.execute("""
+        INSERT INTO lot_capacity_buckets (parking_id, bucket_start, reserved_count)
+        SELECT r.parking_id, b.bucket_start, count(*)
+        FROM reservations r
+        CROSS JOIN LATERAL generate_series(
+            to_timestamp(floor(extract(epoch FROM r.start_time) / 900) * 900),
+            r.end_time - interval '1 microsecond',
+            interval '15 minutes'
+        ) AS b(bucket_start)
+        WHERE r.is_cancelled = false AND r.end_time > now()
+        GROUP BY r.parking_id, b.bucket_start
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('lot_capacity_buckets')
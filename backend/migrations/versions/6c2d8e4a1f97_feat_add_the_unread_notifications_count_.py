@@ -0,0 +1,40 @@
+"""feat: add the unread notifications count of users and the inbox indexes.
+
+Revision ID: 6c2d8e4a1f97
+Revises: 4f7a1d8e2c63
+Create Date: 2026-10-18 21:16:08.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c2d8e4a1f97'
+down_revision: Union[str, None] = '4f7a1d8e2c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('unread_notifications_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE users SET unread_notifications_count = unread.count
+        FROM (SELECT user_id, count(*) AS count FROM notifications WHERE is_read = false GROUP BY user_id) AS unread
+        WHERE users.id = unread.user_id
+    """)
+    op.create_index('ix_notifications_user_created', 'notifications', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index(
+        'ix_notifications_user_unread', 'notifications', ['user_id', 'created_at', 'id'],
+        unique=False, postgresql_where=sa.text('is_read = false')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_user_unread', table_name='notifications', postgresql_where=sa.text('is_read = false'))
+    op.drop_index('ix_notifications_user_created', table_name='notifications')
+    op.drop_column('users', 'unread_notifications_count')
@@ -0,0 +1,30 @@
+"""feat: add coordinates to parking lots.
+
+Revision ID: 7d2f4a9c1e38
+Revises: 194755d6fb8f
+Create Date: 2026-10-18 13:12:44.209316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f4a9c1e38'
+down_revision: Union[str, None] = '194755d6fb8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('parking_lots', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('parking_lots', sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('parking_lots', 'longitude')
+    op.drop_column('parking_lots', 'latitude')
@@ -0,0 +1,32 @@
+"""feat: add partial indexes for reservation statuses.
+
+Revision ID: 9b4c2e6f8d15
+Revises: e5a9d3c27b14
+Create Date: 2026-10-18 18:42:51.660384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4c2e6f8d15'
+down_revision: Union[str, None] = 'e5a9d3c27b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_reservations_live_start', 'reservations', ['start_time'], unique=False, postgresql_where=sa.text('is_cancelled = false'))
+    op.create_index('ix_reservations_live_end', 'reservations', ['end_time'], unique=False, postgresql_where=sa.text('is_cancelled = false'))
+    op.create_index('ix_reservations_cancelled', 'reservations', ['id'], unique=False, postgresql_where=sa.text('is_cancelled = true'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reservations_cancelled', table_name='reservations', postgresql_where=sa.text('is_cancelled = true'))
+    op.drop_index('ix_reservations_live_end', table_name='reservations', postgresql_where=sa.text('is_cancelled = false'))
+    op.drop_index('ix_reservations_live_start', table_name='reservations', postgresql_where=sa.text('is_cancelled = false'))
@@ -0,0 +1,34 @@
+"""feat: add the capacity window index for reservations.
+
+Revision ID: a19971ba97f6
+Revises: 22fd97d902c9
+Create Date: 2026-10-18 09:12:40.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a19971ba97f6'
+down_revision: Union[str, None] = '22fd97d902c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_reservations_parking_window',
+        'reservations',
+        ['parking_id', 'end_time', 'start_time'],
+        unique=False,
+        postgresql_where=sa.text('is_cancelled = false'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reservations_parking_window', table_name='reservations')
@@ -0,0 +1,89 @@
+"""feat: partition reservations and notifications by month.
+
+Revision ID: c3e81b5f9a27
+Revises: 7d2f4a9c1e38
+Create Date: 2026-10-18 14:02:37.118604
+
+"""
+from typing import Sequence, Union
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e81b5f9a27'
+down_revision: Union[str, None] = '7d2f4a9c1e38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions prepared past the current month, the app keeps creating them afterwards
+MONTHS_AHEAD = 3
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _rebuild(table: str, column: str, partitioned: bool) -> None:
+    """Copy a table into a new (un)partitioned table of the same name, keeping its id sequence."""
+    conn = op.get_bind()
+    old = f'{table}_{"unpartitioned" if partitioned else "partitioned"}'
+
+    sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+
+    partition_by = f' PARTITION BY RANGE ({column})' if partitioned else ''
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}')
+
+    if partitioned:
+        # One partition per month from the oldest row (or now) to the newest row or MONTHS_AHEAD months from now
+        months = conn.execute(sa.text(f"""
+            SELECT generate_series(
+                date_trunc('month', least(min({column}), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', greatest(max({column}), now() + interval '{MONTHS_AHEAD} months') AT TIME ZONE 'UTC'),
+                interval '1 month'
+            ) FROM {old}
+        """)).scalars().all()
+
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        for month in months:
+            op.execute(
+                f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+            )
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    op.execute(f'DROP TABLE {old} CASCADE')
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+    # The partition key has to be part of the primary key
+    op.create_primary_key(f'{table}_pkey', table, ['id', column] if partitioned else ['id'])
+    op.create_foreign_key(f'{table}_user_id_fkey', table, 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f(f'ix_{table}_id'), table, ['id'], unique=False)
+
+
+def _create_reservation_indexes() -> None:
+    op.create_foreign_key('reservations_parking_id_fkey', 'reservations', 'parking_lots', ['parking_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_reservations_user_id'), 'reservations', ['user_id'], unique=False)
+    op.create_index(op.f('ix_reservations_parking_id'), 'reservations', ['parking_id'], unique=False)
+    op.create_index(
+        'ix_reservations_parking_window', 'reservations', ['parking_id', 'end_time', 'start_time'],
+        unique=False, postgresql_where=sa.text('is_cancelled = false')
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rebuild('reservations', 'start_time', partitioned=True)
+    _create_reservation_indexes()
+    _rebuild('notifications', 'created_at', partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild('notifications', 'created_at', partitioned=False)
+    _rebuild('reservations', 'start_time', partitioned=False)
+    _create_reservation_indexes()
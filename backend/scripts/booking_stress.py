@@ -0,0 +1,153 @@
+"""
+Concurrent booking stress test.
+
+Creates a scratch parking lot and users, fires bookings at it from N concurrent clients through the
+create_reservation endpoint, then sweeps the lot's timeline to prove no instant is booked beyond its
+capacity. Reports bookings per second and exits with status 1 on overbooking.
+
+Run from the backend directory against a migrated database:
+
+  python -m scripts.booking_stress --clients 16 --attempts 2000 --slots 20
+
+Clients beyond the engine pool size (5 + 10 overflow by default) wait for a connection.
+With --pipeline the clients share one event loop and book through the group-commit booking pipeline instead.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+
+from app.core.database import SessionLocal
+from app.models import ParkingLot, User
+from app.schema import ReservationCreate
+from app.routes.reservation import create_reservation
+from app.utils import get_current_utc_time, get_peak_occupancy, hash_password, booking_pipeline
+
+def setup(slots: int, users: int) -> tuple[int, list[SimpleNamespace]]:
+  """Create the scratch parking lot and its users."""
+  tag = uuid.uuid4().hex[:8]
+  db = SessionLocal()
+  try:
+    lot = ParkingLot(name=f"stress-{tag}", location="Stress test", total_slots=slots, rate=10)
+    db.add(lot)
+    password = hash_password(tag)
+    accounts = [
+      User(email=f"stress-{tag}-{i}@example.com", first_name="Stress", last_name=str(i), password=password, role="user")
+      for i in range(users)
+    ]
+    db.add_all(accounts)
+    db.commit()
+    return lot.id, [SimpleNamespace(id=user.id, role=user.role) for user in accounts]
+  finally:
+    db.close()
+
+def teardown(parking_id: int, users: list[SimpleNamespace]):
+  """Delete the scratch parking lot and users, their reservations and reminders cascade."""
+  db = SessionLocal()
+  try:
+    db.query(ParkingLot).filter(ParkingLot.id == parking_id).delete()
+    db.query(User).filter(User.id.in_([user.id for user in users])).delete(synchronize_session=False)
+    db.commit()
+  finally:
+    db.close()
+
+def main():
+  parser = argparse.ArgumentParser(description="Hammer the booking path from concurrent clients and check for overbooking.")
+  parser.add_argument("--clients", type=int, default=16, help="Concurrent booking clients.")
+  parser.add_argument("--attempts", type=int, default=2000, help="Total booking attempts.")
+  parser.add_argument("--slots", type=int, default=20, help="Capacity of the scratch parking lot.")
+  parser.add_argument("--users", type=int, default=200, help="Number of scratch users making bookings.")
+  parser.add_argument("--horizon-hours", type=int, default=48, help="Bookings start within this many hours.")
+  parser.add_argument("--max-hours", type=int, default=4, help="Longest booking in hours.")
+  parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+  parser.add_argument("--pipeline", action="store_true", help="Book through the group-commit booking pipeline.")
+  parser.add_argument("--keep", action="store_true", help="Keep the scratch lot, users and reservations.")
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  parking_id, users = setup(args.slots, args.users)
+  base = get_current_utc_time().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+  # Random quarter-hour aligned windows so bookings collide on the lot's timeline
+  windows = []
+  for _ in range(args.attempts):
+    start = base + timedelta(minutes=15 * rng.randrange(args.horizon_hours * 4))
+    windows.append((rng.choice(users), start, start + timedelta(minutes=15 * rng.randint(1, args.max_hours * 4))))
+
+  outcomes = {"booked": 0, "full": 0, "overlap": 0, "rejected": 0, "errors": 0}
+  lock = threading.Lock()
+
+  def book(attempt: tuple) -> str:
+    user, start, end = attempt
+    db = SessionLocal()
+    try:
+      reservation = ReservationCreate(parking_id=parking_id, user_id=user.id, start_time=start, end_time=end)
+      asyncio.run(create_reservation(reservation=reservation, idempotency_key=None, db=db, current_user=user))
+      return "booked"
+    except HTTPException as e:
+      if "full" in e.detail:
+        return "full"
+      if "overlaps" in e.detail:
+        return "overlap"
+      return "errors" if e.status_code >= 500 or e.detail.startswith("Failed") else "rejected"
+    finally:
+      db.close()
+
+  def record(attempt: tuple):
+    outcome = book(attempt)
+    with lock:
+      outcomes[outcome] += 1
+
+  async def book_pipelined():
+    clients = asyncio.Semaphore(args.clients)
+
+    async def submit(attempt: tuple):
+      user, start, end = attempt
+      async with clients:
+        try:
+          reservation = ReservationCreate(parking_id=parking_id, user_id=user.id, start_time=start, end_time=end)
+          await booking_pipeline.submit(reservation, user)
+          outcomes["booked"] += 1
+        except HTTPException as e:
+          outcomes["full" if "full" in e.detail else "overlap" if "overlaps" in e.detail else "rejected"] += 1
+        except Exception:
+          outcomes["errors"] += 1
+
+    await asyncio.gather(*(submit(attempt) for attempt in windows))
+
+  started = time.perf_counter()
+  if args.pipeline:
+    asyncio.run(book_pipelined())
+  else:
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+      list(pool.map(record, windows))
+  elapsed = time.perf_counter() - started
+
+  db = SessionLocal()
+  try:
+    horizon_end = base + timedelta(hours=args.horizon_hours + args.max_hours)
+    peak = get_peak_occupancy(db, parking_id, base, horizon_end)
+  finally:
+    db.close()
+
+  print(f"clients={args.clients} attempts={args.attempts} slots={args.slots} elapsed={elapsed:.2f}s", flush=True)
+  print(f"outcomes={outcomes}", flush=True)
+  if args.pipeline:
+    print(f"pipeline={booking_pipeline.stats()}", flush=True)
+  print(f"bookings/s={outcomes['booked'] / elapsed:.1f} attempts/s={args.attempts / elapsed:.1f}", flush=True)
+  print(f"peak occupancy={peak} capacity={args.slots} -> {'OVERBOOKED' if peak > args.slots else 'ok'}", flush=True)
+
+  if not args.keep:
+    teardown(parking_id, users)
+  if peak > args.slots:
+    raise SystemExit(1)
+
+if __name__ == "__main__":
+  main()
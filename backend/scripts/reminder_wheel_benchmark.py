@@ -0,0 +1,104 @@
+"""
+Memory and speed of the reminder timing wheel.
+
+Schedules packed reminder keys (reservation ID << 2 | kind) over a horizon, reports the memory held per
+million pending reminders, the add and cancel rates, and the time to tick through the first hour.
+With --apscheduler N, the same is measured for N APScheduler `date` jobs (what every reminder used to
+cost) and extrapolated to a million.
+
+Run from the backend directory, no database is needed:
+
+  python -m scripts.reminder_wheel_benchmark --reminders 1000000 --apscheduler 50000
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from app.utils.timing_wheel import TimingWheel
+
+def measure(build) -> tuple[int, float, object]:
+  """Run `build` and return the memory it still holds, its duration and its result."""
+  gc.collect()
+  tracemalloc.start()
+  started = time.perf_counter()
+  result = build()
+  elapsed = time.perf_counter() - started
+  gc.collect()
+  held, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return held, elapsed, result
+
+def per_million(held: int, count: int) -> str:
+  return f"{held / count * 1_000_000 / 2 ** 20:.1f} MiB per million ({held / count:.1f} bytes each)"
+
+def bench_wheel(count: int, horizon_days: int, rng: random.Random):
+  now = time.time()
+  dues = [now + rng.uniform(1, horizon_days * 86400) for _ in range(count)]
+  keys = [index << 2 | rng.randrange(4) for index in range(count)]
+
+  def build():
+    wheel = TimingWheel(lambda due_keys: None)
+    for key, due in zip(keys, dues):
+      wheel.add(key, due)
+    return wheel
+
+  held, elapsed, wheel = measure(build)
+  print(f"wheel: {count} reminders over {horizon_days} days, {per_million(held, count)}", flush=True)
+  print(f"wheel: add {count / elapsed:,.0f}/s", flush=True)
+
+  cancelled = rng.sample(range(count), count // 10)
+  started = time.perf_counter()
+  for index in cancelled:
+    wheel.cancel(keys[index], dues[index])
+  elapsed = time.perf_counter() - started
+  print(f"wheel: cancel {len(cancelled) / elapsed:,.0f}/s", flush=True)
+
+  started = time.perf_counter()
+  fired = 0
+  for second in range(int(now) + 1, int(now) + 3601):
+    fired += len(wheel.advance(second))
+  elapsed = time.perf_counter() - started
+  print(f"wheel: ticked one hour in {elapsed * 1000:.0f} ms, {fired} reminders fired, {wheel.stats()}", flush=True)
+
+def bench_apscheduler(count: int, horizon_days: int, rng: random.Random):
+  from apscheduler.schedulers.background import BackgroundScheduler
+
+  now = datetime.now(timezone.utc)
+  dues = [now + timedelta(seconds=rng.uniform(60, horizon_days * 86400)) for _ in range(count)]
+
+  def build():
+    scheduler = BackgroundScheduler()
+    scheduler.start(paused=True)
+    for index, due in enumerate(dues):
+      scheduler.add_job(print, "date", run_date=due, args=[index], id=f"notify_start_30_{index}")
+    return scheduler
+
+  held, elapsed, scheduler = measure(build)
+  print(f"apscheduler: {count} date jobs, {per_million(held, count)}", flush=True)
+  print(f"apscheduler: add {count / elapsed:,.0f}/s", flush=True)
+
+  started = time.perf_counter()
+  for index in range(0, count, 10):
+    scheduler.remove_job(f"notify_start_30_{index}")
+  elapsed = time.perf_counter() - started
+  print(f"apscheduler: remove {len(range(0, count, 10)) / elapsed:,.0f}/s", flush=True)
+  scheduler.shutdown(wait=False)
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure the memory per pending reminder of the timing wheel.")
+  parser.add_argument("--reminders", type=int, default=1_000_000, help="Pending reminders scheduled in the wheel.")
+  parser.add_argument("--horizon-days", type=int, default=30, help="Reminders are due within this many days.")
+  parser.add_argument("--apscheduler", type=int, default=0, help="Also measure this many APScheduler date jobs, 0 skips it.")
+  parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  bench_wheel(args.reminders, args.horizon_days, rng)
+  if args.apscheduler:
+    bench_apscheduler(args.apscheduler, args.horizon_days, rng)
+
+if __name__ == "__main__":
+  main()
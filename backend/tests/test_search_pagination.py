@@ -0,0 +1,54 @@
+import os
+import struct
+
+os.environ.setdefault("DB_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.models import ParkingLot
+from app.utils import keyset_paginate, search_parking_lots, search_rank, PARKING_SEARCH_COLUMNS
+
+def _real(value: float) -> float:
+  """Round a float to 4-byte precision, like the real returned by pg_trgm's word_similarity."""
+  return struct.unpack("f", struct.pack("f", value))[0]
+
+def _word_similarity(term: str, text: str) -> float:
+  # Few distinct scores so many rows tie on their rank
+  return _real(4 / 7) if text.lower().startswith(term.lower()) else _real(1 / 3)
+
+def _session() -> Session:
+  engine = create_engine("sqlite://")
+
+  @event.listens_for(engine, "connect")
+  def register_functions(connection, _):
+    connection.create_function("word_similarity", 2, _word_similarity)
+
+  ParkingLot.__table__.create(engine)
+  db = Session(engine)
+  db.add_all([
+    ParkingLot(name=f"{'Central' if index % 2 else 'North Central'} {index}", location="Test", total_slots=10, rate=5)
+    for index in range(25)
+  ])
+  db.commit()
+  return db
+
+def test_search_rank_is_double_precision():
+  sql = str(search_rank(PARKING_SEARCH_COLUMNS, "central").compile(dialect=postgresql.dialect()))
+  assert sql.startswith("CAST(word_similarity(") and sql.endswith("AS DOUBLE PRECISION)")
+
+def test_keyset_pages_through_tied_ranks():
+  db = _session()
+  query = db.query(ParkingLot).filter(search_parking_lots("central"))
+  keys = [(search_rank(PARKING_SEARCH_COLUMNS, "central"), "desc"), (ParkingLot.id, "asc")]
+
+  seen = []
+  cursor = ""
+  while cursor is not None:
+    lots, cursor = keyset_paginate(query, keys, 4, cursor or None, sort="lots:relevance:central")
+    seen.extend(lot.id for lot in lots)
+
+  expected = [lot.id for lot in sorted(query.all(), key=lambda lot: (-_word_similarity("central", lot.name), lot.id))]
+  assert seen == expected
+  assert len(seen) == len(set(seen)) == 25